@@ -15,6 +15,10 @@ app.conf.beat_schedule = {
         "task": "coins.tasks.calculate_indicators_task",
         "schedule": 5.0,
     },
+    "update-correlations-every-minute": {
+        "task": "coins.tasks.update_correlations_task",
+        "schedule": 60.0,
+    },
 }
 
 app.conf.timezone = "UTC"
@@ -36,6 +36,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    "daphne",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -94,9 +95,21 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD", "Ivan06042006"),
         "HOST": os.getenv("DB_HOST", "db"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # веб-сервер - ASGI (runserver с daphne): синхронный код каждого запроса
+        # идёт в новом потоке, постоянные подключения не переиспользуются
+        # и копятся, поэтому по умолчанию 0; процессы с постоянными потоками
+        # (Celery, сбор данных) включают их через DB_CONN_MAX_AGE
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Пул асинхронных подключений psycopg3 для асинхронных API (на процесс)
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "2"))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "20"))
+# Время ожидания свободного подключения из пула (секунды)
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv("ASYNC_DB_POOL_TIMEOUT", "10"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -173,6 +186,80 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://redis:6379/1"),
+        "KEY_PREFIX": "binance_parser",
+    }
+}
+
+# Время жизни кэша последних свечей (секунды)
+KLINES_CACHE_TTL = int(os.getenv("KLINES_CACHE_TTL", "5"))
+# Максимальное количество монет в одном batch-запросе свечей
+KLINES_BATCH_MAX_COINS = 100
+# Время жизни кэша страниц таблицы монет и количества монет под фильтром (секунды)
+COIN_TABLE_CACHE_TTL = 30
+COIN_TABLE_COUNT_CACHE_TTL = 60
+# Глубина стакана, которую процесс сбора данных хранит в кэше
+ORDERBOOK_HOT_DEPTH = 500
+# Время жизни этого снимка (секунды): без обновлений API переходит на latest_orderbook
+ORDERBOOK_HOT_TTL = 10
+# Время жизни кэша агрегированного стакана (секунды)
+ORDERBOOK_DEPTH_CACHE_TTL = 60
+# Хранение сырых событий стакана (дни); после изменения: manage.py orderbook_retention
+ORDERBOOK_RAW_RETENTION_DAYS = int(os.getenv("ORDERBOOK_RAW_RETENTION_DAYS", "2"))
+# Как долго кэшируется действующий срок хранения сырых событий для выбора уровня истории (секунды)
+ORDERBOOK_RETENTION_CACHE_TTL = 300
+# Глубина поминутных снимков стакана
+ORDERBOOK_SNAPSHOT_DEPTH = 50
+# Диапазоны истории стакана длиннее этого (часы) читаются из поминутных снимков
+ORDERBOOK_RAW_MAX_SPAN_HOURS = 6
+# Минимальный интервал обновления последнего состояния стакана в базе (секунды)
+ORDERBOOK_LATEST_FLUSH_INTERVAL = 1.0
+# Прореживание длинных рядов для графиков: максимум точек и время жизни кэша
+DOWNSAMPLE_MAX_POINTS = 5000
+DOWNSAMPLE_CACHE_TTL = 300
+# Архив холодной истории в Parquet (manage.py archive_history): каталог файлов,
+# возраст данных (дни), которые читаются из архива вместо базы (0 - архив выключен),
+# и размер группы строк в файле (единица отбрасывания по статистике)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_ROW_GROUP_SIZE = 10000
+# Локальное колоночное хранилище свечей (manage.py sync_colstore)
+COLSTORE_DIR = os.getenv("COLSTORE_DIR", os.path.join(BASE_DIR, "colstore"))
+# Локальный буфер записей при недоступной базе (manage.py replay_spool):
+# каталог, размер сегмента (байты) и размер пачки при переигрывании
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(BASE_DIR, "spool"))
+SPOOL_SEGMENT_BYTES = 8 * 1024 * 1024
+SPOOL_REPLAY_BATCH = 5000
+# Клиент вебсокетов сбора данных: "binance" (BinanceSocketManager) или "lean" (coins.stream);
+# поток свечей всегда читается лёгким клиентом (дозагрузка пропусков при переподключении)
+WS_CLIENT = os.getenv("WS_CLIENT", "binance")
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+# Супервизор сбора данных (manage.py run_ingestion): задержка перезапуска упавшего
+# потока (секунды) растёт от BASE до MAX и сбрасывается после RESET секунд работы
+INGESTION_BACKOFF_BASE = 1.0
+INGESTION_BACKOFF_MAX = 60.0
+INGESTION_BACKOFF_RESET = 300.0
+# Интервал публикации состояния потоков в кэш и срок без сообщений до статуса stale
+INGESTION_HEALTH_INTERVAL = 5
+INGESTION_STALE_AFTER = 60
+# Дозагрузка свечей после переподключения: максимальная длина пропуска (часы)
+# и частота запросов к REST API на все монеты (запросов в секунду)
+KLINE_GAP_MAX_HOURS = 24
+KLINE_GAP_REQUESTS_PER_SECOND = 10
+# Скользящие корреляции доходностей (coins.correlation): разрешение -> окно (свечей),
+# монеты (None - CORRELATION_MAX_COINS самых ликвидных), эталон для бет и минимум общих свечей для пары
+CORRELATION_WINDOWS = {"5m": 288, "1h": 168, "1d": 90}
+CORRELATION_COINS = None
+# без CORRELATION_COINS - столько монет с наибольшим оборотом (память растёт как квадрат)
+CORRELATION_MAX_COINS = 100
+# сколько лучших пар на монету хранится для ?top=
+CORRELATION_TOP_K = 20
+CORRELATION_BENCHMARK = "BTCUSDT"
+CORRELATION_MIN_PERIODS = 20
+
 ASGI_APPLICATION = "binance_parser.asgi.application"
 
 CHANNEL_LAYERS = {
@@ -183,3 +270,8 @@ CHANNEL_LAYERS = {
         },
     },
 }
+
+# Интервал объединения обновлений по топику перед рассылкой (секунды)
+REALTIME_FLUSH_INTERVAL = float(os.getenv("REALTIME_FLUSH_INTERVAL", "0.5"))
+# Глубина стакана в обновлениях для подписчиков
+REALTIME_BOOK_DEPTH = 50
@@ -0,0 +1,261 @@
+"""
+Архив холодной истории в Parquet: файл на монету и месяц,
+<ARCHIVE_DIR>/<таблица>/coin=<монета>/month=<YYYY-MM>/data.parquet.
+Строки в файле упорядочены по времени и разбиты на группы строк со
+статистикой min/max, поэтому фильтр по времени отбрасывает лишние группы
+без чтения (predicate pushdown), а фильтр по монете и месяцу - лишние файлы.
+pyarrow нужен только для архива и импортируется при первом обращении.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models
+from django.utils import timezone
+
+from .models import (
+    Kline,
+    SentimentIndicator,
+    TechnicalTrigger,
+    VolatilityLiquidityIndicator,
+)
+
+# имя в архиве и API -> модель таблицы
+ARCHIVE_TABLES = {
+    "kline": Kline,
+    "sentiment": SentimentIndicator,
+    "volatility": VolatilityLiquidityIndicator,
+    "technical": TechnicalTrigger,
+}
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImproperlyConfigured("Для архива Parquet нужен пакет pyarrow")
+    return pyarrow, pq
+
+
+def archive_cutoff(days=None):
+    """
+    Граница архива: начало месяца, в который попадает момент days
+    (по умолчанию ARCHIVE_AFTER_DAYS) дней назад. archive_history выгружает
+    и удаляет только полные месяцы до неё, и API читает из Parquet по той же
+    границе. None - архив выключен.
+    """
+    days = days or settings.ARCHIVE_AFTER_DAYS
+    return month_start(timezone.now() - timedelta(days=days)) if days else None
+
+
+def archive_fields(model):
+    """
+    Поля модели, которые хранятся в файле (монета задаётся каталогом).
+    """
+    return [f for f in model._meta.concrete_fields if f.column != "coin_id"]
+
+
+def arrow_type(pa, field):
+    # Decimal хранится как float64: архив нужен для графиков и исследований
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        return pa.float64()
+    if isinstance(field, models.IntegerField):
+        return pa.int64()
+    return pa.string()
+
+
+def month_dir(name, coin, month):
+    return os.path.join(
+        settings.ARCHIVE_DIR, name, f"coin={coin}", f"month={month:%Y-%m}"
+    )
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return month_start(month_start(value) + timedelta(days=32))
+
+
+def export_month(name, coin, month, overwrite=False):
+    """
+    Выгружает месяц монеты в Parquet. Возвращает число строк или None,
+    если файл уже есть. Файл пишется во временный и переименовывается,
+    поэтому читатели никогда не видят недописанный архив.
+    """
+    pa, pq = require_pyarrow()
+    model = ARCHIVE_TABLES[name]
+    path = os.path.join(month_dir(name, coin, month), "data.parquet")
+    if os.path.exists(path) and not overwrite:
+        return None
+
+    fields = archive_fields(model)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {", ".join(f.column for f in fields)}
+            FROM {model._meta.db_table}
+            WHERE coin_id = %s AND transaction_time >= %s AND transaction_time < %s
+            ORDER BY transaction_time;
+            """,
+            [coin, month, next_month(month)],
+        )
+        rows = cur.fetchall()
+    if not rows:
+        return 0
+
+    columns = {}
+    for field, values in zip(fields, zip(*rows)):
+        if isinstance(field, models.JSONField):
+            values = [
+                json.dumps(v) if v is not None and not isinstance(v, str) else v
+                for v in values
+            ]
+        elif isinstance(field, models.DecimalField):
+            values = [float(v) if v is not None else None for v in values]
+        columns[field.column] = pa.array(values, type=arrow_type(pa, field))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(
+        pa.table(columns),
+        tmp_path,
+        row_group_size=settings.ARCHIVE_ROW_GROUP_SIZE,
+        compression="zstd",
+        write_statistics=True,
+    )
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+def archived_months(name, coin):
+    """
+    Месяцы, за которые у монеты есть архив, по возрастанию.
+    """
+    coin_dir = os.path.join(settings.ARCHIVE_DIR, name, f"coin={coin}")
+    if not os.path.isdir(coin_dir):
+        return []
+    months = []
+    for entry in os.listdir(coin_dir):
+        if entry.startswith("month=") and os.path.exists(
+            os.path.join(coin_dir, entry, "data.parquet")
+        ):
+            months.append(
+                datetime.strptime(entry[len("month=") :], "%Y-%m").replace(
+                    tzinfo=dt_timezone.utc
+                )
+            )
+    return sorted(months)
+
+
+def read_archive(
+    name,
+    coin,
+    start=None,
+    end=None,
+    before=None,
+    after=None,
+    columns=None,
+    limit=None,
+    descending=False,
+):
+    """
+    Строки архива монеты [(transaction_time, *columns), ...] в порядке времени
+    (descending - от новых к старым). Границы как у build_time_filters:
+    start <= t <= end, t < before, t > after. Месяцы вне диапазона не
+    открываются, при limit чтение останавливается, как только строк достаточно.
+    """
+    pa, pq = require_pyarrow()
+    model = ARCHIVE_TABLES[name]
+    fields = {f.column: f for f in archive_fields(model)}
+    columns = [c for c in (columns or fields) if c != "transaction_time"]
+    unknown = set(columns) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    json_columns = {c for c in columns if isinstance(fields[c], models.JSONField)}
+
+    filters = []
+    lower = start or after
+    upper = end or before
+    if start:
+        filters.append(("transaction_time", ">=", start))
+    if end:
+        filters.append(("transaction_time", "<=", end))
+    if before:
+        filters.append(("transaction_time", "<", before))
+    if after:
+        filters.append(("transaction_time", ">", after))
+
+    months = [
+        month
+        for month in archived_months(name, coin)
+        if (lower is None or next_month(month) > lower)
+        and (upper is None or month <= upper)
+    ]
+    if descending:
+        months.reverse()
+
+    rows = []
+    for month in months:
+        table = pq.read_table(
+            os.path.join(month_dir(name, coin, month), "data.parquet"),
+            columns=["transaction_time"] + columns,
+            filters=filters or None,
+        )
+        values = [table.column(c).to_pylist() for c in ["transaction_time"] + columns]
+        for i, column in enumerate(columns, start=1):
+            if column in json_columns:
+                values[i] = [
+                    json.loads(v) if v is not None else None for v in values[i]
+                ]
+
+        month_rows = list(zip(*values))
+        if descending:
+            month_rows.reverse()
+        rows.extend(month_rows)
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+    return rows
+
+
+def bucket_klines(rows, width):
+    """
+    Свечи 1m -> свечи ширины width, как time_bucket в непрерывных агрегатах:
+    open первой, close последней, max high, min low, сумма объёмов.
+    rows - [(time, open, close, high, low, volume), ...] по возрастанию времени;
+    результат в порядке kline_row: (time, open, high, low, close, volume).
+    """
+    if not rows:
+        return []
+    seconds = int(width.total_seconds())
+    times = np.array([int(r[0].timestamp()) for r in rows], dtype=np.int64)
+    buckets = times - times % seconds
+    _, starts = np.unique(buckets, return_index=True)
+    ends = np.append(starts[1:], len(rows)) - 1
+
+    values = np.array([r[1:] for r in rows], dtype=np.float64)
+    opens = values[starts, 0]
+    closes = values[ends, 1]
+    highs = np.fmax.reduceat(values[:, 2], starts)
+    lows = np.fmin.reduceat(values[:, 3], starts)
+    volumes = np.add.reduceat(np.nan_to_num(values[:, 4]), starts)
+
+    return [
+        (datetime.fromtimestamp(int(b), tz=dt_timezone.utc), o, h, l, c, v)
+        for b, o, h, l, c, v in zip(
+            buckets[starts].tolist(),
+            opens.tolist(),
+            highs.tolist(),
+            lows.tolist(),
+            closes.tolist(),
+            volumes.tolist(),
+        )
+    ]
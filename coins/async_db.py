@@ -0,0 +1,57 @@
+import asyncio
+
+from django.conf import settings
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+def get_conninfo():
+    db = settings.DATABASES["default"]
+    return make_conninfo(
+        dbname=db["NAME"],
+        user=db["USER"],
+        password=db["PASSWORD"],
+        host=db["HOST"],
+        port=db["PORT"],
+    )
+
+
+async def get_pool():
+    """
+    Пул асинхронных подключений psycopg3, общий для процесса.
+    Открывается при первом запросе в цикле событий ASGI-сервера.
+    """
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = AsyncConnectionPool(
+                    get_conninfo(),
+                    min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                    max_size=settings.ASYNC_DB_POOL_MAX_SIZE,
+                    timeout=settings.ASYNC_DB_POOL_TIMEOUT,
+                    kwargs={"autocommit": True},
+                    open=False,
+                )
+                await pool.open()
+                _pool = pool
+    return _pool
+
+
+async def fetchall(sql, params=None):
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+async def fetchone(sql, params=None):
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchone()
@@ -0,0 +1,348 @@
+"""
+Асинхронные версии API свечей, стакана и индикаторов.
+Работают в цикле событий ASGI-сервера и обращаются к базе через
+пул psycopg3 (coins.async_db), не занимая поток на каждый запрос.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from . import async_db
+from .caching import (
+    aget_cached_klines,
+    aget_hot_order_book,
+    aset_cached_klines,
+    klines_cache_tier,
+)
+from .constants import RES_MAP
+from .models import SentimentIndicator, TechnicalTrigger, VolatilityLiquidityIndicator
+from .services import (
+    get_range_params,
+    group_latest_klines,
+    indicator_query,
+    klines_delta_query,
+    klines_delta_response,
+    klines_page_query,
+    kline_row,
+    latest_klines_query,
+    order_book_page_query,
+    order_book_row,
+    paginate_rows,
+    parse_digest,
+    parse_levels,
+    parse_limit,
+    parse_since,
+    sentiment_indicator_row,
+    technical_trigger_row,
+    volatility_indicator_row,
+)
+from .views import data_condition, indicator_delta
+
+
+async def resolve_coin(coin):
+    """
+    Имя монеты в том виде, в котором оно хранится в базе, или None.
+    """
+    row = await async_db.fetchone(
+        "SELECT coin FROM coins_coin WHERE upper(coin) = upper(%s);", [coin]
+    )
+    return row[0] if row else None
+
+
+async def get_latest_klines(coin, table, resolution, limit):
+    """
+    Последнее окно свечей через тот же кэш, что и у синхронного API.
+    """
+    fetch_limit = limit + 1
+    rows = (await aget_cached_klines([coin], resolution, fetch_limit)).get(coin)
+    if rows is None:
+        tier = klines_cache_tier(fetch_limit)
+        fetched = group_latest_klines(
+            [coin],
+            await async_db.fetchall(latest_klines_query(table), [tier, [coin]]),
+        )
+        await aset_cached_klines(fetched, resolution, tier)
+        rows = fetched[coin][-fetch_limit:]
+    return rows
+
+
+async def load_latest_klines(coin, table, resolution, limit):
+    rows = (await get_latest_klines(coin, table, resolution, limit))[::-1]
+    rows, next_cursor = paginate_rows(rows, limit, forward=False)
+    return {
+        "coin": coin,
+        "resolution": resolution,
+        "data": [kline_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+@require_GET
+@data_condition("kline")
+async def get_klines(request, coin):
+    limit = parse_limit(request)
+    if isinstance(limit, JsonResponse):
+        return limit
+
+    resolution = request.GET.get("resolution", "1m")
+    table = RES_MAP.get(resolution)
+    if not table:
+        return JsonResponse({"error": "Invalid resolution"}, status=400)
+
+    range_params = get_range_params(request)
+
+    try:
+        coin = await resolve_coin(coin)
+        if coin is None:
+            return JsonResponse({"error": "Coin not found"}, status=404)
+
+        since = parse_since(request)
+        if since:
+            rows = await async_db.fetchall(
+                klines_delta_query(table), [coin, since, limit + 1]
+            )
+            return JsonResponse(
+                klines_delta_response(
+                    coin, resolution, since, rows, limit, parse_digest(request)
+                )
+            )
+
+        if not any(range_params.values()):
+            return JsonResponse(
+                await load_latest_klines(coin, table, resolution, limit)
+            )
+
+        sql, params, forward = klines_page_query(
+            table, coin, limit=limit, **range_params
+        )
+        rows = await async_db.fetchall(sql, params)
+        rows, next_cursor = paginate_rows(rows, limit, forward)
+        return JsonResponse(
+            {
+                "coin": coin,
+                "resolution": resolution,
+                "data": [kline_row(r) for r in rows],
+                "next_cursor": next_cursor,
+            }
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+@data_condition("orderbook")
+async def get_order_book(request, coin):
+    limit = parse_limit(request)
+    if isinstance(limit, JsonResponse):
+        return limit
+
+    range_params = get_range_params(request)
+
+    try:
+        coin = await resolve_coin(coin)
+        if coin is None:
+            return JsonResponse({"error": "Coin not found"}, status=404)
+
+        sql, params, forward = order_book_page_query(coin, limit=limit, **range_params)
+        rows = await async_db.fetchall(sql, params)
+        rows, next_cursor = paginate_rows(rows, limit, forward)
+        return JsonResponse(
+            {
+                "coin": coin,
+                "data": [order_book_row(r) for r in rows],
+                "next_cursor": next_cursor,
+            }
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+@data_condition("orderbook")
+async def get_current_order_book(request, coin):
+    try:
+        depth = int(request.GET.get("depth", 20))
+    except ValueError:
+        return JsonResponse({"error": "Invalid depth"}, status=400)
+    depth = max(1, min(depth, settings.ORDERBOOK_HOT_DEPTH))
+
+    try:
+        coin = coin.upper()
+        data = await load_current_order_book(coin, depth)
+        if data is None:
+            return JsonResponse({"error": "Coin not found"}, status=404)
+        return JsonResponse(data)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+async def load_current_order_book(coin, depth, check_coin=True):
+    """
+    Текущий стакан: горячий снимок из кэша или последнее состояние в базе.
+    None, если снимка нет и монета не найдена.
+    """
+    book = await aget_hot_order_book(coin)
+    source = "cache"
+
+    if book is None:
+        source = "db"
+        if check_coin and await resolve_coin(coin) != coin:
+            return None
+        row = await async_db.fetchone(
+            """
+            select transaction_time, bids, asks
+            from latest_orderbook
+            where coin_id = %s;
+            """,
+            [coin],
+        )
+        book = {
+            "time": row[0] if row else None,
+            "bids": parse_levels(row[1]) if row else [],
+            "asks": parse_levels(row[2]) if row else [],
+        }
+
+    return {
+        "coin": coin,
+        "time": book["time"],
+        "source": source,
+        "bids": book["bids"][:depth],
+        "asks": book["asks"][:depth],
+    }
+
+
+async def load_indicators(coin, model, row_func, limit, since=None):
+    sql, attnames = indicator_query(model, since)
+    params = [coin, since, limit] if since else [coin, limit]
+    rows = await async_db.fetchall(sql, params)
+
+    indicators = [model(**dict(zip(attnames, row))) for row in rows]
+    return indicators, [row_func(indicator) for indicator in indicators]
+
+
+async def indicator_response(request, coin, model, row_func):
+    try:
+        limit = int(request.GET.get("limit", "100"))
+        if limit <= 0:
+            limit = 100
+    except (ValueError, TypeError):
+        limit = 100
+
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    coin = await resolve_coin(coin)
+    if coin is None:
+        return JsonResponse({"error": "Coin not found"}, status=404)
+
+    if since:
+        indicators, data = await load_indicators(
+            coin, model, row_func, limit + 1, since
+        )
+        return JsonResponse(
+            indicator_delta(indicators, data, since, limit, parse_digest(request))
+        )
+
+    indicators, data = await load_indicators(coin, model, row_func, limit)
+    return JsonResponse(data, safe=False)
+
+
+@require_GET
+@data_condition("sentiment")
+async def get_sentiment_indicators(request, coin):
+    return await indicator_response(
+        request, coin, SentimentIndicator, sentiment_indicator_row
+    )
+
+
+@require_GET
+@data_condition("volatility")
+async def get_volatility_liquidity_indicators(request, coin):
+    return await indicator_response(
+        request, coin, VolatilityLiquidityIndicator, volatility_indicator_row
+    )
+
+
+@require_GET
+@data_condition("technical")
+async def get_technical_triggers(request, coin):
+    return await indicator_response(
+        request, coin, TechnicalTrigger, technical_trigger_row
+    )
+
+
+INDICATOR_FAMILIES = {
+    "sentiment": (SentimentIndicator, sentiment_indicator_row),
+    "volatility": (VolatilityLiquidityIndicator, volatility_indicator_row),
+    "technical": (TechnicalTrigger, technical_trigger_row),
+}
+
+
+@require_GET
+@gzip_page
+async def get_chart_bootstrap(request, coin):
+    """
+    Данные для первой отрисовки страницы графика одним ответом:
+    свечи, текущий стакан и три семейства индикаторов. Монета проверяется
+    один раз, запросы выполняются параллельно на подключениях из пула.
+    ?resolution=1d&limit=500&depth=50&indicator_limit=50
+    """
+    limit = parse_limit(request)
+    if isinstance(limit, JsonResponse):
+        return limit
+
+    resolution = request.GET.get("resolution", "1d")
+    table = RES_MAP.get(resolution)
+    if not table:
+        return JsonResponse({"error": "Invalid resolution"}, status=400)
+
+    try:
+        depth = int(request.GET.get("depth", 50))
+        indicator_limit = int(request.GET.get("indicator_limit", 50))
+    except ValueError:
+        return JsonResponse({"error": "Invalid depth or indicator_limit"}, status=400)
+    depth = max(1, min(depth, settings.ORDERBOOK_HOT_DEPTH))
+    indicator_limit = max(1, min(indicator_limit, 1000))
+
+    try:
+        coin = await resolve_coin(coin)
+        if coin is None:
+            return JsonResponse({"error": "Coin not found"}, status=404)
+
+        klines, order_book, *indicators = await asyncio.gather(
+            load_latest_klines(coin, table, resolution, limit),
+            load_current_order_book(coin, depth, check_coin=False),
+            *(
+                load_indicators(coin, model, row_func, indicator_limit)
+                for model, row_func in INDICATOR_FAMILIES.values()
+            ),
+        )
+
+        payload = {
+            "coin": coin,
+            "klines": klines,
+            "orderbook": order_book,
+        }
+        for name, (_, data) in zip(INDICATOR_FAMILIES, indicators):
+            payload[name] = data
+        return JsonResponse(payload)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
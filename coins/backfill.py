@@ -0,0 +1,304 @@
+"""
+Дозагрузка истории свечей в диапазоны, которые уже попали под сжатие.
+Вставка в сжатые чанки медленная и может завершиться ошибкой, поэтому
+затронутые чанки распаковываются пачками, данные вставляются пакетно,
+и чанки сжимаются обратно. Политика сжатия на время загрузки приостанавливается.
+Непрерывные агрегаты за загруженный диапазон пересчитываются в finish():
+их политики обновления смотрят только на последние часы.
+"""
+
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+
+from .constants import RES_MAP, RES_WIDTHS
+from .models import Kline
+
+KLINE_COLUMNS = [
+    "coin_id",
+    "transaction_time",
+    "open_price",
+    "close_price",
+    "high_price",
+    "low_price",
+    "volume",
+]
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def refresh_kline_aggregates(start, end):
+    """
+    Пересчитывает непрерывные агрегаты свечей за [start, end] снизу вверх:
+    каждый уровень строится из предыдущего, поэтому 5m - после 1m и т.д.
+    Окно расширяется до границ свечей уровня: refresh_continuous_aggregate
+    пересчитывает только свечи, целиком попавшие в окно.
+    """
+    with connection.cursor() as cur:
+        for resolution, view in RES_MAP.items():
+            width = RES_WIDTHS[resolution]
+            window_start = EPOCH + (start - EPOCH) // width * width
+            window_end = EPOCH + ((end - EPOCH) // width + 1) * width
+            cur.execute(
+                "CALL refresh_continuous_aggregate("
+                "%s::regclass, %s::timestamptz, %s::timestamptz);",
+                [view, window_start, window_end],
+            )
+    logging.info(f"Агрегаты свечей пересчитаны за {start} - {end}.")
+
+
+def compression_job(table):
+    """
+    (job_id, scheduled) задания политики сжатия гипертаблицы или None.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT job_id, scheduled
+            FROM timescaledb_information.jobs
+            WHERE proc_name = 'policy_compression' AND hypertable_name = %s;
+            """,
+            [table],
+        )
+        return cur.fetchone()
+
+
+@contextmanager
+def compression_paused(table):
+    """
+    Приостанавливает политику сжатия на время загрузки. После загрузки
+    задание запускается сразу: новые чанки старше compress_after сожмутся
+    без ожидания следующего расписания.
+    """
+    job = compression_job(table)
+    if job is None or not job[1]:
+        yield
+        return
+
+    job_id = job[0]
+    with connection.cursor() as cur:
+        cur.execute("SELECT alter_job(%s, scheduled => false);", [job_id])
+    logging.info(f"Политика сжатия {table} (задание {job_id}) приостановлена.")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT alter_job(%s, scheduled => true, next_start => now());",
+                [job_id],
+            )
+        logging.info(f"Политика сжатия {table} (задание {job_id}) восстановлена.")
+
+
+def compressed_chunks(table, start, end):
+    """
+    Сжатые чанки, пересекающиеся с диапазоном [start, end).
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT format('%%I.%%I', chunk_schema, chunk_name)
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = %s
+                AND is_compressed
+                AND range_end > %s
+                AND range_start < %s
+            ORDER BY range_start;
+            """,
+            [table, start, end],
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+@contextmanager
+def decompressed(table, start, end):
+    """
+    Распаковывает сжатые чанки диапазона и сжимает их обратно после вставки.
+    """
+    chunks = compressed_chunks(table, start, end)
+    with connection.cursor() as cur:
+        for chunk in chunks:
+            cur.execute(
+                "SELECT decompress_chunk(%s::regclass, if_compressed => true);",
+                [chunk],
+            )
+    if chunks:
+        logging.info(
+            f"Распаковано {len(chunks)} чанков {table} за {start:%Y-%m-%d} - {end:%Y-%m-%d}."
+        )
+    try:
+        yield
+    finally:
+        with connection.cursor() as cur:
+            for chunk in chunks:
+                cur.execute(
+                    "SELECT compress_chunk(%s::regclass, if_not_compressed => true);",
+                    [chunk],
+                )
+
+
+class KlineBackfill:
+    """
+    Запись исторических свечей в обход сжатых чанков.
+    finish() пересчитывает агрегаты за весь загруженный диапазон; вызывается
+    внутри compression_paused, до возобновления политики сжатия.
+
+    mode="decompress": строки монеты копятся в памяти, пока не покроют
+    batch_days; затем сжатые чанки этого диапазона распаковываются,
+    строки вставляются одним bulk_create и чанки сжимаются обратно.
+
+    mode="staging": строки пишутся в несжатую промежуточную гипертаблицу
+    coins_kline_staging; finish() переносит её в coins_kline окнами
+    по batch_days с той же распаковкой затронутых чанков и удаляет её.
+    """
+
+    STAGING_TABLE = "coins_kline_staging"
+
+    def __init__(self, mode="decompress", batch_days=7):
+        if mode not in ("decompress", "staging"):
+            raise ValueError(f"Неизвестный режим дозагрузки: {mode}")
+        self.mode = mode
+        self.batch = timedelta(days=batch_days)
+        self.pending = {}
+        # [min, max] времени загруженных свечей для пересчёта агрегатов
+        self.loaded = None
+        if mode == "staging":
+            self.create_staging()
+
+    def add(self, coin_name, data):
+        if self.mode == "staging":
+            self.insert_staging(coin_name, data)
+            return
+
+        rows = self.pending.setdefault(coin_name, [])
+        rows.extend(data)
+        if rows[-1]["transaction_time"] - rows[0]["transaction_time"] >= self.batch:
+            self.flush(coin_name)
+
+    def flush(self, coin_name):
+        rows = self.pending.pop(coin_name, [])
+        if not rows:
+            return
+
+        start = min(item["transaction_time"] for item in rows)
+        end = max(item["transaction_time"] for item in rows) + timedelta(minutes=1)
+        with decompressed(Kline._meta.db_table, start, end):
+            Kline.objects.bulk_create(
+                [
+                    Kline(
+                        coin_id=coin_name,
+                        transaction_time=item["transaction_time"],
+                        open_price=item["open_price"],
+                        close_price=item["close_price"],
+                        high_price=item["high_price"],
+                        low_price=item["low_price"],
+                        volume=item["volume"],
+                    )
+                    for item in rows
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+        self.note_loaded(start, end - timedelta(minutes=1))
+        logging.info(f"Дозагружено {len(rows)} свечей для {coin_name}.")
+
+    def note_loaded(self, start, end):
+        if self.loaded is not None:
+            start = min(start, self.loaded[0])
+            end = max(end, self.loaded[1])
+        self.loaded = (start, end)
+
+    def finish(self):
+        if self.mode == "staging":
+            self.merge_staging()
+        else:
+            for coin_name in list(self.pending):
+                self.flush(coin_name)
+        if self.loaded is not None:
+            refresh_kline_aggregates(*self.loaded)
+
+    def create_staging(self):
+        with connection.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.STAGING_TABLE}
+                (LIKE coins_kline INCLUDING DEFAULTS);
+                """)
+            cur.execute(
+                f"""
+                SELECT create_hypertable(
+                    '{self.STAGING_TABLE}',
+                    'transaction_time',
+                    chunk_time_interval => %s::interval,
+                    if_not_exists => TRUE
+                );
+                """,
+                [f"{self.batch.days} days"],
+            )
+
+    def insert_staging(self, coin_name, data):
+        if not data:
+            return
+        row = "(" + ", ".join(["%s"] * len(KLINE_COLUMNS)) + ")"
+        params = []
+        for item in data:
+            params.extend(
+                [
+                    coin_name,
+                    item["transaction_time"],
+                    item["open_price"],
+                    item["close_price"],
+                    item["high_price"],
+                    item["low_price"],
+                    item["volume"],
+                ]
+            )
+        with connection.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO {self.STAGING_TABLE} ({", ".join(KLINE_COLUMNS)})
+                VALUES {", ".join([row] * len(data))};
+                """,
+                params,
+            )
+
+    def merge_staging(self):
+        """
+        Перенос промежуточной таблицы в coins_kline окнами по batch_days.
+        Дубли внутри промежуточной таблицы и уже существующие свечи пропускаются.
+        """
+        columns = ", ".join(KLINE_COLUMNS)
+        with connection.cursor() as cur:
+            cur.execute(
+                f"SELECT min(transaction_time), max(transaction_time) "
+                f"FROM {self.STAGING_TABLE};"
+            )
+            first, last = cur.fetchone()
+        if first is not None:
+            self.note_loaded(first, last)
+
+        start = first
+        while first is not None and start <= last:
+            end = start + self.batch
+            with decompressed(Kline._meta.db_table, start, end):
+                with connection.cursor() as cur:
+                    cur.execute(
+                        f"""
+                        INSERT INTO coins_kline ({columns})
+                        SELECT DISTINCT ON (coin_id, transaction_time) {columns}
+                        FROM {self.STAGING_TABLE}
+                        WHERE transaction_time >= %s AND transaction_time < %s
+                        ON CONFLICT DO NOTHING;
+                        """,
+                        [start, end],
+                    )
+                    logging.info(
+                        f"Перенесено {cur.rowcount} свечей за "
+                        f"{start:%Y-%m-%d} - {end:%Y-%m-%d}."
+                    )
+            start = end
+
+        with connection.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.STAGING_TABLE};")
@@ -0,0 +1,204 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# окна свечей в кэше: запрос с limit берёт наименьшее окно не меньше limit + 1
+# (строка для курсора), и при промахе из базы читается только это окно
+KLINES_CACHE_TIERS = (101, 501, 1001)
+
+
+def klines_cache_tier(rows):
+    return next((tier for tier in KLINES_CACHE_TIERS if tier >= rows), rows)
+
+
+def klines_cache_key(coin, resolution, tier):
+    return f"klines:{coin}:{resolution}:{tier}"
+
+
+def get_cached_klines(coins, resolution, limit):
+    """
+    Возвращает последние limit закэшированных свечей для списка монет
+    из окна klines_cache_tier(limit): {coin: rows}. Монеты, которых нет
+    в кэше, в результат не попадают.
+    """
+    tier = klines_cache_tier(limit)
+    keys = {klines_cache_key(coin, resolution, tier): coin for coin in coins}
+    cached = cache.get_many(list(keys))
+    return {keys[key]: rows[-limit:] for key, rows in cached.items()}
+
+
+def set_cached_klines(series, resolution, tier):
+    """
+    Сохраняет окна свечей {coin: rows} (tier строк) одной операцией.
+    """
+    cache.set_many(
+        {
+            klines_cache_key(coin, resolution, tier): rows
+            for coin, rows in series.items()
+        },
+        timeout=settings.KLINES_CACHE_TTL,
+    )
+
+
+async def aget_cached_klines(coins, resolution, limit):
+    tier = klines_cache_tier(limit)
+    keys = {klines_cache_key(coin, resolution, tier): coin for coin in coins}
+    cached = await cache.aget_many(list(keys))
+    return {keys[key]: rows[-limit:] for key, rows in cached.items()}
+
+
+async def aset_cached_klines(series, resolution, tier):
+    await cache.aset_many(
+        {
+            klines_cache_key(coin, resolution, tier): rows
+            for coin, rows in series.items()
+        },
+        timeout=settings.KLINES_CACHE_TTL,
+    )
+
+
+def hot_order_book_key(coin):
+    return f"orderbook:latest:{coin.upper()}"
+
+
+async def set_hot_order_book(coin, book):
+    """
+    Сохраняет последний стакан монеты, поддерживаемый процессом сбора данных.
+    Снимок живёт ORDERBOOK_HOT_TTL: остановка сбора не оставляет в API
+    устаревший стакан.
+    """
+    await cache.aset(hot_order_book_key(coin), book, timeout=settings.ORDERBOOK_HOT_TTL)
+
+
+def get_hot_order_book(coin):
+    return cache.get(hot_order_book_key(coin))
+
+
+async def aget_hot_order_book(coin):
+    return await cache.aget(hot_order_book_key(coin))
+
+
+# действующий срок хранения сырых событий стакана (services.raw_order_book_retention)
+ORDERBOOK_RETENTION_KEY = "orderbook:raw_retention"
+
+
+def depth_cache_key(coin, snapshot_time, tick, tick_pct, bps):
+    snapshot = snapshot_time.isoformat() if snapshot_time else "none"
+    bps = ",".join(str(value) for value in bps)
+    return f"orderbook:depth:{coin}:{snapshot}:{tick}:{tick_pct}:{bps}"
+
+
+def downsample_cache_key(kind, coin, series, start, end, points):
+    """
+    Ключ прореженного ряда: kind - "kline" или семейство индикаторов,
+    series - таймфрейм свечей или поле индикатора.
+    """
+    return f"downsample:{kind}:{coin}:{series}:{start}:{end or 'now'}:{points}"
+
+
+TICKER_VERSION_KEY = "ticker:version"
+
+
+def get_ticker_version():
+    """
+    Версия снимка тикеров: увеличивается при каждом обновлении таблицы монет.
+    """
+    return cache.get_or_set(TICKER_VERSION_KEY, 1, timeout=None)
+
+
+def bump_ticker_version():
+    try:
+        cache.incr(TICKER_VERSION_KEY)
+    except ValueError:
+        cache.set(TICKER_VERSION_KEY, 1, timeout=None)
+
+
+def coin_table_cache_key(version, query):
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f"coin_table:html:{version}:{digest}"
+
+
+def data_version_key(stream, coin):
+    return f"version:{stream}:{coin.upper()}"
+
+
+def data_modified_key(stream, coin):
+    return f"modified:{stream}:{coin.upper()}"
+
+
+def bump_data_version(stream, coin):
+    """
+    Отмечает запись новых данных потока по монете: увеличивает счётчик версии
+    и запоминает время изменения. Вызывается процессами сбора и расчёта.
+    """
+    try:
+        cache.incr(data_version_key(stream, coin))
+    except ValueError:
+        # счётчик начинается от текущего времени: после очистки кэша
+        # версии не совпадут со старыми ETag у клиентов
+        cache.set(data_version_key(stream, coin), int(time.time() * 1000), timeout=None)
+    cache.set(data_modified_key(stream, coin), time.time(), timeout=None)
+
+
+def get_data_state(stream, coin):
+    """
+    (версия, время изменения в секундах) данных потока по монете одним
+    запросом к кэшу; None вместо версии, если по монете ещё ничего не записано.
+    Ключи создаёт только bump_data_version, поэтому запросы к произвольным
+    монетам не плодят записи в кэше.
+    """
+    keys = [data_version_key(stream, coin), data_modified_key(stream, coin)]
+    cached = cache.get_many(keys)
+    return cached.get(keys[0]), cached.get(keys[1])
+
+
+async def aget_data_state(stream, coin):
+    keys = [data_version_key(stream, coin), data_modified_key(stream, coin)]
+    cached = await cache.aget_many(keys)
+    return cached.get(keys[0]), cached.get(keys[1])
+
+
+# потоки супервизора run_ingestion; имена совпадают с видами буфера spool
+INGESTION_STREAMS = ("ticker", "kline", "orderbook")
+
+
+def ingestion_health_key(stream):
+    return f"ingestion:{stream}"
+
+
+def set_ingestion_health(stream, state):
+    """
+    Состояние потока сбора данных. Запись живёт три интервала отчёта:
+    если процесс супервизора остановился, поток считается недоступным.
+    """
+    cache.set(
+        ingestion_health_key(stream),
+        state,
+        timeout=settings.INGESTION_HEALTH_INTERVAL * 3,
+    )
+
+
+def get_ingestion_health(streams=INGESTION_STREAMS):
+    """
+    {поток: состояние} с метриками буфера spool:<поток>. Статус running
+    без сообщений дольше INGESTION_STALE_AFTER становится stale,
+    отсутствие записи в кэше - down.
+    """
+    keys = [ingestion_health_key(s) for s in streams] + [f"spool:{s}" for s in streams]
+    cached = cache.get_many(keys)
+    now = time.time()
+    health = {}
+    for stream in streams:
+        state = cached.get(ingestion_health_key(stream)) or {"status": "down"}
+        last_seen = state.get("last_message_at") or state.get("started_at")
+        if (
+            state["status"] == "running"
+            and last_seen
+            and now - last_seen > settings.INGESTION_STALE_AFTER
+        ):
+            state["status"] = "stale"
+        state["spool"] = cached.get(f"spool:{stream}")
+        health[stream] = state
+    return health
@@ -1,13 +1,9 @@
-import os
-import django
-
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "binance_parser.settings")
-django.setup()
-
-from binance import BinanceSocketManager, AsyncClient
 from django.utils.timezone import now
 from dotenv import load_dotenv
 from .models import Coin
+from .caching import bump_ticker_version
+from .stream import create_client, open_stream
+from .spool import DATABASE_UNAVAILABLE, get_spool, spool_on_failure
 import json
 import asyncio
 from asgiref.sync import sync_to_async
@@ -16,22 +12,48 @@ load_dotenv()
 
 
 @sync_to_async
-def save_coin_data(symbol, price, price_change_percent, volume):
+def save_coin_data(tickers):
     """
-    Синхронная функция для сохранения данных в базу данных
+    Сохранение пачки тикеров одним запросом INSERT ... ON CONFLICT:
+    строка монеты в coins_coin и есть последнее состояние тикера
     """
-    Coin.objects.update_or_create(
-        coin=symbol,
-        defaults={
-            "price": price,
-            "price_change_percent": price_change_percent,
-            "volume": volume,
-            "updated_at": now(),
-        },
-    )
-    print(
-        f"Обновлены данные для монеты: {symbol}, Цена{price},  Изменение {price_change_percent}, Обьем {volume}"
-    )
+    updated_at = now()
+    try:
+        Coin.objects.bulk_create(
+            [
+                Coin(
+                    coin=symbol,
+                    price=price,
+                    price_change_percent=price_change_percent,
+                    volume=volume,
+                    updated_at=updated_at,
+                )
+                for symbol, price, price_change_percent, volume in tickers
+            ],
+            update_conflicts=True,
+            unique_fields=["coin"],
+            update_fields=["price", "price_change_percent", "volume", "updated_at"],
+        )
+    except DATABASE_UNAVAILABLE as e:
+        spool_on_failure(
+            "ticker",
+            [
+                {
+                    "coin": symbol,
+                    "price": price,
+                    "price_change_percent": price_change_percent,
+                    "volume": volume,
+                    "updated_at": updated_at,
+                }
+                for symbol, price, price_change_percent, volume in tickers
+            ],
+            e,
+        )
+        return
+    # закэшированные страницы таблицы монет становятся неактуальными
+    bump_ticker_version()
+    get_spool("ticker").replay_pending()
+    print(f"Обновлены данные для {len(tickers)} монет")
 
 
 async def handle_socket_message(messages):
@@ -39,42 +61,47 @@ async def handle_socket_message(messages):
     Обработчик сообщений от вебсокет
     """
     try:
+        tickers = {}
         for msg in messages:
             if "s" in msg and "c" in msg:
-                symbol = msg["s"]
-                price = msg["c"]
-                price_change_percent = float(msg.get("P", 0.0))
-                volume = float(msg.get("v", 0.0))
+                tickers[msg["s"]] = (
+                    msg["s"],
+                    msg["c"],
+                    float(msg.get("P", 0.0)),
+                    float(msg.get("v", 0.0)),
+                )
 
-                await save_coin_data(symbol, price, price_change_percent, volume)
-
-                await asyncio.sleep(1)
+        if tickers:
+            await save_coin_data(list(tickers.values()))
 
     except Exception as e:
         print(f"Ошибка при обработке сообщения: {e}")
 
 
-async def start_websocket():
+async def stream_tickers(client, record=None, on_message=None):
     """
-    Запуск вебсокет для получения данных о монетах
+    Чтение потока тикеров; ошибки соединения передаются вызывающему
+    (start_websocket или супервизор run_ingestion)
     """
-    api_key = os.getenv("BINANCE_API_KEY")
-    secret_key = os.getenv("BINANCE_SECRET_KEY")
+    ticker = open_stream(client, ["!ticker@arr"], record)
+    async with ticker as stream:
+        while True:
+            res = await stream.recv()
+            if on_message is not None:
+                on_message()
+            if "data" in res:
+                await handle_socket_message(res["data"])
 
-    if not api_key or not secret_key:
-        raise ValueError("API ключи не найдены в переменных окружения")
+            await asyncio.sleep(1)
 
-    client = await AsyncClient.create(api_key, secret_key)
-    web_socket = BinanceSocketManager(client)
-    try:
-        ticker = web_socket.multiplex_socket(["!ticker@arr"])
-        async with ticker as stream:
-            while True:
-                res = await stream.recv()
-                if "data" in res:
-                    await handle_socket_message(res["data"])
 
-                await asyncio.sleep(1)
+async def start_websocket(record=None):
+    """
+    Запуск вебсокет для получения данных о монетах
+    """
+    client = await create_client()
+    try:
+        await stream_tickers(client, record)
     except KeyboardInterrupt:
         print("WebSocket остановлен пользователем")
     except Exception as e:
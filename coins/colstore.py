@@ -0,0 +1,216 @@
+"""
+Локальное колоночное хранилище свечей для расчётов без обращения к базе.
+Каждое поле (open, high, low, close, volume, time) монеты и разрешения -
+отдельный файл плотного массива в COLSTORE_DIR/<разрешение>/<монета>/:
+элемент i соответствует свече start + i * ширина, поэтому поиск по времени -
+арифметика, а не поиск. Пропущенные свечи: NaN в полях цен, 0 в time.
+Файлы читаются через np.memmap, читатели получают срезы без копирования.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+
+from .constants import RES_MAP, RES_WIDTHS
+
+# поле хранилища -> (колонка источника, тип массива)
+FIELDS = {
+    "open": ("open_price", np.float64),
+    "high": ("high_price", np.float64),
+    "low": ("low_price", np.float64),
+    "close": ("close_price", np.float64),
+    "volume": ("volume", np.float64),
+    "time": (None, np.int64),
+}
+
+
+def source_table(resolution):
+    """
+    (таблица, колонка времени): 1m читается из сырых свечей coins_kline,
+    остальные разрешения - из непрерывных агрегатов.
+    """
+    if resolution == "1m":
+        return "coins_kline", "transaction_time"
+    return RES_MAP[resolution], "bucket"
+
+
+def seconds(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(value.timestamp())
+
+
+class ColumnStore:
+    def __init__(self, root=None):
+        self.root = root or settings.COLSTORE_DIR
+
+    def path(self, coin, resolution, name):
+        return os.path.join(self.root, resolution, coin, name)
+
+    def meta(self, coin, resolution):
+        """
+        {"start": время первой свечи (секунды), "length": число элементов} или None.
+        """
+        try:
+            with open(self.path(coin, resolution, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_meta(self, coin, resolution, meta):
+        # meta пишется последней и атомарно: читатель видит только дописанные данные
+        path = self.path(coin, resolution, "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def write(self, coin, resolution, times, columns):
+        """
+        Записывает свечи (times - секунды, по возрастанию) на их позиции:
+        существующие элементы перезаписываются, новые дописываются в конец.
+        """
+        if not len(times):
+            return
+        width = int(RES_WIDTHS[resolution].total_seconds())
+        meta = self.meta(coin, resolution)
+        if meta is None:
+            os.makedirs(os.path.join(self.root, resolution, coin), exist_ok=True)
+            meta = {"start": int(times[0]) - int(times[0]) % width, "length": 0}
+
+        index = (times - meta["start"]) // width
+        if index[0] < 0:
+            raise ValueError(
+                f"Свечи {coin} {resolution} старше начала хранилища, нужен --full"
+            )
+        length = max(meta["length"], int(index[-1]) + 1)
+
+        for name, (_, dtype) in FIELDS.items():
+            path = self.path(coin, resolution, name)
+            if length > meta["length"]:
+                fill = np.nan if dtype is np.float64 else 0
+                with open(path, "ab") as f:
+                    # хвост, дописанный до сбоя без обновления meta, отбрасывается
+                    f.truncate(meta["length"] * np.dtype(dtype).itemsize)
+                    f.write(np.full(length - meta["length"], fill, dtype).tobytes())
+            array = np.memmap(path, dtype=dtype, mode="r+", shape=(length,))
+            array[index] = times if name == "time" else columns[name]
+            array.flush()
+
+        meta["length"] = length
+        self.write_meta(coin, resolution, meta)
+
+    def sync(self, coin, resolution="1m", full=False, lookback=2, batch=100000):
+        """
+        Дописывает свечи из базы. Последние lookback свечей перечитываются:
+        незакрытая свеча могла измениться. full пересобирает хранилище целиком.
+        Возвращает число прочитанных строк.
+        """
+        table, time_col = source_table(resolution)
+        width = int(RES_WIDTHS[resolution].total_seconds())
+        meta = None if full else self.meta(coin, resolution)
+        if full:
+            for name in list(FIELDS) + ["meta.json"]:
+                path = self.path(coin, resolution, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        since = 0
+        if meta and meta["length"]:
+            since = meta["start"] + max(meta["length"] - lookback, 0) * width
+
+        names = [name for name, (column, _) in FIELDS.items() if column]
+        sources = [FIELDS[name][0] for name in names]
+        total = 0
+        # серверный курсор: fetchmany обычного курсора psycopg читал бы
+        # весь результат в память клиента сразу после execute
+        with connection.chunked_cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT extract(epoch FROM {time_col})::bigint, {", ".join(sources)}
+                FROM {table}
+                WHERE coin_id = %s AND {time_col} >= to_timestamp(%s)
+                ORDER BY {time_col};
+                """,
+                [coin, since],
+            )
+            while True:
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                values = np.array(rows, dtype=np.float64)
+                self.write(
+                    coin,
+                    resolution,
+                    values[:, 0].astype(np.int64),
+                    {name: values[:, i] for i, name in enumerate(names, start=1)},
+                )
+                total += len(rows)
+        return total
+
+    def array(self, coin, resolution, name):
+        """
+        Поле целиком как memmap только для чтения (None, если хранилища нет).
+        """
+        meta = self.meta(coin, resolution)
+        if not meta or not meta["length"]:
+            return None
+        return np.memmap(
+            self.path(coin, resolution, name),
+            dtype=FIELDS[name][1],
+            mode="r",
+            shape=(meta["length"],),
+        )
+
+    def index_of(self, coin, resolution, timestamp):
+        """
+        Позиция свечи, в которую попадает timestamp (секунды или datetime);
+        может выходить за границы хранилища.
+        """
+        meta = self.meta(coin, resolution)
+        if meta is None:
+            return None
+        width = int(RES_WIDTHS[resolution].total_seconds())
+        return (seconds(timestamp) - meta["start"]) // width
+
+    def series(self, coin, resolution, name, start=None, end=None):
+        """
+        Срез поля [start, end] без копирования (вид на memmap).
+        """
+        array = self.array(coin, resolution, name)
+        if array is None:
+            return np.empty(0, dtype=FIELDS[name][1])
+        lo = 0 if start is None else max(0, self.index_of(coin, resolution, start))
+        hi = (
+            len(array)
+            if end is None
+            else max(0, self.index_of(coin, resolution, end) + 1)
+        )
+        return array[lo:hi]
+
+    def frame(self, coin, resolution="1m", last=None):
+        """
+        Последние last свечей (все, если None) без пропусков в DataFrame
+        с колонками timestamp, open, high, low, close, volume.
+        """
+        times = self.array(coin, resolution, "time")
+        if times is None:
+            return pd.DataFrame(columns=["timestamp"] + list(FIELDS)[:-1])
+
+        # окно с конца расширяется, пока в нём не наберётся last свечей
+        window = len(times) if last is None else min(len(times), last)
+        while True:
+            present = np.flatnonzero(times[-window:]) + (len(times) - window)
+            if last is None or len(present) >= last or window == len(times):
+                break
+            window = min(len(times), window * 2)
+        if last is not None:
+            present = present[-last:]
+
+        data = {"timestamp": pd.to_datetime(times[present], unit="s", utc=True)}
+        for name in list(FIELDS)[:-1]:
+            data[name] = self.array(coin, resolution, name)[present]
+        return pd.DataFrame(data)
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 RES_MAP = {
     "1m": "coins_kline_1m",
     "5m": "coins_kline_5m",
@@ -5,4 +7,14 @@ RES_MAP = {
     "1h": "coins_kline_1h",
     "4h": "coins_kline_4h",
     "1d": "coins_kline_1d",
-}
\ No newline at end of file
+}
+
+# ширина свечи каждого разрешения (для архивных свечей, собираемых из 1m)
+RES_WIDTHS = {
+    "1m": timedelta(minutes=1),
+    "5m": timedelta(minutes=5),
+    "15m": timedelta(minutes=15),
+    "1h": timedelta(hours=1),
+    "4h": timedelta(hours=4),
+    "1d": timedelta(days=1),
+}
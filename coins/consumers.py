@@ -0,0 +1,54 @@
+import re
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .realtime import STREAMS, topic_group
+
+COIN_RE = re.compile(r"^[A-Z0-9]{1,20}$")
+MAX_TOPICS = 50
+
+
+class StreamConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Вебсокет для обновлений в реальном времени.
+    Клиент подписывается сообщением
+    {"action": "subscribe", "coin": "BTCUSDT", "stream": "orderbook"}
+    и получает {"stream", "coin", "data"} при каждом обновлении топика.
+    """
+
+    async def connect(self):
+        self.topics = set()
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in self.topics:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.topics.clear()
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get("action")
+        stream = content.get("stream")
+        coin = str(content.get("coin", "")).upper()
+
+        if action not in ("subscribe", "unsubscribe"):
+            await self.send_json({"error": "Invalid action"})
+            return
+        if stream not in STREAMS or not COIN_RE.match(coin):
+            await self.send_json({"error": "Invalid stream or coin"})
+            return
+
+        group = topic_group(stream, coin)
+        if action == "subscribe":
+            if group not in self.topics and len(self.topics) >= MAX_TOPICS:
+                await self.send_json({"error": "Too many subscriptions"})
+                return
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.topics.add(group)
+        else:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.topics.discard(group)
+
+        await self.send_json({"action": action, "stream": stream, "coin": coin})
+
+    async def stream_update(self, event):
+        await self.send(text_data=event["text"])
@@ -0,0 +1,312 @@
+"""
+Скользящие корреляции доходностей монет и беты к BTC по непрерывным
+агрегатам свечей. Лог-доходности окна лежат матрицей (монеты × свечи),
+по ней для каждой пары монет ведутся суммы по общим свечам:
+N = M·Mᵀ (число общих свечей), S = X·Mᵀ, Q = X²·Mᵀ, P = X·Xᵀ, где X -
+доходности с нулями вместо пропусков, M - маска наличия. Ковариация,
+дисперсии и корреляция пары считаются из сумм. С закрытием свечи суммы
+сдвигаются на вошедший и вышедший столбцы - O(монет²) вместо пересчёта
+всего окна. Задача update_correlations_task держит состояние в кэше
+(correlation:state:<разрешение>) и публикует рядом готовый ответ API
+(correlation:<разрешение>): матрицы, беты и лучшие пары, так что запрос
+не разбирает и не пересчитывает состояние. Монет по умолчанию не больше
+CORRELATION_MAX_COINS: размер сумм растёт как квадрат их числа.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+
+from .constants import RES_MAP, RES_WIDTHS
+from .models import Coin
+
+
+def correlation_state_key(resolution):
+    return f"correlation:state:{resolution}"
+
+
+def correlation_result_key(resolution):
+    return f"correlation:{resolution}"
+
+
+def closed_until(width):
+    """
+    Начало текущей (незакрытой) свечи, секунды: закрытые свечи - раньше.
+    """
+    now = int(time.time())
+    return now - now % width
+
+
+def fetch_closes(resolution, coins, since, until):
+    """
+    Цены закрытия свечей [since, until) (секунды) плотной матрицей
+    (монеты × свечи); NaN - свечи нет.
+    """
+    width = int(RES_WIDTHS[resolution].total_seconds())
+    closes = np.full((len(coins), (until - since) // width), np.nan)
+    if not closes.size:
+        return closes
+    index = {coin: i for i, coin in enumerate(coins)}
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT coin_id, extract(epoch FROM bucket)::bigint, close_price
+            FROM {RES_MAP[resolution]}
+            WHERE coin_id = ANY(%s) AND bucket >= to_timestamp(%s)
+                AND bucket < to_timestamp(%s);
+            """,
+            [list(coins), since, until],
+        )
+        rows = cur.fetchall()
+    if rows:
+        coin_ids, buckets, prices = zip(*rows)
+        closes[
+            [index[c] for c in coin_ids],
+            (np.array(buckets, dtype=np.int64) - since) // width,
+        ] = np.array(prices, dtype=np.float64)
+    # нулевая или отрицательная цена не даёт лог-доходности
+    closes[closes <= 0] = np.nan
+    return closes
+
+
+class RollingCorrelation:
+    def __init__(self, resolution, window, coins):
+        self.resolution = resolution
+        self.window = window
+        self.coins = list(coins)
+        self.width = int(RES_WIDTHS[resolution].total_seconds())
+        size = len(self.coins)
+        # кольцо доходностей: столбец pos - самый старый, его заменит следующая свеча
+        self.returns = np.full((size, window), np.nan)
+        self.pos = 0
+        self.last_close = np.full(size, np.nan)
+        # начало последней учтённой закрытой свечи, секунды
+        self.last_bucket = None
+        self.recompute()
+
+    @classmethod
+    def build(cls, resolution, window, coins):
+        """
+        Состояние по последним window закрытым свечам из базы.
+        """
+        state = cls(resolution, window, coins)
+        until = closed_until(state.width)
+        closes = fetch_closes(
+            resolution, state.coins, until - (window + 1) * state.width, until
+        )
+        state.returns = np.diff(np.log(closes), axis=1)
+        state.last_close = closes[:, -1]
+        state.last_bucket = until - state.width
+        state.recompute()
+        return state
+
+    def recompute(self):
+        """
+        Суммы по всему окну заново (после сборки и раз за оборот кольца,
+        чтобы не копилась погрешность сдвигов).
+        """
+        mask = ~np.isnan(self.returns)
+        x = np.where(mask, self.returns, 0.0)
+        m = mask.astype(np.float64)
+        self.n = m @ m.T
+        self.s = x @ m.T
+        self.q = (x * x) @ m.T
+        self.p = x @ x.T
+
+    def shift(self, column, sign):
+        mask = ~np.isnan(column)
+        x = np.where(mask, column, 0.0)
+        m = mask.astype(np.float64)
+        self.n += sign * np.outer(m, m)
+        self.s += sign * np.outer(x, m)
+        self.q += sign * np.outer(x * x, m)
+        self.p += sign * np.outer(x, x)
+
+    def push(self, closes):
+        """
+        Добавляет закрытую свечу (цены закрытия по монетам) и вытесняет
+        самую старую доходность окна.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            column = np.log(closes) - np.log(self.last_close)
+        self.shift(self.returns[:, self.pos], -1)
+        self.shift(column, 1)
+        self.returns[:, self.pos] = column
+        self.pos = (self.pos + 1) % self.window
+        self.last_close = closes
+        if self.pos == 0:
+            self.recompute()
+
+    def update(self):
+        """
+        Дописывает свечи, закрывшиеся после last_bucket. Возвращает их число;
+        None - пропуск длиннее окна, состояние нужно собрать заново.
+        """
+        until = closed_until(self.width)
+        since = self.last_bucket + self.width
+        count = (until - since) // self.width
+        if count <= 0:
+            return 0
+        if count >= self.window:
+            return None
+        closes = fetch_closes(self.resolution, self.coins, since, until)
+        for i in range(count):
+            self.push(closes[:, i])
+        self.last_bucket = until - self.width
+        return count
+
+    def matrices(self):
+        """
+        (ковариация, корреляция, дисперсия строки по общим с колонкой свечам).
+        Пары с меньше чем CORRELATION_MIN_PERIODS общими свечами - NaN.
+        """
+        n = np.where(self.n >= settings.CORRELATION_MIN_PERIODS, self.n, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (self.p - self.s * self.s.T / n) / (n - 1)
+            var = (self.q - self.s * self.s / n) / (n - 1)
+            corr = cov / np.sqrt(var * var.T)
+        return cov, np.clip(corr, -1.0, 1.0), var
+
+    def betas(self, cov=None, var=None):
+        """
+        {монета: бета к CORRELATION_BENCHMARK} по общим с ним свечам.
+        """
+        benchmark = settings.CORRELATION_BENCHMARK
+        if benchmark not in self.coins:
+            return {}
+        if cov is None:
+            cov, _, var = self.matrices()
+        b = self.coins.index(benchmark)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            betas = cov[:, b] / var.T[:, b]
+        return dict(zip(self.coins, nan_to_none(betas)))
+
+    def as_of(self):
+        return datetime.fromtimestamp(self.last_bucket + self.width, tz=timezone.utc)
+
+
+def nan_to_none(values):
+    if values.ndim > 1:
+        return [nan_to_none(row) for row in values]
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def correlation_coins():
+    """
+    CORRELATION_COINS или CORRELATION_MAX_COINS монет с наибольшим
+    оборотом (цена × объём) плюс эталон, по алфавиту.
+    """
+    if settings.CORRELATION_COINS:
+        return list(settings.CORRELATION_COINS)
+    top = Coin.objects.order_by(
+        (F("price") * F("volume")).desc(nulls_last=True)
+    ).values_list("coin", flat=True)[: settings.CORRELATION_MAX_COINS]
+    return sorted(set(top) | {settings.CORRELATION_BENCHMARK})
+
+
+def correlation_result(state):
+    """
+    Ответ API, посчитанный один раз на обновление: матрицы по всем монетам
+    состояния, беты и CORRELATION_TOP_K лучших пар каждой монеты.
+    """
+    cov, corr, var = state.matrices()
+    return {
+        "window": state.window,
+        "as_of": state.as_of(),
+        "coins": state.coins,
+        "correlation": corr,
+        "covariance": cov,
+        "beta": state.betas(cov, var),
+        "top": top_correlated(
+            state.coins, corr, state.coins, settings.CORRELATION_TOP_K
+        ),
+    }
+
+
+def update_correlations(resolution, window):
+    """
+    Обновляет состояние разрешения в кэше: дописывает закрывшиеся свечи
+    или собирает заново, если состояния нет, сменился набор монет или окно,
+    либо пропуск длиннее окна. Публикует готовый ответ API.
+    Возвращает число учтённых свечей.
+    """
+    coins = correlation_coins()
+    state = cache.get(correlation_state_key(resolution))
+    count = None
+    if state is not None and state.coins == coins and state.window == window:
+        count = state.update()
+    if count is None:
+        state = RollingCorrelation.build(resolution, window, coins)
+        count = window
+        logging.info(f"Корреляции {resolution}: окно {window} собрано заново")
+    if count:
+        # состояние старше окна всё равно собиралось бы заново
+        timeout = state.width * window
+        cache.set(correlation_state_key(resolution), state, timeout)
+        cache.set(
+            correlation_result_key(resolution), correlation_result(state), timeout
+        )
+    return count
+
+
+def top_correlated(names, corr, coins, k):
+    """
+    {монета: [{"coin": ..., "correlation": ...}, ...]} - k монет с наибольшей
+    корреляцией к каждой из coins (сама монета и NaN не учитываются).
+    names - монеты строк и столбцов corr.
+    """
+    index = {coin: i for i, coin in enumerate(names)}
+    ranked = np.where(np.isnan(corr), -np.inf, corr)
+    np.fill_diagonal(ranked, -np.inf)
+    top = {}
+    for coin in coins:
+        row = ranked[index[coin]]
+        order = np.argsort(row)[::-1][:k]
+        top[coin] = [
+            {"coin": names[j], "correlation": round(float(row[j]), 6)}
+            for j in order
+            if np.isfinite(row[j])
+        ]
+    return top
+
+
+def fetch_correlations(resolution, coins=None, top=None, covariance=False):
+    """
+    Ответ API из опубликованного результата: матрица корреляций
+    (и ковариаций) по монетам coins или top (не больше CORRELATION_TOP_K)
+    лучших пар для каждой из них, плюс беты к эталону.
+    LookupError - результат для разрешения ещё не посчитан.
+    """
+    result = cache.get(correlation_result_key(resolution))
+    if result is None:
+        raise LookupError(f"Correlations for {resolution} are not computed yet")
+    names = result["coins"]
+    coins = coins or names
+    unknown = [c for c in coins if c not in names]
+    if unknown:
+        raise ValueError(f"Unknown coins: {', '.join(unknown)}")
+
+    data = {
+        "resolution": resolution,
+        "window": result["window"],
+        "as_of": result["as_of"],
+        "benchmark": settings.CORRELATION_BENCHMARK,
+        "beta": {coin: result["beta"].get(coin) for coin in coins},
+    }
+    if top:
+        data["top"] = {coin: result["top"][coin][:top] for coin in coins}
+        return data
+
+    index = {coin: i for i, coin in enumerate(names)}
+    rows = [index[c] for c in coins]
+    data["coins"] = coins
+    data["correlation"] = nan_to_none(result["correlation"][np.ix_(rows, rows)])
+    if covariance:
+        data["covariance"] = nan_to_none(result["covariance"][np.ix_(rows, rows)])
+    return data
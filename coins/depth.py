@@ -0,0 +1,148 @@
+import numpy as np
+
+# Допуск на погрешность float при делении цены на шаг
+EPSILON = 1e-9
+
+
+def levels_to_arrays(levels):
+    """
+    Преобразует уровни стакана [[price, qty], ...] (строки или числа)
+    в два массива float64.
+    """
+    if not levels:
+        return np.empty(0), np.empty(0)
+    arr = np.asarray(levels, dtype=np.float64)
+    return arr[:, 0], arr[:, 1]
+
+
+def tick_decimals(tick):
+    """
+    Количество знаков после запятой, достаточное для цены, кратной шагу.
+    """
+    return max(0, int(np.ceil(-np.log10(tick))) + 1)
+
+
+def group_levels(prices, qtys, tick, side):
+    """
+    Группирует уровни в корзины шириной tick. Покупки округляются вниз,
+    продажи - вверх, чтобы корзина не заходила за лучшую цену.
+    Результат отсортирован от лучшей цены к худшей.
+    """
+    if prices.size == 0:
+        return prices, qtys
+
+    if side == "bids":
+        keys = np.floor(prices / tick + EPSILON)
+    else:
+        keys = np.ceil(prices / tick - EPSILON)
+
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=qtys)
+    grouped = np.round(buckets * tick, tick_decimals(tick))
+
+    if side == "bids":
+        return grouped[::-1], sums[::-1]
+    return grouped, sums
+
+
+def depth_within_bps(bid_prices, bid_qtys, ask_prices, ask_qtys, mid, bps):
+    """
+    Объём и оборот в пределах ±bps базисных пунктов от средней цены
+    для всех значений bps одной операцией (broadcasting).
+    """
+    bps = np.asarray(bps, dtype=np.float64)[:, None]
+    bid_mask = bid_prices[None, :] >= mid * (1 - bps / 10_000)
+    ask_mask = ask_prices[None, :] <= mid * (1 + bps / 10_000)
+
+    return {
+        "bid_qty": (bid_mask * bid_qtys).sum(axis=1),
+        "ask_qty": (ask_mask * ask_qtys).sum(axis=1),
+        "bid_notional": (bid_mask * (bid_prices * bid_qtys)).sum(axis=1),
+        "ask_notional": (ask_mask * (ask_prices * ask_qtys)).sum(axis=1),
+    }
+
+
+def book_metrics(bids, asks):
+    """
+    Производные метрики снимка стакана: средняя цена, спред в базисных пунктах,
+    суммарный объём сторон и дисбаланс (bid - ask) / (bid + ask).
+    Уровни должны быть отсортированы от лучшей цены.
+    """
+    bid_prices, bid_qtys = levels_to_arrays(bids)
+    ask_prices, ask_qtys = levels_to_arrays(asks)
+
+    bid_qty = float(bid_qtys.sum())
+    ask_qty = float(ask_qtys.sum())
+    total = bid_qty + ask_qty
+
+    mid = spread_bps = None
+    if bid_prices.size and ask_prices.size:
+        mid = float((bid_prices[0] + ask_prices[0]) / 2)
+        spread_bps = float((ask_prices[0] - bid_prices[0]) / mid * 10_000)
+
+    return {
+        "mid_price": mid,
+        "spread_bps": spread_bps,
+        "bid_qty": bid_qty,
+        "ask_qty": ask_qty,
+        "imbalance": (bid_qty - ask_qty) / total if total else None,
+    }
+
+
+def side_curve(prices, qtys):
+    """
+    Кумулятивная кривая глубины одной стороны стакана.
+    """
+    return {
+        "price": prices.tolist(),
+        "qty": qtys.tolist(),
+        "cum_qty": np.cumsum(qtys).tolist(),
+        "cum_notional": np.cumsum(prices * qtys).tolist(),
+    }
+
+
+def aggregate_order_book(bids, asks, tick=None, tick_pct=None, bps=(10, 50, 100)):
+    """
+    Агрегация стакана: группировка по шагу цены (tick - абсолютный,
+    tick_pct - в процентах от средней цены), кумулятивная глубина
+    и глубина в пределах ±bps.
+    """
+    bid_prices, bid_qtys = levels_to_arrays(bids)
+    ask_prices, ask_qtys = levels_to_arrays(asks)
+
+    # уровни из горячего снимка уже отсортированы, из базы - не обязательно
+    bid_order = np.argsort(-bid_prices)
+    bid_prices, bid_qtys = bid_prices[bid_order], bid_qtys[bid_order]
+    ask_order = np.argsort(ask_prices)
+    ask_prices, ask_qtys = ask_prices[ask_order], ask_qtys[ask_order]
+
+    if bid_prices.size and ask_prices.size:
+        mid = (bid_prices[0] + ask_prices[0]) / 2
+    elif bid_prices.size or ask_prices.size:
+        mid = bid_prices[0] if bid_prices.size else ask_prices[0]
+    else:
+        mid = None
+
+    # глубина считается по исходным уровням, до округления цен по шагу
+    depth = {}
+    if mid:
+        within = depth_within_bps(bid_prices, bid_qtys, ask_prices, ask_qtys, mid, bps)
+        depth = {
+            str(value): {key: float(arr[i]) for key, arr in within.items()}
+            for i, value in enumerate(bps)
+        }
+
+    if tick_pct and mid:
+        tick = mid * tick_pct / 100
+
+    if tick:
+        bid_prices, bid_qtys = group_levels(bid_prices, bid_qtys, tick, "bids")
+        ask_prices, ask_qtys = group_levels(ask_prices, ask_qtys, tick, "asks")
+
+    return {
+        "mid": float(mid) if mid else None,
+        "tick": float(tick) if tick else None,
+        "bids": side_curve(bid_prices, bid_qtys),
+        "asks": side_curve(ask_prices, ask_qtys),
+        "depth_bps": depth,
+    }
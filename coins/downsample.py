@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def fill_gaps(x, y):
+    """
+    Пропуски (NaN) заполняются линейной интерполяцией по соседним точкам.
+    """
+    mask = np.isnan(y)
+    if not mask.any():
+        return y
+    if mask.all():
+        return np.zeros_like(y)
+    return np.interp(x, x[~mask], y[~mask])
+
+
+def lttb_indices(x, y, points):
+    """
+    Индексы точек, выбранных алгоритмом Largest-Triangle-Three-Buckets.
+    Первая и последняя точки сохраняются, из каждой промежуточной корзины
+    берётся точка с наибольшей площадью треугольника с предыдущей выбранной
+    точкой и средним следующей корзины. Площади в корзине считаются векторно.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = fill_gaps(x, np.asarray(y, dtype=np.float64))
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    edges = np.append(edges, n)
+
+    # средние следующих корзин не зависят от выбора и считаются заранее
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
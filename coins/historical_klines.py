@@ -3,9 +3,10 @@ import django
 from binance import AsyncClient, HistoricalKlinesType
 from dotenv import load_dotenv
 from asgiref.sync import sync_to_async
-from coins.models import Kline, Coin
+from coins.models import Coin
+from coins.kline_pages import insert_kline_columns, kline_dicts, parse_kline_page
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime
 import logging
 
 # Настройка логирования
@@ -17,32 +18,12 @@ django.setup()
 load_dotenv()
 
 @sync_to_async
-def save_kline_data_bulk(coin_name, data):
-    """Сохранение данных о свечах в базу данных пакетно."""
-    try:
-        # Проверяем наличие монеты только один раз при старте парсинга
-        coin = Coin.objects.get(coin=coin_name)
-        # logging.info(f"Монета {coin_name} найдена в базе данных.") # Это лучше логировать снаружи цикла
-    except Coin.DoesNotExist:
-        logging.error(f"Монета {coin_name} не найдена в базе данных.")
-        raise ValueError(f"Монета {coin_name} не найдена в базе данных.")
-
-    # logging.debug(f"Данные для сохранения: {data[:5]}")
-
-    Kline.objects.bulk_create([
-        Kline(
-            coin=coin,
-            transaction_time=item['transaction_time'],
-            open_price=item['open_price'],
-            close_price=item['close_price'],
-            high_price=item['high_price'],
-            low_price=item['low_price'],
-            volume=item['volume']
-        ) for item in data
-    ], ignore_conflicts=True)
-    logging.info(f"Сохранено {len(data)} свечей для {coin_name}.")
-
-async def fetch_historical_klines(client, symbol, interval, start_time="1 Jan 2017", end_time=None, limit=1000):
+def save_kline_columns(coin_name, columns):
+    """Сохранение страницы свечей (колонки NumPy) в базу данных одним запросом."""
+    inserted = insert_kline_columns(coin_name, columns)
+    logging.info(f"Сохранено {inserted} из {len(columns['open_time'])} свечей для {coin_name}.")
+
+async def fetch_historical_klines(client, symbol, interval, start_time="1 Jan 2017", end_time=None, limit=1000, writer=None):
     try:
         # --- Добавлено: Предварительная проверка монеты ---
         try:
@@ -76,26 +57,16 @@ async def fetch_historical_klines(client, symbol, interval, start_time="1 Jan 20
                 logging.info(f"Данные для {symbol} закончились.")
                 break
 
-            processed_data = [] # Список для хранения данных текущей партии
-
-            for kline in klines:
-                transaction_time = datetime.fromtimestamp(int(kline[0]) / 1000, tz=timezone.utc)
-                data_item = {
-                    'transaction_time': transaction_time,
-                    'open_price': float(kline[1]),
-                    'high_price': float(kline[2]),
-                    'low_price': float(kline[3]),
-                    'close_price': float(kline[4]),
-                    'volume': float(kline[5])
-                }
-                processed_data.append(data_item)
+            # страница разбирается в типизированные колонки за один проход
+            columns = parse_kline_page(klines)
 
-            logging.info(f"Получены данные для {symbol}, интервал {interval}. Последняя свеча партии: {datetime.fromtimestamp(klines[-1][0] / 1000)}. Количество: {len(processed_data)}")
+            logging.info(f"Получены данные для {symbol}, интервал {interval}. Последняя свеча партии: {datetime.fromtimestamp(klines[-1][0] / 1000)}. Количество: {len(klines)}")
 
-            # --- Изменено: Сохраняем данные сразу после получения ---
-            if processed_data:
-                await save_kline_data_bulk(symbol, processed_data)
-            # ----------------------------------------------------
+            if writer is not None:
+                # дозагрузка в сжатые диапазоны (coins.backfill.KlineBackfill)
+                await sync_to_async(writer.add)(symbol, kline_dicts(columns))
+            else:
+                await save_kline_columns(symbol, columns)
 
             if len(klines) < limit:
                 break
@@ -111,7 +82,7 @@ async def fetch_historical_klines(client, symbol, interval, start_time="1 Jan 20
     logging.info(f"Парсинг исторических данных для {symbol} завершен.")
 
 
-async def start_websocket():
+async def start_websocket(writer=None):
     # ... (остальной код функции start_websocket остается без изменений) ...
     api_key = os.getenv('BINANCE_API_KEY')
     secret_key = os.getenv('BINANCE_SECRET_KEY')
@@ -126,7 +97,7 @@ async def start_websocket():
         interval = '1m'
 
         # Запускаем парсинг для каждого символа параллельно
-        await asyncio.gather(*[fetch_historical_klines(client, symbol, interval) for symbol in symbols])
+        await asyncio.gather(*[fetch_historical_klines(client, symbol, interval, writer=writer) for symbol in symbols])
 
     except KeyboardInterrupt:
         logging.info("Парсинг остановлен пользователем")
@@ -0,0 +1,137 @@
+"""
+Супервизор сбора данных: потоки тикеров, свечей и стакана работают задачами
+одного цикла событий с общим REST-клиентом Binance. Запись в базу во всех
+потоках идёт через sync_to_async (thread_sensitive), то есть через общий
+поток-писатель с одним соединением, буферы spool тоже общие на процесс.
+Упавший поток перезапускается с экспоненциальной задержкой и случайным
+разбросом, остальные продолжают работать. Состояние потоков публикуется
+в кэш (ingestion:<поток>) и отдаётся через /api/ingestion/health/.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+
+from .caching import set_ingestion_health
+from .coin_table import stream_tickers
+from .kline_data import stream_klines
+from .order_book import stream_order_book
+from .stream import create_client
+
+# имена совпадают с caching.INGESTION_STREAMS
+STREAMS = {
+    "ticker": stream_tickers,
+    "kline": stream_klines,
+    "orderbook": stream_order_book,
+}
+
+
+def backoff_delay(failures):
+    """
+    Задержка перед failures-м перезапуском подряд: BASE * 2^(failures - 1),
+    не больше MAX, случайная в [delay / 2, delay], чтобы потоки после общего
+    сбоя сети не переподключались одновременно.
+    """
+    delay = min(
+        settings.INGESTION_BACKOFF_MAX,
+        settings.INGESTION_BACKOFF_BASE * 2 ** (failures - 1),
+    )
+    return random.uniform(delay / 2, delay)
+
+
+class StreamState:
+    def __init__(self, name):
+        self.name = name
+        self.status = "starting"
+        self.started_at = None
+        self.last_message_at = None
+        self.messages = 0
+        self.restarts = 0
+        # сбои подряд: по ним считается задержка перезапуска
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = None
+
+    def message(self):
+        self.messages += 1
+        self.last_message_at = time.time()
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "last_message_at": self.last_message_at,
+            "messages": self.messages,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "retry_at": self.retry_at,
+        }
+
+
+class Supervisor:
+    def __init__(self, streams=None, record_dir=None):
+        self.streams = list(streams or STREAMS)
+        self.record_dir = record_dir
+        self.states = {name: StreamState(name) for name in self.streams}
+        self.client = None
+
+    async def run(self):
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+        self.client = await create_client()
+        try:
+            await asyncio.gather(
+                *(self.supervise(name) for name in self.streams), self.report()
+            )
+        finally:
+            await self.client.close_connection()
+
+    async def supervise(self, name):
+        state = self.states[name]
+        record = (
+            os.path.join(self.record_dir, f"{name}.frames") if self.record_dir else None
+        )
+        while True:
+            state.status = "running"
+            state.started_at = time.time()
+            state.retry_at = None
+            self.publish(state)
+            try:
+                await STREAMS[name](self.client, record, on_message=state.message)
+                error = "поток завершился"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            # после долгой работы отсчёт задержки начинается заново
+            if time.time() - state.started_at >= settings.INGESTION_BACKOFF_RESET:
+                state.failures = 0
+            state.failures += 1
+            state.restarts += 1
+            delay = backoff_delay(state.failures)
+            state.status = "backoff"
+            state.last_error = error
+            state.retry_at = time.time() + delay
+            self.publish(state)
+            logging.warning(
+                f"Поток {name} остановлен ({error}), перезапуск через {delay:.1f} с"
+            )
+            await asyncio.sleep(delay)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(settings.INGESTION_HEALTH_INTERVAL)
+            for state in self.states.values():
+                self.publish(state)
+
+    def publish(self, state):
+        try:
+            set_ingestion_health(state.name, state.as_dict())
+        except Exception as e:
+            # недоступный кэш не должен останавливать сбор данных
+            logging.warning(f"Не удалось опубликовать состояние {state.name}: {e}")
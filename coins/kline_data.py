@@ -1,15 +1,13 @@
-import os
-import django
-from binance import AsyncClient, BinanceSocketManager
 from django.utils.timezone import now
 from dotenv import load_dotenv
 from asgiref.sync import sync_to_async
 from .models import Kline, Coin
-import asyncio
-from datetime import datetime
-
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "binance_parser.settings")
-django.setup()
+from .realtime import publisher
+from .caching import bump_data_version
+from .kline_gaps import fill_gaps, note_closed
+from .stream import create_client, open_stream
+from .spool import DATABASE_UNAVAILABLE, get_spool, spool_on_failure
+from datetime import datetime, timezone
 
 load_dotenv()
 
@@ -21,19 +19,40 @@ def save_kline_data(
     """
     Сохранение данныхх о свечах в базу данных
     """
-    coin, _ = Coin.objects.get_or_create(coin=coin)
+    symbol = coin
+    try:
+        coin, _ = Coin.objects.get_or_create(coin=symbol)
 
-    Kline.objects.update_or_create(
-        coin=coin,
-        transaction_time=transaction_time,
-        defaults={
-            "open_price": open_price,
-            "close_price": close_price,
-            "high_price": high_price,
-            "low_price": low_price,
-            "volume": volume,
-        },
-    )
+        Kline.objects.update_or_create(
+            coin=coin,
+            transaction_time=transaction_time,
+            defaults={
+                "open_price": open_price,
+                "close_price": close_price,
+                "high_price": high_price,
+                "low_price": low_price,
+                "volume": volume,
+            },
+        )
+    except DATABASE_UNAVAILABLE as e:
+        spool_on_failure(
+            "kline",
+            [
+                {
+                    "coin": symbol,
+                    "transaction_time": transaction_time,
+                    "open_price": open_price,
+                    "close_price": close_price,
+                    "high_price": high_price,
+                    "low_price": low_price,
+                    "volume": volume,
+                }
+            ],
+            e,
+        )
+        return
+    bump_data_version("kline", coin.coin)
+    get_spool("kline").replay_pending()
     print(f"Созранена свеча для {coin}: Открвтие={open_price}, Закрытие={close_price}")
 
 
@@ -60,41 +79,61 @@ async def handle_kline_data(data):
             volume,
             transaction_time,
         )
+        if kline_data.get("x"):
+            note_closed(coin, timestamp)
+        publisher.publish(
+            "kline",
+            coin,
+            {
+                "time": datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc),
+                "open": open_price,
+                "high": high_price,
+                "low": low_price,
+                "close": close_price,
+                "volume": volume,
+                "closed": bool(kline_data.get("x")),
+            },
+        )
     except Exception as e:
         print(f"ошибка при обработке данных о свечах: {e}")
 
 
-async def start_websocket():
+async def stream_klines(client, record=None, on_message=None):
     """
-    Запуск вебсокет для получения данных о свечах
+    Чтение потока свечей; ошибки соединения передаются вызывающему
+    (start_websocket или супервизор run_ingestion)
     """
-    api_key = os.getenv("BINANCE_API_KEY")
-    secret_key = os.getenv("BINANCE_SECRET_KEY")
+    symbols = ["btcusdt", "ethusdt"]
+    interval = "1m"
+    combined_streams = [f"{channel}@kline_{interval}" for channel in symbols]
+    # только лёгкий клиент: BinanceSocketManager переподключается сам, и после
+    # такого переподключения пропуск не дозагружался бы. У лёгкого клиента
+    # каждое новое соединение - новый вход сюда, с fill_gaps
+    ticker = open_stream(client, combined_streams, record, lean=True)
 
-    if not api_key or not secret_key:
-        raise ValueError("API ключи не найдены в переменных окружения")
+    async with ticker as stream:
+        # свечи, пропущенные без соединения, дозагружаются до живых обновлений;
+        # кадры, пришедшие за это время, ждут в буфере соединения
+        await fill_gaps(client, symbols, interval)
+        while True:
+            res = await stream.recv()
+            if on_message is not None:
+                on_message()
+            if "stream" in res and "data" in res:
+                data = res["data"]
+                await handle_kline_data(data)
 
-    client = await AsyncClient.create(api_key, secret_key)
-    web_socket = BinanceSocketManager(client)
-    try:
-        symbols = ["btcusdt", "ethusdt"]
-        interval = "1m"
-        combined_streams = [f"{channel}@kline_{interval}" for channel in symbols]
-        ticker = web_socket.multiplex_socket(combined_streams)
 
-        async with ticker as stream:
-            while True:
-                res = await stream.recv()
-                if "stream" in res and "data" in res:
-                    data = res["data"]
-                    await handle_kline_data(data)
+async def start_websocket(record=None):
+    """
+    Запуск вебсокет для получения данных о свечах
+    """
+    client = await create_client()
+    try:
+        await stream_klines(client, record)
     except KeyboardInterrupt:
         print("WebSocket остановлен пользователем")
     except Exception as e:
         print(f"Ошибка при работе с WebSocket: {e}")
     finally:
         await client.close_connection()
-
-
-if __name__ == "__main__":
-    asyncio.run(start_websocket())
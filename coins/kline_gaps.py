@@ -0,0 +1,185 @@
+"""
+Дозагрузка свечей, пропущенных потоком свечей за время без соединения.
+Поток запоминает последнюю закрытую свечу каждой монеты (note_closed);
+после подключения fill_gaps запрашивает через REST /api/v3/klines только
+недостающий интервал - по всем монетам параллельно под общим ограничением
+частоты запросов, и лишь потом поток переходит к живым обновлениям.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .backfill import refresh_kline_aggregates
+from .caching import bump_data_version
+from .constants import RES_WIDTHS
+from .kline_pages import insert_kline_columns, kline_dicts, parse_kline_page
+from .spool import DATABASE_UNAVAILABLE, spool_on_failure
+
+# ограничение REST API на число свечей в ответе
+PAGE_LIMIT = 1000
+
+# монета -> время открытия последней закрытой свечи (мс)
+last_closed = {}
+
+
+def note_closed(symbol, open_time):
+    last_closed[symbol] = max(open_time, last_closed.get(symbol, 0))
+
+
+class RateLimiter:
+    """
+    Не больше rate запросов в секунду на все монеты, равномерно.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self.next_at - now
+        self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@sync_to_async
+def stored_last_times(symbols):
+    """
+    Время последней свечи монет в базе (мс) - для монет, о которых процесс
+    ещё ничего не знает (первый запуск). Эта свеча могла быть сохранена
+    незакрытой, поэтому дозагрузка начинается с неё самой.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.coin, (extract(epoch FROM k.transaction_time) * 1000)::bigint
+            FROM unnest(%s::text[]) AS s(coin)
+            CROSS JOIN LATERAL (
+                SELECT transaction_time FROM coins_kline
+                WHERE coin_id = s.coin
+                ORDER BY transaction_time DESC
+                LIMIT 1
+            ) k;
+            """,
+            [list(symbols)],
+        )
+        return dict(cur.fetchall())
+
+
+@sync_to_async
+def save_gap_page(symbol, columns):
+    # свеча, сохранённая незакрытой до обрыва, перезаписывается итоговой
+    try:
+        insert_kline_columns(symbol, columns, update=True)
+    except DATABASE_UNAVAILABLE as e:
+        spool_on_failure(
+            "kline", [{"coin": symbol, **row} for row in kline_dicts(columns)], e
+        )
+        return
+    bump_data_version("kline", symbol)
+
+
+async def fetch_gap(client, limiter, symbol, interval, start, end):
+    """
+    Свечи монеты с времени открытия start по end (мс) постранично.
+    Возвращает число загруженных свечей.
+    """
+    total = 0
+    while start <= end:
+        await limiter.wait()
+        klines = await client.get_klines(
+            symbol=symbol,
+            interval=interval,
+            startTime=start,
+            endTime=end,
+            limit=PAGE_LIMIT,
+        )
+        if not klines:
+            break
+        await save_gap_page(symbol, parse_kline_page(klines))
+        total += len(klines)
+
+        # закрыты свечи, время закрытия которых уже прошло
+        closed = [k[0] for k in klines if k[6] < end]
+        if closed:
+            note_closed(symbol, closed[-1])
+        if len(klines) < PAGE_LIMIT:
+            break
+        start = klines[-1][0] + 1
+    return total
+
+
+async def fill_gaps(client, symbols, interval="1m"):
+    """
+    Дозагружает свечи монет с последней закрытой до текущего момента.
+    Пропуски старше KLINE_GAP_MAX_HOURS обрезаются: более старую историю
+    дозагружает run_historical_kline_websocket. Монеты без единой свечи
+    в базе пропускаются. Затем агрегаты свечей пересчитываются снизу вверх
+    за дозагруженный диапазон.
+    """
+    width = int(RES_WIDTHS[interval].total_seconds() * 1000)
+    now = int(time.time() * 1000)
+    oldest = now - settings.KLINE_GAP_MAX_HOURS * 3600 * 1000
+    symbols = [s.upper() for s in symbols]
+
+    unknown = [s for s in symbols if s not in last_closed]
+    stored = {}
+    if unknown:
+        try:
+            stored = await stored_last_times(unknown)
+        except DATABASE_UNAVAILABLE as e:
+            logging.warning(
+                f"База недоступна, пропуски {', '.join(unknown)} не проверены: {e}"
+            )
+
+    starts = {}
+    for symbol in symbols:
+        if symbol in last_closed:
+            start = last_closed[symbol] + width
+        elif symbol in stored:
+            start = stored[symbol]
+        else:
+            continue
+        if start < oldest:
+            logging.warning(
+                f"Пропуск свечей {symbol} с "
+                f"{datetime.fromtimestamp(start / 1000, tz=timezone.utc)} длиннее "
+                f"{settings.KLINE_GAP_MAX_HOURS} ч, дозагружаются последние "
+                f"{settings.KLINE_GAP_MAX_HOURS} ч"
+            )
+            start = oldest
+        starts[symbol] = start
+
+    limiter = RateLimiter(settings.KLINE_GAP_REQUESTS_PER_SECOND)
+    results = await asyncio.gather(
+        *(
+            fetch_gap(client, limiter, symbol, interval, start, now)
+            for symbol, start in starts.items()
+        ),
+        return_exceptions=True,
+    )
+    filled = []
+    for symbol, result in zip(starts, results):
+        if isinstance(result, Exception):
+            # поток продолжает работу; пропуск дозагружается run_historical_kline_websocket
+            logging.warning(f"Не удалось дозагрузить свечи {symbol}: {result}")
+        elif result:
+            filled.append(starts[symbol])
+            logging.info(f"Дозагружено {result} свечей {symbol}")
+
+    if filled:
+        # политики обновления агрегатов смотрят только на последние часы
+        try:
+            await sync_to_async(refresh_kline_aggregates)(
+                datetime.fromtimestamp(min(filled) / 1000, tz=timezone.utc),
+                datetime.fromtimestamp(now / 1000, tz=timezone.utc),
+            )
+        except DATABASE_UNAVAILABLE as e:
+            logging.warning(f"Агрегаты свечей не пересчитаны: {e}")
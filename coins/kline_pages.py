@@ -0,0 +1,81 @@
+"""
+Разбор страниц свечей REST API Binance в колонки NumPy за один проход
+и пакетная запись колонок в базу одним INSERT ... SELECT FROM unnest.
+Строка страницы: [open_time, open, high, low, close, volume, close_time, ...],
+цены и объём приходят строками.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+from django.db import connection
+
+PRICE_COLUMNS = ["open_price", "high_price", "low_price", "close_price", "volume"]
+
+
+def parse_kline_page(klines):
+    """
+    Страница свечей -> {"open_time": int64 (мс), "open_price": float64, ...}.
+    Первые шесть полей всех строк разбираются одним преобразованием типов.
+    """
+    if not klines:
+        return {
+            "open_time": np.empty(0, dtype=np.int64),
+            **{name: np.empty(0, dtype=np.float64) for name in PRICE_COLUMNS},
+        }
+    page = np.array([k[:6] for k in klines], dtype=object)
+    values = page[:, 1:6].astype(np.float64)
+    columns = {"open_time": page[:, 0].astype(np.int64)}
+    for i, name in enumerate(PRICE_COLUMNS):
+        columns[name] = values[:, i]
+    return columns
+
+
+def insert_kline_columns(coin, columns, table="coins_kline", update=False):
+    """
+    Запись колонок свечей одним запросом: массивы передаются параметрами
+    и разворачиваются unnest на стороне базы. Существующие свечи не меняются,
+    а с update=True перезаписываются (свеча, сохранённая незакрытой).
+    Возвращает число вставленных (и обновлённых) строк.
+    """
+    if not len(columns["open_time"]):
+        return 0
+    conflict = "DO NOTHING"
+    if update:
+        conflict = "(coin_id, transaction_time) DO UPDATE SET " + ", ".join(
+            f"{name} = EXCLUDED.{name}" for name in PRICE_COLUMNS
+        )
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {table} (coin_id, transaction_time, {", ".join(PRICE_COLUMNS)})
+            SELECT %s, to_timestamp(t / 1000.0), {", ".join(PRICE_COLUMNS)}
+            FROM unnest(
+                %s::bigint[], %s::float8[], %s::float8[],
+                %s::float8[], %s::float8[], %s::float8[]
+            ) AS u(t, {", ".join(PRICE_COLUMNS)})
+            ON CONFLICT {conflict};
+            """,
+            [coin, columns["open_time"].tolist()]
+            + [columns[name].tolist() for name in PRICE_COLUMNS],
+        )
+        return cur.rowcount
+
+
+def kline_dicts(columns):
+    """
+    Колонки -> список словарей transaction_time, open_price, ...
+    (для KlineBackfill.add и других потребителей строк).
+    """
+    times = [
+        datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+        for ms in columns["open_time"].tolist()
+    ]
+    values = [columns[name].tolist() for name in PRICE_COLUMNS]
+    return [
+        {
+            "transaction_time": time,
+            **{name: column[i] for name, column in zip(PRICE_COLUMNS, values)},
+        }
+        for i, time in enumerate(times)
+    ]
@@ -0,0 +1,72 @@
+from django.db import connection
+
+from .models import (
+    LatestSentimentIndicator,
+    LatestTechnicalTrigger,
+    LatestVolatilityLiquidityIndicator,
+    SentimentIndicator,
+    TechnicalTrigger,
+    VolatilityLiquidityIndicator,
+)
+
+# история индикаторов -> таблица последнего состояния
+LATEST_MODELS = {
+    SentimentIndicator: LatestSentimentIndicator,
+    VolatilityLiquidityIndicator: LatestVolatilityLiquidityIndicator,
+    TechnicalTrigger: LatestTechnicalTrigger,
+}
+
+
+def upsert_latest(model, instances):
+    """
+    Записывает строки в таблицу последнего состояния одним INSERT ... ON CONFLICT.
+    Строка монеты заменяется только строкой с тем же или более поздним временем,
+    поэтому пересчёт старых данных не откатывает последнее состояние назад.
+    """
+    latest = {}
+    for obj in instances:
+        current = latest.get(obj.coin_id)
+        if current is None or current.transaction_time <= obj.transaction_time:
+            latest[obj.coin_id] = obj
+    if not latest:
+        return
+
+    fields = model._meta.concrete_fields
+    table = model._meta.db_table
+    columns = ", ".join(f.column for f in fields)
+    updates = ", ".join(
+        f"{f.column} = EXCLUDED.{f.column}" for f in fields if not f.primary_key
+    )
+    row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+
+    params = []
+    for obj in latest.values():
+        params.extend(
+            f.get_db_prep_save(getattr(obj, f.attname), connection) for f in fields
+        )
+
+    sql = f"""
+    INSERT INTO {table} ({columns})
+    VALUES {", ".join([row] * len(latest))}
+    ON CONFLICT (coin_id) DO UPDATE SET {updates}
+    WHERE {table}.transaction_time <= EXCLUDED.transaction_time;
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+
+
+def update_latest_indicators(indicators):
+    """
+    Обновляет последнее состояние по строкам истории одного семейства индикаторов.
+    """
+    if not indicators:
+        return
+    model = LATEST_MODELS[type(indicators[0])]
+    attnames = [f.attname for f in model._meta.concrete_fields]
+    upsert_latest(
+        model,
+        [
+            model(**{name: getattr(indicator, name) for name in attnames})
+            for indicator in indicators
+        ],
+    )
@@ -0,0 +1,329 @@
+import json
+import math
+import statistics
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from coins.models import (
+    Coin,
+    SentimentIndicator,
+    TechnicalTrigger,
+    VolatilityLiquidityIndicator,
+)
+from coins.services import (
+    SNAPSHOT_COLUMNS,
+    indicator_query,
+    klines_page_query,
+    latest_klines_query,
+    order_book_page_query,
+)
+
+# допустимые интервалы чанков, от меньшего к большему
+CANDIDATE_INTERVALS = [
+    timedelta(hours=1),
+    timedelta(hours=6),
+    timedelta(hours=12),
+    timedelta(days=1),
+    timedelta(days=2),
+    timedelta(days=7),
+    timedelta(days=14),
+    timedelta(days=30),
+]
+
+
+def interval_sql(value):
+    """
+    timedelta в интервал PostgreSQL: '7 days', '6 hours'.
+    """
+    if value.total_seconds() % 86400 == 0:
+        return f"{value.days} days"
+    return f"{int(value.total_seconds() // 3600)} hours"
+
+
+def hot_queries(coin):
+    """
+    Запросы API, которые выполняются чаще всего: (sql, params) по имени.
+    """
+    queries = {
+        "klines_page_1m": klines_page_query("coins_kline_1m", coin, None, None, 500),
+        "orderbook_page": order_book_page_query(coin, None, None, 100),
+        "orderbook_1m_page": order_book_page_query(
+            coin,
+            None,
+            None,
+            100,
+            table="coins_orderbook_1m",
+            columns=SNAPSHOT_COLUMNS,
+        ),
+    }
+    queries = {name: (sql, params) for name, (sql, params, _) in queries.items()}
+    queries["klines_latest_1m"] = (latest_klines_query("coins_kline_1m"), [500, [coin]])
+    for name, model in (
+        ("sentiment", SentimentIndicator),
+        ("volatility", VolatilityLiquidityIndicator),
+        ("technical", TechnicalTrigger),
+    ):
+        queries[name] = (indicator_query(model)[0], [coin, 100])
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Рекомендации по интервалу чанков и числу пространственных разделов "
+        "гипертаблиц по фактическим размерам чанков и скорости записи. "
+        "--apply применяет рекомендации к новым чанкам, --save/--compare "
+        "сохраняют и сравнивают время планирования частых запросов API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-mb",
+            type=int,
+            help=(
+                "Целевой размер чанка с индексами, МБ (по умолчанию: shared_buffers, "
+                "делённый на число гипертаблиц - свежие чанки всех таблиц "
+                "должны помещаться в память одновременно)"
+            ),
+        )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Применить рекомендации (действуют для новых чанков)",
+        )
+        parser.add_argument(
+            "--coin", help="Монета для замера планирования (по умолчанию: первая)"
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Повторов EXPLAIN на запрос, берётся медиана (по умолчанию: 5)",
+        )
+        parser.add_argument("--save", help="Сохранить время планирования в JSON-файл")
+        parser.add_argument(
+            "--compare", help="Сравнить время планирования с сохранённым JSON-файлом"
+        )
+
+    def handle(self, *args, **options):
+        tables = self.get_hypertables()
+        if not tables:
+            self.stderr.write(self.style.ERROR("Гипертаблицы не найдены"))
+            return
+
+        target = (
+            options["target_mb"] * 1024 * 1024
+            if options["target_mb"]
+            else self.get_shared_buffers() // len(tables)
+        )
+        coins = Coin.objects.count()
+        self.stdout.write(
+            f"Целевой размер чанка: {target / 1048576:.0f} МБ, монет: {coins}\n"
+        )
+
+        self.stdout.write(
+            f"{'таблица':<40} {'чанков':>7} {'интервал':>10} {'разделов':>9} "
+            f"{'МБ/сутки':>9} {'строк/сутки':>12} {'ср. чанк, МБ':>13} "
+            f"{'-> интервал':>12} {'-> разделов':>12}"
+        )
+        for table in tables:
+            stats = self.get_chunk_stats(table)
+            interval, partitions = self.recommend(stats["bytes_per_day"], coins, target)
+            self.stdout.write(
+                f"{table['name']:<40} {stats['chunks']:>7} "
+                f"{interval_sql(table['interval']):>10} "
+                f"{table['partitions'] or 1:>9} "
+                f"{stats['bytes_per_day'] / 1048576:>9.1f} "
+                f"{stats['rows_per_day']:>12.0f} "
+                f"{stats['avg_chunk_bytes'] / 1048576:>13.1f} "
+                f"{interval_sql(interval):>12} {partitions:>12}"
+            )
+            if options["apply"]:
+                self.apply(table, interval, partitions)
+
+        coin = options["coin"] or (
+            Coin.objects.order_by("id").values_list("coin", flat=True).first()
+        )
+        if coin:
+            self.report_planning(coin, options)
+
+    def get_hypertables(self):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT h.hypertable_name, t.time_interval,
+                    s.num_partitions, s.column_name
+                FROM timescaledb_information.hypertables h
+                JOIN timescaledb_information.dimensions t
+                    ON t.hypertable_name = h.hypertable_name
+                    AND t.dimension_type = 'Time'
+                LEFT JOIN timescaledb_information.dimensions s
+                    ON s.hypertable_name = h.hypertable_name
+                    AND s.dimension_type = 'Space'
+                WHERE h.hypertable_schema = 'public'
+                ORDER BY h.hypertable_name;
+                """)
+            return [
+                {
+                    "name": name,
+                    "interval": interval,
+                    "partitions": partitions,
+                    "space_column": space_column,
+                }
+                for name, interval, partitions, space_column in cur.fetchall()
+            ]
+
+    def get_shared_buffers(self):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT setting::bigint * pg_size_bytes(coalesce(unit, '1B'))
+                FROM pg_settings WHERE name = 'shared_buffers';
+                """)
+            return cur.fetchone()[0]
+
+    def get_chunk_stats(self, table):
+        """
+        Размер и скорость роста по несжатым чанкам (сжатые сильно меньше и
+        занижают оценку); если несжатых нет - по всем чанкам.
+        """
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    count(*),
+                    count(*) FILTER (WHERE NOT c.is_compressed),
+                    coalesce(sum(s.total_bytes), 0),
+                    coalesce(sum(s.total_bytes) FILTER (WHERE NOT c.is_compressed), 0),
+                    count(DISTINCT c.range_start),
+                    count(DISTINCT c.range_start) FILTER (WHERE NOT c.is_compressed),
+                    min(c.range_start),
+                    least(max(c.range_end), now())
+                FROM chunks_detailed_size(%s::regclass) s
+                JOIN timescaledb_information.chunks c
+                    ON c.chunk_schema = s.chunk_schema AND c.chunk_name = s.chunk_name;
+                """,
+                [table["name"]],
+            )
+            (
+                chunks,
+                hot_chunks,
+                total_bytes,
+                hot_bytes,
+                ranges,
+                hot_ranges,
+                first_start,
+                last_end,
+            ) = cur.fetchone()
+            cur.execute("SELECT approximate_row_count(%s::regclass);", [table["name"]])
+            rows = cur.fetchone()[0] or 0
+
+        interval_days = table["interval"].total_seconds() / 86400
+        if hot_ranges:
+            bytes_per_day = hot_bytes / (hot_ranges * interval_days)
+        elif ranges:
+            bytes_per_day = total_bytes / (ranges * interval_days)
+        else:
+            bytes_per_day = 0
+
+        span_days = (
+            (last_end - first_start).total_seconds() / 86400 if first_start else 0
+        )
+        return {
+            "chunks": chunks,
+            "bytes_per_day": bytes_per_day,
+            "rows_per_day": rows / span_days if span_days > 0 else 0,
+            "avg_chunk_bytes": (
+                (hot_bytes / hot_chunks) if hot_chunks else total_bytes / (chunks or 1)
+            ),
+        }
+
+    def recommend(self, bytes_per_day, coins, target):
+        """
+        Самый длинный интервал, при котором чанк не превышает целевой размер.
+        Пространственные разделы нужны, только если даже самый короткий
+        интервал даёт чанк больше целевого: иначе они дробят каждый интервал
+        на мелкие чанки и увеличивают время планирования.
+        """
+        interval = CANDIDATE_INTERVALS[0]
+        for candidate in CANDIDATE_INTERVALS:
+            if bytes_per_day * candidate.total_seconds() / 86400 <= target:
+                interval = candidate
+
+        chunk_bytes = bytes_per_day * interval.total_seconds() / 86400
+        partitions = 1
+        if chunk_bytes > target:
+            partitions = min(max(coins, 1), math.ceil(chunk_bytes / target))
+        return interval, partitions
+
+    def apply(self, table, interval, partitions):
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT set_chunk_time_interval(%s::regclass, %s::interval);",
+                [table["name"], interval_sql(interval)],
+            )
+            if table["space_column"] and partitions != table["partitions"]:
+                cur.execute(
+                    "SELECT set_number_partitions(%s::regclass, %s, %s);",
+                    [table["name"], partitions, table["space_column"]],
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {table['name']}: новые чанки {interval_sql(interval)}, "
+                f"разделов {partitions}"
+            )
+        )
+
+    def explain(self, sql, params):
+        """
+        Время планирования (без выполнения запроса) и число чанков в плане.
+        """
+        with connection.cursor() as cur:
+            cur.execute(f"EXPLAIN (SUMMARY, FORMAT JSON) {sql}", params)
+            result = cur.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        return result[0]["Planning Time"], self.count_chunks(result[0]["Plan"])
+
+    def count_chunks(self, plan):
+        chunks = int(plan.get("Relation Name", "").startswith("_hyper_"))
+        for child in plan.get("Plans", []):
+            chunks += self.count_chunks(child)
+        return chunks
+
+    def report_planning(self, coin, options):
+        baseline = {}
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        self.stdout.write(
+            f"\nПланирование частых запросов ({coin}, медиана {options['runs']}):"
+        )
+        self.stdout.write(
+            f"{'запрос':<20} {'план, мс':>9} {'чанков':>7} {'было, мс':>9} "
+            f"{'изменение':>10}"
+        )
+
+        results = {}
+        for name, (sql, params) in hot_queries(coin).items():
+            timings = []
+            chunks = 0
+            for _ in range(max(options["runs"], 1)):
+                planning, chunks = self.explain(sql, params)
+                timings.append(planning)
+            planning = statistics.median(timings)
+            results[name] = {"planning_ms": planning, "chunks": chunks}
+
+            before = baseline.get(name, {}).get("planning_ms")
+            before_ms, change = "-", "-"
+            if before:
+                before_ms = f"{before:.2f}"
+                change = f"{(planning - before) / before * 100:+.0f}%"
+            self.stdout.write(
+                f"{name:<20} {planning:>9.2f} {chunks:>7} {before_ms:>9} {change:>10}"
+            )
+
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Сохранено в {options['save']}"))
@@ -0,0 +1,146 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from coins.archive import (
+    ARCHIVE_TABLES,
+    archive_cutoff,
+    export_month,
+    month_dir,
+    month_start,
+    next_month,
+)
+from coins.models import Coin
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузить холодные чанки свечей и индикаторов в Parquet по монетам "
+        "и месяцам (ARCHIVE_DIR). Выгружаются только полные месяцы старше "
+        "--older-than дней; --drop-chunks после выгрузки удаляет их из базы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.ARCHIVE_AFTER_DAYS or 365,
+            help="Возраст данных в днях (по умолчанию: ARCHIVE_AFTER_DAYS или 365)",
+        )
+        parser.add_argument(
+            "--tables",
+            nargs="+",
+            choices=list(ARCHIVE_TABLES),
+            default=list(ARCHIVE_TABLES),
+            help="Таблицы для выгрузки (по умолчанию: все)",
+        )
+        parser.add_argument("--coins", nargs="+", help="Монеты (по умолчанию: все)")
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Перезаписать уже выгруженные месяцы",
+        )
+        parser.add_argument(
+            "--drop-chunks",
+            action="store_true",
+            help=(
+                "Удалить выгруженные чанки из базы (drop_chunks); только для "
+                "всех монет и если у каждой монеты и месяца до границы есть файл"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # граница - начало месяца, чтобы файлы содержали только закрытые месяцы
+        cutoff = archive_cutoff(options["older_than"])
+        coins = options["coins"] or list(
+            Coin.objects.order_by("coin").values_list("coin", flat=True)
+        )
+        # drop_chunks удаляет чанки всех монет сразу
+        if options["drop_chunks"] and options["coins"]:
+            self.stderr.write(
+                self.style.ERROR("--drop-chunks нельзя сочетать с --coins")
+            )
+            return
+
+        for name in options["tables"]:
+            table = ARCHIVE_TABLES[name]._meta.db_table
+            first = self.first_cold_chunk(table, cutoff)
+            if first is None:
+                self.stdout.write(f"{table}: холодных чанков нет")
+                continue
+
+            exported = 0
+            month = month_start(first)
+            while month < cutoff:
+                for coin in coins:
+                    rows = export_month(name, coin, month, options["overwrite"])
+                    if rows:
+                        exported += rows
+                        self.stdout.write(f"  {table} {coin} {month:%Y-%m}: {rows}")
+                month = next_month(month)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{table}: выгружено {exported} строк до {cutoff:%Y-%m-%d}"
+                )
+            )
+
+            if options["drop_chunks"]:
+                missing = self.missing_files(name, table, month_start(first), cutoff)
+                if missing:
+                    self.stderr.write(
+                        self.style.ERROR(
+                            f"{table}: чанки не удалены, нет архива для "
+                            + ", ".join(f"{c} {m:%Y-%m}" for c, m in missing[:10])
+                            + (" ..." if len(missing) > 10 else "")
+                        )
+                    )
+                    continue
+                with connection.cursor() as cur:
+                    cur.execute(
+                        "SELECT count(*) FROM drop_chunks(%s::regclass, older_than => %s);",
+                        [table, cutoff],
+                    )
+                    dropped = cur.fetchone()[0]
+                self.stdout.write(f"{table}: удалено чанков {dropped}")
+
+    def missing_files(self, name, table, start, cutoff):
+        """
+        (монета, месяц) со строками в базе до границы, для которых нет
+        файла архива: такие чанки удалять нельзя.
+        """
+        with connection.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT coin_id, date_trunc('month', transaction_time)
+                FROM {table}
+                WHERE transaction_time >= %s AND transaction_time < %s
+                GROUP BY 1, 2
+                ORDER BY 2, 1;
+                """,
+                [start, cutoff],
+            )
+            months = cur.fetchall()
+        return [
+            (coin, month)
+            for coin, month in months
+            if not os.path.exists(
+                os.path.join(month_dir(name, coin, month), "data.parquet")
+            )
+        ]
+
+    def first_cold_chunk(self, table, cutoff):
+        """
+        Начало самого старого чанка, целиком лежащего до границы.
+        """
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT min(range_start)
+                FROM timescaledb_information.chunks
+                WHERE hypertable_name = %s AND range_end <= %s;
+                """,
+                [table, cutoff],
+            )
+            return cur.fetchone()[0]
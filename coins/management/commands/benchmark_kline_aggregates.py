@@ -0,0 +1,142 @@
+import json
+import re
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+BUCKET_WIDTHS = {
+    "1m": "1 minute",
+    "5m": "5 minutes",
+    "15m": "15 minutes",
+    "1h": "1 hour",
+    "4h": "4 hours",
+    "1d": "1 day",
+    "1w": "1 week",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер стоимости обновления непрерывных агрегатов свечей: время и буферы "
+        "запроса агрегации за окно из фактического источника каждого уровня, "
+        "время ручного обновления и статистика фоновых заданий. "
+        "Запускается до и после перехода на иерархические агрегаты."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            default="1 day",
+            help="Окно обновления (интервал PostgreSQL, по умолчанию: '1 day')",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Дополнительно выполнить refresh_continuous_aggregate за окно",
+        )
+
+    def handle(self, *args, **options):
+        window = options["window"]
+        views = self.get_views()
+        jobs = self.get_job_stats()
+
+        self.stdout.write(
+            f"{'уровень':<8} {'источник':<16} {'запрос, мс':>11} "
+            f"{'буферы':>10} {'строк прочитано':>16} {'refresh, мс':>12} "
+            f"{'задание, последний запуск':>26}"
+        )
+        for resolution, width in BUCKET_WIDTHS.items():
+            name = f"coins_kline_{resolution}"
+            if name not in views:
+                continue
+
+            source = self.get_source(views[name])
+            plan = self.explain_aggregation(source, width, window)
+
+            refresh_ms = ""
+            if options["refresh"]:
+                started = time.perf_counter()
+                with connection.cursor() as cur:
+                    cur.execute(
+                        "CALL refresh_continuous_aggregate("
+                        "%s, now() - %s::interval, now());",
+                        [name, window],
+                    )
+                refresh_ms = f"{(time.perf_counter() - started) * 1000:.1f}"
+
+            self.stdout.write(
+                f"{resolution:<8} {source:<16} {plan['time']:>11.1f} "
+                f"{plan['buffers']:>10} {plan['rows']:>16} {refresh_ms:>12} "
+                f"{str(jobs.get(name, '-')):>26}"
+            )
+
+    def get_views(self):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT view_name, view_definition
+                FROM timescaledb_information.continuous_aggregates
+                WHERE view_name LIKE 'coins_kline_%';
+                """)
+            return dict(cur.fetchall())
+
+    def get_source(self, definition):
+        """
+        Источник агрегата: сырая таблица или агрегат нижнего уровня.
+        """
+        match = re.search(r"FROM\s+(?:\w+\.)?(coins_kline\w*)", definition, re.I)
+        return match.group(1) if match else "coins_kline"
+
+    def get_job_stats(self):
+        with connection.cursor() as cur:
+            cur.execute("""
+                SELECT c.view_name, s.last_run_duration
+                FROM timescaledb_information.jobs j
+                JOIN timescaledb_information.job_stats s USING (job_id)
+                JOIN timescaledb_information.continuous_aggregates c
+                    ON c.materialization_hypertable_name = j.hypertable_name
+                WHERE j.proc_name = 'policy_refresh_continuous_aggregate';
+                """)
+            return dict(cur.fetchall())
+
+    def explain_aggregation(self, source, width, window):
+        """
+        EXPLAIN ANALYZE запроса, который выполняет обновление уровня за окно.
+        Время выполнения и количество буферов - оценка CPU и ввода-вывода.
+        """
+        time_col = "transaction_time" if source == "coins_kline" else "bucket"
+        sql = f"""
+        EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+        SELECT
+            coin_id,
+            time_bucket('{width}', {time_col}) AS bucket,
+            first(open_price, {time_col}),
+            max(high_price),
+            min(low_price),
+            last(close_price, {time_col}),
+            sum(volume)
+        FROM {source}
+        WHERE {time_col} >= now() - %s::interval
+        GROUP BY 1, 2;
+        """
+        with connection.cursor() as cur:
+            cur.execute(sql, [window])
+            result = cur.fetchone()[0]
+
+        if isinstance(result, str):
+            result = json.loads(result)
+        plan = result[0]["Plan"]
+        return {
+            "time": result[0]["Execution Time"],
+            "buffers": plan.get("Shared Hit Blocks", 0)
+            + plan.get("Shared Read Blocks", 0),
+            "rows": self.scanned_rows(plan),
+        }
+
+    def scanned_rows(self, plan):
+        rows = 0
+        if "Scan" in plan["Node Type"]:
+            rows += plan.get("Actual Rows", 0) * plan.get("Actual Loops", 1)
+        for child in plan.get("Plans", []):
+            rows += self.scanned_rows(child)
+        return rows
@@ -0,0 +1,100 @@
+import random
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from coins.kline_pages import parse_kline_page
+
+
+def synthetic_page(rows, start_ms):
+    """
+    Страница в формате ответа /api/v3/klines: время числом, цены строками.
+    """
+    page = []
+    price = 30000.0
+    for i in range(rows):
+        open_time = start_ms + i * 60000
+        price += random.uniform(-5, 5)
+        page.append(
+            [
+                open_time,
+                f"{price:.8f}",
+                f"{price + 3:.8f}",
+                f"{price - 3:.8f}",
+                f"{price + 1:.8f}",
+                f"{random.uniform(0, 100):.8f}",
+                open_time + 59999,
+                "0",
+                100,
+                "0",
+                "0",
+                "0",
+            ]
+        )
+    return page
+
+
+def parse_rows(klines):
+    # прежний разбор: словарь на каждую свечу
+    return [
+        {
+            "transaction_time": datetime.fromtimestamp(
+                int(kline[0]) / 1000, tz=timezone.utc
+            ),
+            "open_price": float(kline[1]),
+            "high_price": float(kline[2]),
+            "low_price": float(kline[3]),
+            "close_price": float(kline[4]),
+            "volume": float(kline[5]),
+        }
+        for kline in klines
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнить разбор страниц свечей REST API: построчные словари "
+        "и колонки NumPy (parse_kline_page), мкс на страницу"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages", type=int, default=50, help="Число страниц (по умолчанию: 50)"
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000,
+            help="Свечей на странице (по умолчанию: 1000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Повторов, берётся лучший (по умолчанию: 3)",
+        )
+
+    def handle(self, *args, **options):
+        pages = [
+            synthetic_page(options["rows"], 1500000000000 + i * options["rows"] * 60000)
+            for i in range(options["pages"])
+        ]
+
+        results = {}
+        for name, parse in (("rows", parse_rows), ("columns", parse_kline_page)):
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                for page in pages:
+                    parse(page)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best / len(pages) * 1e6
+            self.stdout.write(f"{name}: {results[name]:.0f} мкс на страницу")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"ускорение: {results['rows'] / results['columns']:.1f}x"
+            )
+        )
@@ -0,0 +1,132 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coins.stream import orjson, read_frames
+
+
+def synthetic_frames(count):
+    """
+    Кадры комбинированного потока в формате Binance: свеча, событие стакана
+    и массив тикеров (!ticker@arr) по очереди.
+    """
+    frames = []
+    for i in range(count):
+        price = 30000 + random.uniform(-100, 100)
+        kind = i % 3
+        if kind == 0:
+            stream, data = "btcusdt@kline_1m", {
+                "e": "kline",
+                "E": 1700000000000 + i,
+                "s": "BTCUSDT",
+                "k": {
+                    "t": 1700000000000,
+                    "s": "BTCUSDT",
+                    "i": "1m",
+                    "o": f"{price:.2f}",
+                    "c": f"{price + 1:.2f}",
+                    "h": f"{price + 2:.2f}",
+                    "l": f"{price - 2:.2f}",
+                    "v": f"{random.uniform(0, 50):.5f}",
+                    "x": False,
+                },
+            }
+        elif kind == 1:
+            stream, data = "btcusdt@depth", {
+                "e": "depthUpdate",
+                "E": 1700000000000 + i,
+                "s": "BTCUSDT",
+                "U": i * 10,
+                "u": i * 10 + 9,
+                "b": [
+                    [f"{price - j:.2f}", f"{random.random():.5f}"] for j in range(20)
+                ],
+                "a": [
+                    [f"{price + j:.2f}", f"{random.random():.5f}"] for j in range(20)
+                ],
+            }
+        else:
+            stream, data = "!ticker@arr", [
+                {
+                    "e": "24hrTicker",
+                    "s": f"COIN{j}USDT",
+                    "c": f"{price / (j + 1):.8f}",
+                    "P": f"{random.uniform(-5, 5):.3f}",
+                    "v": f"{random.uniform(0, 1e6):.2f}",
+                }
+                for j in range(400)
+            ]
+        frames.append(json.dumps({"stream": stream, "data": data}).encode())
+    return frames
+
+
+class Command(BaseCommand):
+    help = (
+        "Пропускная способность разбора кадров вебсокета: стандартный json "
+        "(как в BinanceSocketManager) и orjson (лёгкий клиент coins.stream)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--frames",
+            metavar="PATH",
+            help="Файл записанных кадров (run_*_websocket --record); "
+            "по умолчанию - синтетические кадры",
+        )
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=3000,
+            help="Число синтетических кадров (по умолчанию: 3000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Повторов, берётся лучший (по умолчанию: 3)",
+        )
+
+    def handle(self, *args, **options):
+        if options["frames"]:
+            try:
+                frames = read_frames(options["frames"])
+            except FileNotFoundError:
+                raise CommandError(f"Файл {options['frames']} не найден")
+        else:
+            frames = synthetic_frames(options["synthetic"])
+        if not frames:
+            raise CommandError("Нет кадров для разбора")
+
+        # websockets отдаёт текстовые кадры строками
+        texts = [frame.decode() for frame in frames]
+        size = sum(len(frame) for frame in frames) / 1024 / 1024
+        self.stdout.write(f"{len(frames)} кадров, {size:.1f} МБ")
+
+        decoders = [("json", json.loads)]
+        if orjson is not None:
+            decoders.append(("orjson", orjson.loads))
+        else:
+            self.stdout.write(self.style.WARNING("orjson не установлен"))
+
+        results = {}
+        for name, loads in decoders:
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                for text in texts:
+                    loads(text)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best
+            self.stdout.write(
+                f"{name}: {len(frames) / best:.0f} кадров/с, {size / best:.0f} МБ/с"
+            )
+
+        if "orjson" in results:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"ускорение: {results['json'] / results['orjson']:.1f}x"
+                )
+            )
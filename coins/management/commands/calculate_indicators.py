@@ -8,6 +8,15 @@ from coins.models import (
     TechnicalTrigger,
     Coin,
 )
+from coins.caching import bump_data_version
+from coins.colstore import ColumnStore
+from coins.latest import update_latest_indicators
+from coins.realtime import publish_sync
+from coins.services import (
+    sentiment_indicator_row,
+    technical_trigger_row,
+    volatility_indicator_row,
+)
 import numpy as np
 import time
 
@@ -25,10 +34,21 @@ class Command(BaseCommand):
         parser.add_argument(
             "--offset", type=int, default=0, help="Смещение для пакетной обработки"
         )
+        parser.add_argument(
+            "--colstore",
+            action="store_true",
+            help="Читать свечи монет из локального колоночного хранилища (sync_colstore)",
+        )
 
     def handle(self, *args, **options):
         limit = options["limit"]
         offset = options["offset"]
+        self.colstore = ColumnStore() if options["colstore"] else None
+        if self.colstore is not None:
+            # хвост дописывается одним коротким запросом на монету,
+            # дальше свечи читаются из memmap без обращения к базе
+            for coin in Coin.objects.values_list("coin", flat=True):
+                self.colstore.sync(coin)
 
         self.stdout.write(
             f"Рассчитываются индикаторы для последних {limit} записей kline с смещением {offset}"
@@ -100,6 +120,12 @@ class Command(BaseCommand):
             return
 
         for coin in coins:
+            if self.colstore is not None:
+                coin_data = self.colstore.frame(coin.coin, last=len(df))
+                if not coin_data.empty:
+                    calculation_function(coin_data, coin)
+                continue
+
             coin_klines = Kline.objects.filter(coin=coin).order_by("-transaction_time")[
                 : len(df)
             ]
@@ -171,8 +197,9 @@ class Command(BaseCommand):
             coin_data = coin_data.replace({np.nan: None, np.inf: None, -np.inf: None})
 
             # Сохраняем индикаторы в базу данных
+            indicator = None
             for _, row in coin_data.iterrows():
-                SentimentIndicator.objects.update_or_create(
+                indicator, _ = SentimentIndicator.objects.update_or_create(
                     coin=coin,
                     transaction_time=row["timestamp"],
                     defaults={
@@ -185,6 +212,12 @@ class Command(BaseCommand):
                     },
                 )
 
+            # подписчикам уходит только последняя строка по монете
+            if indicator is not None:
+                update_latest_indicators([indicator])
+                bump_data_version("sentiment", coin.coin)
+                publish_sync("sentiment", coin.coin, sentiment_indicator_row(indicator))
+
         self.process_coins(df, calculate_for_coin)
 
     def calculate_volatility_liquidity_indicators(self, df):
@@ -249,9 +282,9 @@ class Command(BaseCommand):
             coin_data = coin_data.replace({np.nan: None, np.inf: None, -np.inf: None})
 
             # Сохраняем индикаторы в базу данных
-            indicators_to_create = []
+            indicator = None
             for _, row in coin_data.iterrows():
-                VolatilityLiquidityIndicator.objects.update_or_create(
+                indicator, _ = VolatilityLiquidityIndicator.objects.update_or_create(
                     coin=coin,
                     transaction_time=row["timestamp"],
                     defaults={
@@ -267,6 +300,11 @@ class Command(BaseCommand):
                     },
                 )
 
+            if indicator is not None:
+                update_latest_indicators([indicator])
+                bump_data_version("volatility", coin.coin)
+                publish_sync("volatility", coin.coin, volatility_indicator_row(indicator))
+
         # Обрабатываем данные для каждой монеты
         self.process_coins(df, calculate_for_coin)
 
@@ -377,4 +415,13 @@ class Command(BaseCommand):
                 indicators_to_create, ignore_conflicts=True
             )
 
+            if indicators_to_create:
+                update_latest_indicators(indicators_to_create)
+                bump_data_version("technical", coin.coin)
+                publish_sync(
+                    "technical",
+                    coin.coin,
+                    technical_trigger_row(indicators_to_create[-1]),
+                )
+
         self.process_coins(df, calculate_for_coin)
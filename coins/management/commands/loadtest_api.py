@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+from django.core.management.base import BaseCommand
+
+# пары синхронных и асинхронных эндпоинтов для сравнения
+ENDPOINTS = {
+    "klines": ("/api/klines/{coin}/", "/api/async/klines/{coin}/"),
+    "orderbook": ("/api/orderbook/{coin}/", "/api/async/orderbook/{coin}/"),
+    "current": (
+        "/api/orderbook/{coin}/current/",
+        "/api/async/orderbook/{coin}/current/",
+    ),
+    "sentiment": ("/api/sentiment/{coin}/", "/api/async/sentiment/{coin}/"),
+    "volatility": ("/api/volatility/{coin}/", "/api/async/volatility/{coin}/"),
+    "technical": ("/api/technical/{coin}/", "/api/async/technical/{coin}/"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение синхронных и асинхронных API: "
+        "запросов в секунду и задержки при N одновременных клиентах. "
+        "Сервер нужно запускать под ASGI: "
+        "daphne -b 0.0.0.0 -p 8000 binance_parser.asgi:application"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            default="http://localhost:8000",
+            help="Адрес сервера (по умолчанию: http://localhost:8000)",
+        )
+        parser.add_argument("--coin", default="BTCUSDT", help="Монета")
+        parser.add_argument(
+            "--endpoints",
+            default="klines,orderbook,sentiment",
+            help=f"Эндпоинты через запятую: {', '.join(ENDPOINTS)}",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=500,
+            help="Количество одновременных клиентов (по умолчанию: 500)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=10000,
+            help="Количество запросов на эндпоинт (по умолчанию: 10000)",
+        )
+        parser.add_argument(
+            "--query",
+            default="",
+            help="Строка запроса, например 'limit=500&start=2025-01-01T00:00:00'",
+        )
+
+    def handle(self, *args, **options):
+        names = [
+            name.strip() for name in options["endpoints"].split(",") if name.strip()
+        ]
+        unknown = [name for name in names if name not in ENDPOINTS]
+        if unknown:
+            self.stderr.write(self.style.ERROR(f"Неизвестные эндпоинты: {unknown}"))
+            return
+
+        for name in names:
+            for kind, path in zip(("sync", "async"), ENDPOINTS[name]):
+                url = options["base_url"].rstrip("/") + path.format(
+                    coin=options["coin"]
+                )
+                if options["query"]:
+                    url += "?" + options["query"]
+                result = asyncio.run(
+                    self.run_load(url, options["concurrency"], options["requests"])
+                )
+                self.report(f"{name} [{kind}]", result)
+
+    async def run_load(self, url, concurrency, total):
+        latencies = []
+        errors = 0
+        remaining = total
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+
+            async def client():
+                nonlocal remaining, errors
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    try:
+                        async with session.get(url) as response:
+                            await response.read()
+                            if response.status != 200:
+                                errors += 1
+                                continue
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        return {"latencies": np.array(latencies), "errors": errors, "elapsed": elapsed}
+
+    def report(self, title, result):
+        latencies = result["latencies"] * 1000
+        ok = len(latencies)
+        rps = ok / result["elapsed"] if result["elapsed"] else 0
+        if ok:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        else:
+            p50 = p95 = p99 = float("nan")
+        self.stdout.write(
+            f"{title:<24} {rps:>9.1f} req/s  "
+            f"p50 {p50:>7.1f} ms  p95 {p95:>7.1f} ms  p99 {p99:>7.1f} ms  "
+            f"ok {ok}  errors {result['errors']}"
+        )
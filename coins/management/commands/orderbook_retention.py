@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from coins.caching import ORDERBOOK_RETENTION_KEY
+
+
+class Command(BaseCommand):
+    help = (
+        "Применить срок хранения сырых событий стакана из настройки "
+        "ORDERBOOK_RAW_RETENTION_DAYS (или --days)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ORDERBOOK_RAW_RETENTION_DAYS,
+            help="Срок хранения в днях (по умолчанию: ORDERBOOK_RAW_RETENTION_DAYS)",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days <= 0:
+            self.stderr.write(self.style.ERROR("Срок хранения должен быть больше 0"))
+            return
+
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT remove_retention_policy('coins_orderbook', if_exists => true);"
+            )
+            cur.execute(
+                "SELECT add_retention_policy('coins_orderbook', %s::interval);",
+                [f"{days} days"],
+            )
+        # API сразу выбирает уровень истории по новому сроку
+        cache.delete(ORDERBOOK_RETENTION_KEY)
+        self.stdout.write(
+            self.style.SUCCESS(f"Сырые события стакана хранятся {days} дн.")
+        )
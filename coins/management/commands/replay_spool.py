@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from coins.spool import REPLAYERS, get_spool
+
+
+class Command(BaseCommand):
+    help = (
+        "Переиграть в базу записи из локального буфера (SPOOL_DIR), накопленные "
+        "процессами сбора данных, пока база была недоступна"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kinds",
+            nargs="+",
+            choices=list(REPLAYERS),
+            default=list(REPLAYERS),
+            help="Виды записей (по умолчанию: все)",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Только показать размер буфера",
+        )
+
+    def handle(self, *args, **options):
+        for kind in options["kinds"]:
+            spool = get_spool(kind)
+            stats = spool.stats()
+            self.stdout.write(
+                f"{kind}: сегментов {stats['segments']}, "
+                f"{stats['bytes'] / 1048576:.1f} МБ"
+            )
+            if options["stats"] or not stats["segments"]:
+                continue
+
+            metrics = spool.replay()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{kind}: переиграно {metrics['replayed']} записей за "
+                    f"{metrics['seconds']} с ({metrics['rate']} записей/с)"
+                )
+            )
@@ -5,10 +5,13 @@ import asyncio
 class Command(BaseCommand):
     help = 'Запускает WebSocket для получения данных с Binance'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--record', metavar='PATH', help='Записывать сырые кадры в файл (для benchmark_ws_decoding)')
+
     def handle(self, *args, **options):
         self.stdout.write("🚀 Запуск WebSocket...")
         try:
-            asyncio.run(start_websocket())
+            asyncio.run(start_websocket(options['record']))
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING("WebSocket остановлен пользователем."))
         except Exception as e:
@@ -2,10 +2,29 @@ import asyncio
 import os 
 import django
 from django.core.management.base import BaseCommand
+from contextlib import nullcontext
+from coins.backfill import KlineBackfill, compression_paused
 from coins.historical_klines import start_websocket
 
 class Command(BaseCommand):
     help = "Запускает вебсокет для получения исторических данных свечей "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            choices=["decompress", "staging"],
+            help=(
+                "Дозагрузка в сжатые диапазоны: decompress - распаковка чанков пачками, "
+                "staging - через промежуточную гипертаблицу. Политика сжатия "
+                "на время загрузки приостанавливается"
+            ),
+        )
+        parser.add_argument(
+            "--batch-days",
+            type=int,
+            default=7,
+            help="Размер пачки в днях при дозагрузке (по умолчанию: 7)",
+        )
     
     def handle(self, *args, **options):
         try:
@@ -18,8 +37,15 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.NOTICE("🚀 Запуск WebSocket для Kline..."))
         
+        writer = None
+        if options["backfill"]:
+            writer = KlineBackfill(options["backfill"], options["batch_days"])
+
         try:
-            asyncio.run(start_websocket())
+            with compression_paused("coins_kline") if writer else nullcontext():
+                asyncio.run(start_websocket(writer))
+                if writer:
+                    writer.finish()
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING("WebSocket остановлен пользователем."))
         except Exception as e:
@@ -0,0 +1,37 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from coins.ingestion import STREAMS, Supervisor
+
+
+class Command(BaseCommand):
+    help = (
+        "Запускает потоки тикеров, свечей и стакана в одном процессе "
+        "с перезапуском упавших потоков"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--streams",
+            nargs="+",
+            choices=list(STREAMS),
+            help="Потоки (по умолчанию: все)",
+        )
+        parser.add_argument(
+            "--record-dir",
+            metavar="DIR",
+            help="Записывать сырые кадры в DIR/<поток>.frames",
+        )
+
+    def handle(self, *args, **options):
+        supervisor = Supervisor(options["streams"], options["record_dir"])
+        self.stdout.write(f"🚀 Запуск потоков: {', '.join(supervisor.streams)}")
+        try:
+            asyncio.run(supervisor.run())
+        except KeyboardInterrupt:
+            self.stdout.write(
+                self.style.WARNING("Сбор данных остановлен пользователем")
+            )
+        finally:
+            self.stdout.write(self.style.SUCCESS("Соединения закрыты."))
@@ -5,10 +5,13 @@ import asyncio
 class Command(BaseCommand):
     help = 'Запускает WebSocket для получения данных kline'
     
+    def add_arguments(self, parser):
+        parser.add_argument('--record', metavar='PATH', help='Записывать сырые кадры в файл (для benchmark_ws_decoding)')
+
     def handle(self, *args, **options):
         self.stdout.write("🚀 Запуск WebSocket для Kline...")
         try:
-            asyncio.run(start_websocket())
+            asyncio.run(start_websocket(options['record']))
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING("WebSocket (Kline) остановлен пользоветелем"))
         except Exception as e:
@@ -6,10 +6,17 @@ import asyncio
 class Command(BaseCommand):
     help = "запускает вебсокет для получения книги ордеров"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--record",
+            metavar="PATH",
+            help="Записывать сырые кадры в файл (для benchmark_ws_decoding)",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("🚀 Запуск WebSocket для Order Book...")
         try:
-            asyncio.run(start_websocket())
+            asyncio.run(start_websocket(options["record"]))
         except KeyboardInterrupt:
             self.stdout.write(
                 self.style.WARNING("WebSocket (Order Book) остановлен пользователем")
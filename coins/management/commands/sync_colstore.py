@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from coins.colstore import ColumnStore
+from coins.constants import RES_WIDTHS
+from coins.models import Coin
+
+
+class Command(BaseCommand):
+    help = (
+        "Дописать свечи из базы в локальное колоночное хранилище (COLSTORE_DIR): "
+        "файл на монету, поле и разрешение, читается через memmap"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coins", nargs="+", help="Монеты (по умолчанию: все)")
+        parser.add_argument(
+            "--resolutions",
+            nargs="+",
+            choices=list(RES_WIDTHS),
+            default=["1m"],
+            help="Разрешения (по умолчанию: 1m)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересобрать хранилище целиком (после дозагрузки старой истории)",
+        )
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            default=2,
+            help="Сколько последних свечей перечитывать (по умолчанию: 2)",
+        )
+
+    def handle(self, *args, **options):
+        store = ColumnStore()
+        coins = options["coins"] or list(
+            Coin.objects.order_by("coin").values_list("coin", flat=True)
+        )
+
+        for resolution in options["resolutions"]:
+            started = time.perf_counter()
+            total = 0
+            for coin in coins:
+                try:
+                    total += store.sync(
+                        coin, resolution, options["full"], options["lookback"]
+                    )
+                except ValueError as e:
+                    self.stderr.write(self.style.ERROR(str(e)))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{resolution}: прочитано {total} свечей за "
+                    f"{time.perf_counter() - started:.2f} с"
+                )
+            )
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coins", "0009_timescaledb"),
+    ]
+
+    operations = [
+        # триграммный индекс для поиска монеты по подстроке (coin__icontains)
+        migrations.RunSQL(
+            sql="""
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS coins_coin_trgm_idx
+            ON coins_coin USING gin (upper(coin::text) gin_trgm_ops);
+            """,
+            reverse_sql="DROP INDEX IF EXISTS coins_coin_trgm_idx;",
+        ),
+        migrations.AddIndex(
+            model_name="coin",
+            index=models.Index(fields=["price", "id"], name="coin_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="coin",
+            index=models.Index(fields=["volume", "id"], name="coin_volume_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="coin",
+            index=models.Index(
+                fields=["price_change_percent", "id"], name="coin_change_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,152 @@
+from django.db import migrations
+
+# Иерархия непрерывных агрегатов свечей: каждый уровень строится из предыдущего,
+# поэтому обновление 1d читает шесть строк 4h, а не 1440 строк сырых данных.
+# (имя, ширина корзины, источник, start_offset, end_offset, schedule_interval)
+# end_offset в одну корзину: незакрытая корзина считается на лету
+# (real-time aggregation), а не материализуется при каждом запуске.
+LEVELS = [
+    ("coins_kline_1m", "1 minute", "coins_kline", "2 hours", "1 minute", "1 minute"),
+    (
+        "coins_kline_5m",
+        "5 minutes",
+        "coins_kline_1m",
+        "6 hours",
+        "5 minutes",
+        "5 minutes",
+    ),
+    (
+        "coins_kline_15m",
+        "15 minutes",
+        "coins_kline_5m",
+        "1 day",
+        "15 minutes",
+        "15 minutes",
+    ),
+    ("coins_kline_1h", "1 hour", "coins_kline_15m", "3 days", "1 hour", "30 minutes"),
+    ("coins_kline_4h", "4 hours", "coins_kline_1h", "7 days", "4 hours", "1 hour"),
+    ("coins_kline_1d", "1 day", "coins_kline_4h", "30 days", "1 day", "4 hours"),
+    ("coins_kline_1w", "1 week", "coins_kline_1d", "12 weeks", "1 week", "1 day"),
+]
+
+# Плоские агрегаты из 0003 для отката: (имя, ширина корзины, start_offset,
+# schedule_interval, условие выборки) - определения повторяют 0003 дословно
+FLAT_LEVELS = [
+    (
+        "coins_kline_1m",
+        "1 minute",
+        "7 days",
+        "1 minute",
+        "WHERE transaction_time > NOW() - INTERVAL '7 days'",
+    ),
+    ("coins_kline_5m", "5 minutes", "7 days", "1 minute", ""),
+    ("coins_kline_15m", "15 minutes", "14 days", "5 minutes", ""),
+    ("coins_kline_1h", "1 hour", "30 days", "15 minutes", ""),
+    ("coins_kline_4h", "4 hours", "90 days", "1 hour", ""),
+    ("coins_kline_1d", "1 day", "180 days", "6 hours", ""),
+    ("coins_kline_1w", "1 week", "365 days", "1 day", ""),
+]
+
+
+def drop_views_sql():
+    # сверху вниз: верхние уровни зависят от нижних; политики удаляются вместе с агрегатом
+    return [
+        f"DROP MATERIALIZED VIEW IF EXISTS {name} CASCADE;"
+        for name, *_ in reversed(LEVELS)
+    ]
+
+
+def create_level_sql(name, width, source, start_offset, end_offset, schedule):
+    time_col = "transaction_time" if source == "coins_kline" else "bucket"
+    return [
+        f"""
+    CREATE MATERIALIZED VIEW {name}
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        coin_id AS coin_id,
+        time_bucket('{width}', {time_col}) AS bucket,
+        first(open_price, {time_col}) AS open_price,
+        max(high_price) AS high_price,
+        min(low_price) AS low_price,
+        last(close_price, {time_col}) AS close_price,
+        sum(volume) AS volume
+    FROM {source}
+    GROUP BY coin_id, time_bucket('{width}', {time_col})
+    WITH NO DATA;
+    """,
+        f"""
+    CREATE INDEX IF NOT EXISTS {name}_coin_bucket_idx
+    ON {name} (coin_id, bucket DESC);
+    """,
+        f"""
+    SELECT add_continuous_aggregate_policy('{name}',
+        start_offset => INTERVAL '{start_offset}',
+        end_offset => INTERVAL '{end_offset}',
+        schedule_interval => INTERVAL '{schedule}');
+    """,
+    ]
+
+
+def create_flat_level_sql(name, width, start_offset, schedule, where):
+    return [
+        f"""
+    CREATE MATERIALIZED VIEW {name}
+    WITH (timescaledb.continuous) AS
+    SELECT
+        coin_id AS coin_id,
+        time_bucket('{width}', transaction_time) AS bucket,
+        first(open_price, transaction_time) AS open_price,
+        max(high_price) AS high_price,
+        min(low_price) AS low_price,
+        last(close_price, transaction_time) AS close_price,
+        sum(volume) AS volume
+    FROM coins_kline
+    {where}
+    GROUP BY coin_id, bucket;
+    """,
+        f"""
+    CREATE INDEX IF NOT EXISTS {name}_coin_bucket_idx
+    ON {name} (coin_id, bucket DESC);
+    """,
+        f"""
+    SELECT add_continuous_aggregate_policy('{name}',
+        start_offset => INTERVAL '{start_offset}',
+        end_offset => INTERVAL '0 minutes',
+        schedule_interval => INTERVAL '{schedule}');
+    """,
+    ]
+
+
+# первичное заполнение всей истории снизу вверх, каждый уровень читает предыдущий
+REFRESH_SQL = [
+    f"CALL refresh_continuous_aggregate('{name}', NULL, NULL);" for name, *_ in LEVELS
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coins", "0010_coin_search_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=drop_views_sql(),
+            reverse_sql=[
+                statement
+                for level in FLAT_LEVELS
+                for statement in create_flat_level_sql(*level)
+            ],
+        ),
+        migrations.RunSQL(
+            sql=[
+                statement for level in LEVELS for statement in create_level_sql(*level)
+            ],
+            reverse_sql=drop_views_sql(),
+        ),
+        migrations.RunSQL(sql=REFRESH_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
+
+    # создание агрегатов с данными и refresh_continuous_aggregate нельзя выполнять
+    # в транзакции, поэтому каждая команда выполняется отдельным запросом
+    atomic = False
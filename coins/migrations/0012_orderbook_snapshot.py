@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coins", "0011_kline_hierarchical_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderBookSnapshot",
+            fields=[
+                (
+                    "pk",
+                    models.CompositePrimaryKey(
+                        "coin_id",
+                        "transaction_time",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("transaction_time", models.DateTimeField(db_index=True)),
+                ("bids", models.JSONField()),
+                ("asks", models.JSONField()),
+                ("mid_price", models.FloatField(null=True)),
+                ("spread_bps", models.FloatField(null=True)),
+                ("bid_qty", models.FloatField(null=True)),
+                ("ask_qty", models.FloatField(null=True)),
+                ("imbalance", models.FloatField(null=True)),
+                (
+                    "coin",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_book_snapshots",
+                        to="coins.coin",
+                        to_field="coin",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "coins_orderbook_1m",
+                "indexes": [
+                    models.Index(
+                        fields=["coin", "-transaction_time"],
+                        name="orderbook_1m_coin_ts_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("coin", "transaction_time"),
+                        name="orderbook_1m_primary_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            SELECT create_hypertable(
+                'coins_orderbook_1m',
+                'transaction_time',
+                partitioning_column => 'coin_id',
+                number_partitions => 32,
+                chunk_time_interval => INTERVAL '7 days',
+                if_not_exists => TRUE
+            );
+            """,
+            reverse_sql="-- no-op",
+        ),
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE coins_orderbook_1m SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = 'coin_id',
+                timescaledb.compress_orderby = 'transaction_time'
+            );
+            SELECT add_compression_policy('coins_orderbook_1m', INTERVAL '1 day');
+            """,
+            reverse_sql="""
+            SELECT remove_compression_policy('coins_orderbook_1m', if_exists => true);
+            ALTER TABLE coins_orderbook_1m RESET (timescaledb.compress);
+            """,
+        ),
+        # сырые события стакана хранятся 2 дня вместо месяца: долгосрочная
+        # история берётся из поминутных снимков. Срок зафиксирован здесь,
+        # чтобы миграция давала одну и ту же схему; изменить его можно
+        # командой orderbook_retention (ORDERBOOK_RAW_RETENTION_DAYS)
+        migrations.RunSQL(
+            sql="""
+            SELECT remove_retention_policy('coins_orderbook', if_exists => true);
+            SELECT add_retention_policy('coins_orderbook', INTERVAL '2 days');
+            """,
+            reverse_sql="""
+            SELECT remove_retention_policy('coins_orderbook', if_exists => true);
+            SELECT add_retention_policy('coins_orderbook', INTERVAL '1 month');
+            """,
+        ),
+    ]
+
+    # как и остальные миграции TimescaleDB, выполняется вне общей транзакции
+    atomic = False
@@ -0,0 +1,213 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("coins", "0012_orderbook_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LatestOrderBook",
+            fields=[
+                ("bids", models.JSONField()),
+                ("asks", models.JSONField()),
+                ("mid_price", models.FloatField(null=True)),
+                ("spread_bps", models.FloatField(null=True)),
+                ("bid_qty", models.FloatField(null=True)),
+                ("ask_qty", models.FloatField(null=True)),
+                ("imbalance", models.FloatField(null=True)),
+                (
+                    "coin",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_order_book",
+                        serialize=False,
+                        to="coins.coin",
+                        to_field="coin",
+                    ),
+                ),
+                ("transaction_time", models.DateTimeField()),
+                ("last_update_id", models.BigIntegerField(null=True)),
+            ],
+            options={
+                "db_table": "latest_orderbook",
+            },
+        ),
+        migrations.CreateModel(
+            name="LatestSentimentIndicator",
+            fields=[
+                (
+                    "open_interest",
+                    models.DecimalField(decimal_places=8, max_digits=20, null=True),
+                ),
+                (
+                    "open_interest_change",
+                    models.DecimalField(decimal_places=4, max_digits=10, null=True),
+                ),
+                (
+                    "funding_rate",
+                    models.DecimalField(decimal_places=4, max_digits=10, null=True),
+                ),
+                ("next_funding_time", models.DateTimeField(null=True)),
+                (
+                    "long_short_ratio",
+                    models.DecimalField(decimal_places=4, max_digits=10, null=True),
+                ),
+                (
+                    "long_positions",
+                    models.DecimalField(decimal_places=8, max_digits=20, null=True),
+                ),
+                (
+                    "short_positions",
+                    models.DecimalField(decimal_places=8, max_digits=20, null=True),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "coin",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_sentiment",
+                        serialize=False,
+                        to="coins.coin",
+                        to_field="coin",
+                    ),
+                ),
+                ("transaction_time", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "latest_sentiment_indicators",
+            },
+        ),
+        migrations.CreateModel(
+            name="LatestTechnicalTrigger",
+            fields=[
+                (
+                    "ema_20",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "ema_50",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "ema_100",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "ema_200",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "stoch_rsi_k",
+                    models.DecimalField(decimal_places=4, max_digits=6, null=True),
+                ),
+                (
+                    "stoch_rsi_d",
+                    models.DecimalField(decimal_places=4, max_digits=6, null=True),
+                ),
+                (
+                    "volume_profile_nodes",
+                    models.JSONField(
+                        help_text="Словарь с ценовыми уровнями и объемами", null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "coin",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_technical_trigger",
+                        serialize=False,
+                        to="coins.coin",
+                        to_field="coin",
+                    ),
+                ),
+                ("transaction_time", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "latest_technical_triggers",
+            },
+        ),
+        migrations.CreateModel(
+            name="LatestVolatilityLiquidityIndicator",
+            fields=[
+                (
+                    "atr_14",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "atr_21",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "vwap",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "vwap_high_band",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "vwap_low_band",
+                    models.DecimalField(decimal_places=8, max_digits=15, null=True),
+                ),
+                (
+                    "liquidation_levels",
+                    models.JSONField(
+                        help_text="Словарь с ключами 'long_levels', 'short_levels'",
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "coin",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_volatility_liquidity",
+                        serialize=False,
+                        to="coins.coin",
+                        to_field="coin",
+                    ),
+                ),
+                ("transaction_time", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "latest_volatility_liquidity_indicators",
+            },
+        ),
+        # последнее состояние стакана теперь хранится в latest_orderbook
+        migrations.RunSQL(
+            sql="DROP MATERIALIZED VIEW IF EXISTS current_orderbook;",
+            reverse_sql="""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS current_orderbook AS
+            SELECT
+                coin_id,
+                transaction_time,
+                bids,
+                asks
+            FROM (
+                SELECT
+                    coin_id,
+                    transaction_time,
+                    bids,
+                    asks,
+                    ROW_NUMBER() OVER (PARTITION BY coin_id ORDER BY transaction_time DESC) AS rn
+                FROM coins_orderbook
+                WHERE transaction_time > NOW() - INTERVAL '1 hour'
+            ) subquery
+            WHERE rn = 1;
+            CREATE INDEX IF NOT EXISTS current_orderbook_coin_idx
+            ON current_orderbook (coin_id);
+            """,
+        ),
+    ]
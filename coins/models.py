@@ -11,6 +11,14 @@ class Coin(models.Model):
     volume = models.FloatField(null=True)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        # индексы под сортировку и keyset-пагинацию таблицы монет
+        indexes = [
+            models.Index(fields=["price", "id"], name="coin_price_idx"),
+            models.Index(fields=["volume", "id"], name="coin_volume_idx"),
+            models.Index(fields=["price_change_percent", "id"], name="coin_change_idx"),
+        ]
+
     def __str__(self):
         return self.coin
 
@@ -77,21 +85,85 @@ class OrderBook(models.Model):
         return f"{self.coin.coin} - {self.transaction_time.isoformat()}"
 
 
-class SentimentIndicator(models.Model):
+class OrderBookState(models.Model):
     """
-    индикаторы рыночных настроений (Open Interest, Fuding Rate, Long/Short Ratio)
+    Верхние уровни стакана и производные метрики (общие поля снимков).
+    """
+
+    bids = models.JSONField()
+    asks = models.JSONField()
+
+    mid_price = models.FloatField(null=True)
+    spread_bps = models.FloatField(null=True)
+    bid_qty = models.FloatField(null=True)
+    ask_qty = models.FloatField(null=True)
+    imbalance = models.FloatField(null=True)
+
+    class Meta:
+        abstract = True
+
+
+class OrderBookSnapshot(OrderBookState):
+    """
+    Поминутный снимок верхних уровней стакана с производными метриками.
+    Долгосрочный уровень истории: сырые события coins_orderbook хранятся недолго.
     """
 
     pk = models.CompositePrimaryKey("coin_id", "transaction_time")
     coin = models.ForeignKey(
         Coin,
         on_delete=models.CASCADE,
-        related_name="sentiment_indicator",
+        related_name="order_book_snapshots",
         db_index=True,
         to_field="coin",
     )
     transaction_time = models.DateTimeField(db_index=True)
 
+    class Meta:
+        db_table = "coins_orderbook_1m"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["coin", "transaction_time"], name="orderbook_1m_primary_key"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["coin", "-transaction_time"], name="orderbook_1m_coin_ts_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.coin.coin} @ {self.transaction_time.isoformat()}"
+
+
+class LatestOrderBook(OrderBookState):
+    """
+    Последнее состояние стакана монеты: одна строка на монету,
+    обновляется процессом сбора данных.
+    """
+
+    coin = models.OneToOneField(
+        Coin,
+        on_delete=models.CASCADE,
+        related_name="latest_order_book",
+        primary_key=True,
+        to_field="coin",
+    )
+    transaction_time = models.DateTimeField()
+    last_update_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        db_table = "latest_orderbook"
+
+    def __str__(self):
+        return f"Latest book {self.coin_id} @ {self.transaction_time.isoformat()}"
+
+
+class SentimentFields(models.Model):
+    """
+    индикаторы рыночных настроений (Open Interest, Fuding Rate, Long/Short Ratio)
+    """
+
     # Открытый интерес
     open_interest = models.DecimalField(max_digits=20, decimal_places=8, null=True)
     open_interest_change = models.DecimalField(
@@ -109,6 +181,21 @@ class SentimentIndicator(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        abstract = True
+
+
+class SentimentIndicator(SentimentFields):
+    pk = models.CompositePrimaryKey("coin_id", "transaction_time")
+    coin = models.ForeignKey(
+        Coin,
+        on_delete=models.CASCADE,
+        related_name="sentiment_indicator",
+        db_index=True,
+        to_field="coin",
+    )
+    transaction_time = models.DateTimeField(db_index=True)
+
     class Meta:
         db_table = "sentiment_indicators"
         constraints = [
@@ -128,20 +215,31 @@ class SentimentIndicator(models.Model):
         return f"Sentiment {self.coin.coin} @ {self.transaction_time.isoformat()}"
 
 
-class VolatilityLiquidityIndicator(models.Model):
+class LatestSentimentIndicator(SentimentFields):
     """
-    индикаторы волатильности и ликвидности (ATR, VWAP, Liquidation Levels)
+    Последние значения индикаторов настроений: одна строка на монету.
     """
 
-    pk = models.CompositePrimaryKey("coin_id", "transaction_time")
-    coin = models.ForeignKey(
+    coin = models.OneToOneField(
         Coin,
         on_delete=models.CASCADE,
-        related_name="volatility_liquidity_indicator",
-        db_index=True,
+        related_name="latest_sentiment",
+        primary_key=True,
         to_field="coin",
     )
-    transaction_time = models.DateTimeField(db_index=True)
+    transaction_time = models.DateTimeField()
+
+    class Meta:
+        db_table = "latest_sentiment_indicators"
+
+    def __str__(self):
+        return f"Latest sentiment {self.coin_id} @ {self.transaction_time.isoformat()}"
+
+
+class VolatilityLiquidityFields(models.Model):
+    """
+    индикаторы волатильности и ликвидности (ATR, VWAP, Liquidation Levels)
+    """
 
     # ATR (Average True Range)
     atr_14 = models.DecimalField(max_digits=15, decimal_places=8, null=True)
@@ -163,6 +261,21 @@ class VolatilityLiquidityIndicator(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        abstract = True
+
+
+class VolatilityLiquidityIndicator(VolatilityLiquidityFields):
+    pk = models.CompositePrimaryKey("coin_id", "transaction_time")
+    coin = models.ForeignKey(
+        Coin,
+        on_delete=models.CASCADE,
+        related_name="volatility_liquidity_indicator",
+        db_index=True,
+        to_field="coin",
+    )
+    transaction_time = models.DateTimeField(db_index=True)
+
     class Meta:
         db_table = "volatility_liquidity_indicators"
         constraints = [
@@ -182,20 +295,31 @@ class VolatilityLiquidityIndicator(models.Model):
         return f"Volatility/Liquidity {self.coin.coin} @ {self.transaction_time.isoformat()}"
 
 
-class TechnicalTrigger(models.Model):
+class LatestVolatilityLiquidityIndicator(VolatilityLiquidityFields):
     """
-    технические триггеры (EMA, Stochastic RSI, Volume Profile)
+    Последние значения индикаторов волатильности и ликвидности: одна строка на монету.
     """
 
-    pk = models.CompositePrimaryKey("coin_id", "transaction_time")
-    coin = models.ForeignKey(
+    coin = models.OneToOneField(
         Coin,
         on_delete=models.CASCADE,
-        related_name="technical_trigger",
-        db_index=True,
+        related_name="latest_volatility_liquidity",
+        primary_key=True,
         to_field="coin",
     )
-    transaction_time = models.DateTimeField(db_index=True)
+    transaction_time = models.DateTimeField()
+
+    class Meta:
+        db_table = "latest_volatility_liquidity_indicators"
+
+    def __str__(self):
+        return f"Latest volatility/liquidity {self.coin_id} @ {self.transaction_time.isoformat()}"
+
+
+class TechnicalTriggerFields(models.Model):
+    """
+    технические триггеры (EMA, Stochastic RSI, Volume Profile)
+    """
 
     # EMA
     ema_20 = models.DecimalField(max_digits=15, decimal_places=8, null=True)
@@ -214,6 +338,21 @@ class TechnicalTrigger(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        abstract = True
+
+
+class TechnicalTrigger(TechnicalTriggerFields):
+    pk = models.CompositePrimaryKey("coin_id", "transaction_time")
+    coin = models.ForeignKey(
+        Coin,
+        on_delete=models.CASCADE,
+        related_name="technical_trigger",
+        db_index=True,
+        to_field="coin",
+    )
+    transaction_time = models.DateTimeField(db_index=True)
+
     class Meta:
         db_table = "technical_triggers"
         constraints = [
@@ -233,3 +372,24 @@ class TechnicalTrigger(models.Model):
         return (
             f"Technical Trigger {self.coin.coin} @ {self.transaction_time.isoformat()}"
         )
+
+
+class LatestTechnicalTrigger(TechnicalTriggerFields):
+    """
+    Последние значения технических триггеров: одна строка на монету.
+    """
+
+    coin = models.OneToOneField(
+        Coin,
+        on_delete=models.CASCADE,
+        related_name="latest_technical_trigger",
+        primary_key=True,
+        to_field="coin",
+    )
+    transaction_time = models.DateTimeField()
+
+    class Meta:
+        db_table = "latest_technical_triggers"
+
+    def __str__(self):
+        return f"Latest technical trigger {self.coin_id} @ {self.transaction_time.isoformat()}"
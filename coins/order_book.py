@@ -1,36 +1,279 @@
-import os
-import django
-from binance import AsyncClient, BinanceSocketManager
+import asyncio
+import logging
+import time
+from collections import deque
+
 from django.utils.timezone import now
 from dotenv import load_dotenv
 from asgiref.sync import sync_to_async
-from .models import OrderBook, Coin
-import asyncio
+from .models import LatestOrderBook, OrderBook, OrderBookSnapshot, Coin
+from .realtime import publisher
+from .caching import bump_data_version, set_hot_order_book
+from .depth import book_metrics
+from .latest import upsert_latest
+from .stream import create_client, open_stream
+from .spool import DATABASE_UNAVAILABLE, get_spool, spool_on_failure
+from django.conf import settings
 from datetime import datetime
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "binance_parser.settings")
-django.setup()
-
 load_dotenv()
 
+# сколько событий потока копится, пока запрашивается снимок стакана
+SYNC_BUFFER_SIZE = 1000
+# задержка повторного запроса снимка после ошибки: удваивается до максимума (секунды)
+SNAPSHOT_RETRY_BASE = 1
+SNAPSHOT_RETRY_MAX = 60
+
 
 @sync_to_async
 def save_orderbook_data(symbol, bids, asks, timestamp):
     """
     сохранение данных стакана цен в базу данных
     """
-    coin, _ = Coin.objects.get_or_create(coin=symbol)
+    try:
+        coin, _ = Coin.objects.get_or_create(coin=symbol)
 
-    OrderBook.objects.create(
-        coin=coin,
-        transaction_time=timestamp,
-        bids=bids,
-        asks=asks,
-    )
+        OrderBook.objects.create(
+            coin=coin,
+            transaction_time=timestamp,
+            bids=bids,
+            asks=asks,
+        )
+    except DATABASE_UNAVAILABLE as e:
+        spool_on_failure(
+            "orderbook",
+            [
+                {
+                    "coin": symbol,
+                    "transaction_time": timestamp,
+                    "bids": bids,
+                    "asks": asks,
+                }
+            ],
+            e,
+        )
+        return
+    bump_data_version("orderbook", symbol)
+    get_spool("orderbook").replay_pending()
     print(f"сохранен стакан для {symbol} {timestamp}")
 
 
-async def handle_orderbook_data(data):
+@sync_to_async
+def save_orderbook_snapshot(symbol, minute, bids, asks):
+    """
+    сохранение поминутного снимка стакана; повтор после перезапуска игнорируется
+    """
+    OrderBookSnapshot.objects.bulk_create(
+        [
+            OrderBookSnapshot(
+                coin_id=symbol,
+                transaction_time=minute,
+                bids=bids,
+                asks=asks,
+                **book_metrics(bids, asks),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@sync_to_async
+def save_latest_order_book(symbol, transaction_time, last_update_id, bids, asks):
+    """
+    обновление последнего состояния стакана (одна строка на монету)
+    """
+    upsert_latest(
+        LatestOrderBook,
+        [
+            LatestOrderBook(
+                coin_id=symbol,
+                transaction_time=transaction_time,
+                last_update_id=last_update_id,
+                bids=bids,
+                asks=asks,
+                **book_metrics(bids, asks),
+            )
+        ],
+    )
+
+
+class LocalOrderBook:
+    """
+    Локальная копия стакана: снимок из REST API, на который накладываются
+    обновления из потока @depth (правила синхронизации Binance по U/u).
+    Пока снимок запрашивается, события копятся в буфере.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.last_update_id = None
+        self.bids = {}
+        self.asks = {}
+        # события с начала синхронизации; самые старые вытесняются
+        self.buffer = deque(maxlen=SYNC_BUFFER_SIZE)
+        self.snapshot_task = None
+        # ошибки запроса снимка подряд и время, раньше которого он не повторяется
+        self.snapshot_failures = 0
+        self.snapshot_retry_at = 0.0
+        self.snapshot_minute = None
+        self.latest_saved_at = None
+
+    def feed(self, data):
+        """
+        Событие потока. True - стакан синхронизирован и событие применено;
+        False - событие отложено в буфер до получения снимка.
+        """
+        if self.last_update_id is not None:
+            if self.apply(data):
+                return True
+            logging.warning(f"Пропуск событий стакана {self.symbol}, синхронизация")
+            self.last_update_id = None
+        self.buffer.append(data)
+        return False
+
+    async def resync(self, client):
+        """
+        Запрашивает снимок в фоне, не останавливая чтение потока, и, когда
+        он получен, синхронизирует по нему стакан. True - стакан готов.
+        После ошибки запроса снимок повторяется не раньше, чем через
+        удваивающуюся задержку, а не на каждом следующем событии.
+        """
+        if self.snapshot_task is None:
+            if time.monotonic() < self.snapshot_retry_at:
+                return False
+            self.snapshot_task = asyncio.create_task(
+                client.get_order_book(symbol=self.symbol, limit=1000)
+            )
+        if not self.snapshot_task.done():
+            return False
+        task, self.snapshot_task = self.snapshot_task, None
+        try:
+            snapshot = task.result()
+        except Exception as e:
+            self.snapshot_failures += 1
+            delay = min(
+                SNAPSHOT_RETRY_MAX,
+                SNAPSHOT_RETRY_BASE * 2 ** (self.snapshot_failures - 1),
+            )
+            self.snapshot_retry_at = time.monotonic() + delay
+            logging.warning(
+                f"Не удалось получить снимок стакана {self.symbol}: {e}, "
+                f"повтор через {delay} с"
+            )
+            return False
+        self.snapshot_failures = 0
+        return self.sync(snapshot)
+
+    def sync(self, snapshot):
+        """
+        Снимок плюс буфер: события с u <= lastUpdateId отбрасываются, первое
+        оставшееся должно накрывать lastUpdateId + 1 (U <= lastUpdateId + 1 <= u),
+        остальные - идти без пропусков. Иначе (снимок старше буфера) -
+        False, и снимок запрашивается заново со следующим событием.
+        """
+        last_update_id = snapshot["lastUpdateId"]
+        events = [e for e in self.buffer if e["u"] > last_update_id]
+        if events and events[0]["U"] > last_update_id + 1:
+            return False
+
+        self.last_update_id = last_update_id
+        self.bids = {float(p): (p, q) for p, q in snapshot["bids"]}
+        self.asks = {float(p): (p, q) for p, q in snapshot["asks"]}
+        self.buffer.clear()
+        for data in events:
+            if not self.apply(data):
+                self.last_update_id = None
+                return False
+        # без событий в буфере накрытие проверит apply на первом же событии
+        return True
+
+    def apply(self, data):
+        """
+        Применяет событие к стакану. Возвращает False, если обнаружен пропуск
+        событий и стакан нужно синхронизировать заново.
+        """
+        if data["u"] <= self.last_update_id:
+            return True
+        if data["U"] > self.last_update_id + 1:
+            return False
+
+        for side, levels in (
+            (self.bids, data.get("b", [])),
+            (self.asks, data.get("a", [])),
+        ):
+            for price, qty in levels:
+                if float(qty) == 0:
+                    side.pop(float(price), None)
+                else:
+                    side[float(price)] = (price, qty)
+
+        self.last_update_id = data["u"]
+        return True
+
+    def top(self, depth):
+        bids = [self.bids[p] for p in sorted(self.bids, reverse=True)[:depth]]
+        asks = [self.asks[p] for p in sorted(self.asks)[:depth]]
+        return bids, asks
+
+
+local_books = {}
+
+
+async def update_local_book(client, data, transaction_time):
+    """
+    Обновляет локальный стакан и горячий снимок в кэше. Пока стакан
+    не синхронизирован, снимки не сохраняются и не публикуются.
+    """
+    symbol = data["s"].upper()
+    book = local_books.get(symbol)
+    if book is None:
+        book = local_books[symbol] = LocalOrderBook(symbol)
+
+    if not book.feed(data) and not await book.resync(client):
+        return
+
+    bids, asks = book.top(settings.ORDERBOOK_HOT_DEPTH)
+
+    # первое событие новой минуты даёт снимок стакана на начало этой минуты
+    minute = transaction_time.replace(second=0, microsecond=0)
+    if book.snapshot_minute != minute:
+        book.snapshot_minute = minute
+        depth = settings.ORDERBOOK_SNAPSHOT_DEPTH
+        await save_orderbook_snapshot(symbol, minute, bids[:depth], asks[:depth])
+
+    # последнее состояние в базе обновляется не чаще ORDERBOOK_LATEST_FLUSH_INTERVAL
+    if (
+        book.latest_saved_at is None
+        or (transaction_time - book.latest_saved_at).total_seconds()
+        >= settings.ORDERBOOK_LATEST_FLUSH_INTERVAL
+    ):
+        book.latest_saved_at = transaction_time
+        depth = settings.ORDERBOOK_SNAPSHOT_DEPTH
+        await save_latest_order_book(
+            symbol, transaction_time, book.last_update_id, bids[:depth], asks[:depth]
+        )
+
+    await set_hot_order_book(
+        symbol,
+        {
+            "time": transaction_time,
+            "last_update_id": book.last_update_id,
+            "bids": bids,
+            "asks": asks,
+        },
+    )
+    publisher.publish(
+        "orderbook",
+        symbol,
+        {
+            "time": transaction_time,
+            "bids": bids[: settings.REALTIME_BOOK_DEPTH],
+            "asks": asks[: settings.REALTIME_BOOK_DEPTH],
+        },
+    )
+
+
+async def handle_orderbook_data(data, client=None):
     """
     обряботчик данных стакана цен
     """
@@ -43,41 +286,41 @@ async def handle_orderbook_data(data):
         transaction_time = datetime.fromtimestamp(int(timestamp) / 1000)
         symbol = data.get("s", "").upper()
         await save_orderbook_data(symbol, bids, asks, transaction_time)
+        if client is not None:
+            await update_local_book(client, data, transaction_time)
     except Exception as e:
         print(f"ошибка при обработке данных стакана {e}")
 
 
-async def start_websocket():
+async def stream_order_book(client, record=None, on_message=None):
     """
-    запуск вебсокет для получения данных о стакане цен
+    чтение потока стакана; ошибки соединения передаются вызывающему
+    (start_websocket или супервизор run_ingestion)
     """
-    api_key = os.getenv("BINANCE_API_KEY")
-    secret_key = os.getenv("BINANCE_SECRET_KEY")
+    symbol = ["btcusdt", "ethusdt"]
+    combined_streams = [f"{symbol.lower()}@depth" for symbol in symbol]
+    orderbook_stream = open_stream(client, combined_streams, record)
 
-    if not api_key or not secret_key:
-        raise ValueError("API ключи не найдены в переменных окружения")
+    async with orderbook_stream as stream:
+        while True:
+            res = await stream.recv()
+            if on_message is not None:
+                on_message()
+            if "stream" in res and "data" in res:
+                data = res["data"]
+                await handle_orderbook_data(data, client)
 
-    client = await AsyncClient.create(api_key, secret_key)
-    web_socket = BinanceSocketManager(client)
 
+async def start_websocket(record=None):
+    """
+    запуск вебсокет для получения данных о стакане цен
+    """
+    client = await create_client()
     try:
-        symbol = ["btcusdt", "ethusdt"]
-        combined_streams = [f"{symbol.lower()}@depth" for symbol in symbol]
-        orderbook_stream = web_socket.multiplex_socket(combined_streams)
-
-        async with orderbook_stream as stream:
-            while True:
-                res = await stream.recv()
-                if "stream" in res and "data" in res:
-                    data = res["data"]
-                    await handle_orderbook_data(data)
+        await stream_order_book(client, record)
     except KeyboardInterrupt:
         print("WebSocket остановлен пользователем")
     except Exception as e:
         print(f"Ошибка при работе с WebSocket: {e}")
     finally:
         await client.close_connection()
-
-
-if __name__ == "__main__":
-    asyncio.run(start_websocket())
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Потоки, на которые может подписаться клиент
+STREAMS = ("kline", "orderbook", "sentiment", "volatility", "technical")
+
+
+def topic_group(stream, coin):
+    """
+    Имя группы channel layer для пары (монета, поток).
+    """
+    return f"{stream}.{coin.upper()}"
+
+
+def build_message(stream, coin, data):
+    """
+    Сообщение для группы. Полезная нагрузка кодируется в JSON один раз
+    и отправляется всем подписчикам без повторной сериализации.
+    """
+    return {
+        "type": "stream.update",
+        "text": json.dumps(
+            {"stream": stream, "coin": coin.upper(), "data": data},
+            cls=DjangoJSONEncoder,
+        ),
+    }
+
+
+class TopicPublisher:
+    """
+    Публикация обновлений из процессов сбора данных с объединением по топику:
+    за интервал flush_interval в группу уходит только последнее обновление
+    каждой пары (монета, поток), сколько бы тиков ни пришло.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or settings.REALTIME_FLUSH_INTERVAL
+        self._pending = {}
+        self._task = None
+
+    def publish(self, stream, coin, data):
+        self._pending[(stream, coin.upper())] = data
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for (stream, coin), data in pending.items():
+            try:
+                await channel_layer.group_send(
+                    topic_group(stream, coin), build_message(stream, coin, data)
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось отправить обновление {stream}.{coin}: {e}")
+
+
+publisher = TopicPublisher()
+
+
+def publish_sync(stream, coin, data):
+    """
+    Отправка обновления из синхронного кода (расчёт индикаторов).
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            topic_group(stream, coin), build_message(stream, coin, data)
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось отправить обновление {stream}.{coin}: {e}")
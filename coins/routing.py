@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path("ws/stream/", consumers.StreamConsumer.as_asgi()),
+]
@@ -0,0 +1,223 @@
+"""
+Скринер монет по последним значениям: выражения фильтра и сортировки
+("stoch_rsi_k < 20 and price > ema_200", "-volume") вычисляются одним
+запросом по coins_coin и таблицам latest_* (одна строка на монету,
+соединение по первичному ключу coin_id), без обращения к гипертаблицам.
+Выражение разбирается ast и переводится в SQL только из разрешённых узлов:
+поля из SCREENER_FIELDS, числа (параметрами запроса), арифметика,
+сравнения, and/or/not и abs(); всё остальное - ValueError.
+"""
+
+import ast
+import decimal
+
+from django.db import connection, models
+
+from .models import (
+    Coin,
+    LatestSentimentIndicator,
+    LatestTechnicalTrigger,
+    LatestVolatilityLiquidityIndicator,
+)
+
+# псевдоним таблицы -> модель; coins_coin всегда в запросе
+SCREENER_TABLES = {
+    "c": Coin,
+    "t": LatestTechnicalTrigger,
+    "v": LatestVolatilityLiquidityIndicator,
+    "s": LatestSentimentIndicator,
+}
+
+# поле выражения -> (псевдоним таблицы, колонка): все числовые поля таблиц
+SCREENER_FIELDS = {
+    f.name: (alias, f.column)
+    for alias, model in SCREENER_TABLES.items()
+    for f in model._meta.concrete_fields
+    if isinstance(f, (models.FloatField, models.DecimalField, models.IntegerField))
+    and not f.primary_key
+}
+
+MAX_EXPRESSION_LENGTH = 500
+
+COMPARE_OPS = {
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "=",
+    ast.NotEq: "<>",
+}
+ARITHMETIC_OPS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+
+
+class ExpressionCompiler:
+    """
+    Выражение -> SQL. Каждый узел возвращает (sql, тип): "num" или "bool";
+    используемые поля копятся в fields, числа - в params.
+    """
+
+    def __init__(self):
+        self.fields = set()
+        self.params = []
+
+    def compile(self, text, kind):
+        if len(text) > MAX_EXPRESSION_LENGTH:
+            raise ValueError("Expression is too long")
+        try:
+            tree = ast.parse(text, mode="eval")
+        except SyntaxError:
+            raise ValueError(f"Invalid expression: {text}")
+        try:
+            sql, result = self.visit(tree.body)
+        except RecursionError:
+            raise ValueError("Expression is too deeply nested")
+        if result != kind:
+            expected = "a condition" if kind == "bool" else "a number"
+            raise ValueError(f"Expression must be {expected}: {text}")
+        return sql
+
+    def expect(self, node, kind):
+        sql, result = self.visit(node)
+        if result != kind:
+            expected = "a condition" if kind == "bool" else "a number"
+            raise ValueError(f"Expected {expected} in {ast.unparse(node)}")
+        return sql
+
+    def visit(self, node):
+        if isinstance(node, ast.Name):
+            if node.id not in SCREENER_FIELDS:
+                raise ValueError(f"Unknown field: {node.id}")
+            self.fields.add(node.id)
+            alias, column = SCREENER_FIELDS[node.id]
+            return f"{alias}.{column}", "num"
+
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError(f"Unsupported value: {node.value!r}")
+            # float: целые параметры дали бы целочисленное деление в SQL
+            self.params.append(float(node.value))
+            return "%s", "num"
+
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return f"(NOT {self.expect(node.operand, 'bool')})", "bool"
+            if isinstance(node.op, (ast.USub, ast.UAdd)):
+                sign = "-" if isinstance(node.op, ast.USub) else "+"
+                return f"({sign}{self.expect(node.operand, 'num')})", "num"
+
+        if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC_OPS:
+            left = self.expect(node.left, "num")
+            right = self.expect(node.right, "num")
+            if isinstance(node.op, ast.Div):
+                # деление на ноль даёт NULL, а не ошибку запроса
+                return f"({left} / NULLIF({right}, 0))", "num"
+            return f"({left} {ARITHMETIC_OPS[type(node.op)]} {right})", "num"
+
+        if isinstance(node, ast.BoolOp):
+            op = " AND " if isinstance(node.op, ast.And) else " OR "
+            return (
+                "(" + op.join(self.expect(v, "bool") for v in node.values) + ")",
+                "bool",
+            )
+
+        if isinstance(node, ast.Compare):
+            # цепочка a < b < c -> a < b AND b < c
+            operands = [self.expect(node.left, "num")] + [
+                self.expect(c, "num") for c in node.comparators
+            ]
+            parts = []
+            for i, op in enumerate(node.ops):
+                if type(op) not in COMPARE_OPS:
+                    raise ValueError("Unsupported comparison")
+                parts.append(f"{operands[i]} {COMPARE_OPS[type(op)]} {operands[i + 1]}")
+            return "(" + " AND ".join(parts) + ")", "bool"
+
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id == "abs"
+            and len(node.args) == 1
+            and not node.keywords
+        ):
+            return f"abs({self.expect(node.args[0], 'num')})", "num"
+
+        raise ValueError(f"Unsupported expression: {ast.unparse(node)[:60]}")
+
+
+def split_sort(text):
+    """
+    "-volume, stoch_rsi_k" -> ["-volume", "stoch_rsi_k"] (запятые вне скобок).
+    """
+    parts, depth, current = [], 0, ""
+    for char in text:
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def screener_value(value):
+    return float(value) if isinstance(value, decimal.Decimal) else value
+
+
+def screen(filter_expr=None, sort_expr=None, fields=None, limit=50):
+    """
+    Монеты, подходящие под filter_expr, по возрастанию выражений sort_expr
+    (минус - по убыванию, NULL в конце). В строках - coin, цена, поля fields
+    и поля из выражений. total - число подходящих монет без limit.
+    """
+    compiler = ExpressionCompiler()
+    where_sql = compiler.compile(filter_expr, "bool") if filter_expr else "TRUE"
+    where_params = list(compiler.params)
+    compiler.params = []
+    order_sql = [compiler.compile(s, "num") for s in split_sort(sort_expr or "")]
+    order_params = compiler.params
+
+    unknown = set(fields or []) - set(SCREENER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    columns = ["price"] + sorted(
+        (set(fields or []) | compiler.fields) - {"price"},
+        key=list(SCREENER_FIELDS).index,
+    )
+
+    aliases = {SCREENER_FIELDS[name][0] for name in columns} - {"c"}
+    joins = "".join(
+        f" LEFT JOIN {SCREENER_TABLES[alias]._meta.db_table} {alias}"
+        f" ON {alias}.coin_id = c.coin"
+        for alias in sorted(aliases)
+    )
+    select = ", ".join("{}.{}".format(*SCREENER_FIELDS[name]) for name in columns)
+    order = ", ".join(f"{sql} ASC NULLS LAST" for sql in order_sql + ["c.coin"])
+
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT c.coin, {select}, count(*) OVER ()
+            FROM coins_coin c{joins}
+            WHERE {where_sql}
+            ORDER BY {order}
+            LIMIT %s;
+            """,
+            where_params + order_params + [limit],
+        )
+        rows = cur.fetchall()
+
+    return {
+        "total": rows[0][-1] if rows else 0,
+        "fields": columns,
+        "data": [
+            {
+                "coin": r[0],
+                **{
+                    name: screener_value(value) for name, value in zip(columns, r[1:-1])
+                },
+            }
+            for r in rows
+        ],
+    }
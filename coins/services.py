@@ -1,135 +1,1168 @@
-from datetime import datetime
+import base64
+import hashlib
+import itertools
+import json
+import math
+import numpy as np
+from asgiref.sync import sync_to_async
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.db import connection
+from django.db.models import DecimalField, FloatField, Q
+from django.utils import timezone
 from django.http import JsonResponse
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.core.cache import cache
+from django.conf import settings
 from .models import Coin
-from .constants import RES_MAP
+from .constants import RES_MAP, RES_WIDTHS
+from .caching import (
+    ORDERBOOK_RETENTION_KEY,
+    depth_cache_key,
+    downsample_cache_key,
+    get_cached_klines,
+    get_hot_order_book,
+    klines_cache_tier,
+    set_cached_klines,
+)
+from .depth import aggregate_order_book
+from .downsample import lttb_indices
+from .archive import (
+    ARCHIVE_TABLES,
+    archive_cutoff,
+    archive_fields,
+    bucket_klines,
+    read_archive,
+)
 
 
 def parse_date(date_str):
     try:
-        return datetime.fromisoformat(date_str)
+        date = datetime.fromisoformat(date_str)
     except ValueError:
         raise ValueError("Invalid date format")
+    # время без зоны считается UTC, чтобы его можно было сравнивать с данными из базы
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, dt_timezone.utc)
+    return date
 
 
-def fetch_klines_data(coin, resolution, start=None, end=None, limit=500):
-    table = RES_MAP.get(resolution)
-    if not table:
-        raise ValueError("Invalid resolution")
+def parse_since(request):
+    """
+    Параметр since для инкрементальных обновлений: метка времени последней
+    (незакрытой) строки, которая уже есть у клиента.
+    """
+    since = request.GET.get("since", "").strip()
+    return parse_date(since) if since else None
+
 
+def parse_points(request):
+    """
+    Параметр points - целевое количество точек для прореживания ряда.
+    """
+    points = request.GET.get("points", "").strip()
+    if not points:
+        return None
     try:
-        coin_obj = Coin.objects.get(coin__iexact=coin)
-    except ObjectDoesNotExist:
-        raise ValueError("Coin not found")
+        points = int(points)
+    except ValueError:
+        raise ValueError("Invalid points")
+    if points < 3:
+        raise ValueError("points must be at least 3")
+    return min(points, settings.DOWNSAMPLE_MAX_POINTS)
 
-    params = [str(coin_obj.coin)]
-    where_clauses = ["coin_id = %s"]
 
-    time_col = "bucket"
+def build_time_filters(time_col, start=None, end=None, before=None, after=None):
+    """
+    Формирует условия выборки по времени: диапазон start/end и курсор (keyset)
+    before/after. Курсор - это метка времени последней полученной строки.
+    """
+    where_clauses = []
+    params = []
+
+    if before and after:
+        raise ValueError("Use either before or after cursor, not both")
 
     if start:
-        start_date = parse_date(start)
         where_clauses.append(f"{time_col} >= %s")
-        params.append(start_date)
+        params.append(parse_date(start))
 
     if end:
-        end_date = parse_date(end)
         where_clauses.append(f"{time_col} <= %s")
-        params.append(end_date)
+        params.append(parse_date(end))
+
+    if before:
+        where_clauses.append(f"{time_col} < %s")
+        params.append(parse_date(before))
+
+    if after:
+        where_clauses.append(f"{time_col} > %s")
+        params.append(parse_date(after))
+
+    return where_clauses, params
+
+
+def paginate_rows(rows, limit, forward):
+    """
+    Обрезает выборку из limit + 1 строк до limit, приводит её к порядку
+    по возрастанию времени и вычисляет курсор следующей страницы.
+    """
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+
+    if not forward:
+        rows.reverse()
 
-    where_sql = " AND ".join(where_clauses)
+    next_cursor = None
+    if has_more and rows:
+        # при движении назад следующая страница начинается перед самой старой строкой
+        next_cursor = rows[-1][0] if forward else rows[0][0]
+
+    return rows, next_cursor
+
+
+def kline_row(r):
+    return {
+        # Используем .isoformat() напрямую для объекта datetime
+        "time": r[0],
+        "open": float(r[1]) if r[1] is not None else 0,
+        "high": float(r[2]) if r[2] is not None else 0,
+        "low": float(r[3]) if r[3] is not None else 0,
+        "close": float(r[4]) if r[4] is not None else 0,
+        "volume": float(r[5]) if r[5] is not None else 0,
+    }
+
+
+def order_book_row(r):
+    return {
+        "time": r[0],
+        "bids": r[1] if r[1] is not None else [],
+        "asks": r[2] if r[2] is not None else [],
+    }
+
+
+def sentiment_indicator_row(indicator):
+    """
+    сериализация индикатора настроений для API
+    """
+    return {
+        "transaction_time": indicator.transaction_time.isoformat(),
+        "open_interest": (
+            float(indicator.open_interest) if indicator.open_interest else None
+        ),
+        "open_interest_change": (
+            float(indicator.open_interest_change)
+            if indicator.open_interest_change
+            else None
+        ),
+        "funding_rate": (
+            float(indicator.funding_rate) if indicator.funding_rate else None
+        ),
+        "next_funding_time": (
+            indicator.next_funding_time.isoformat()
+            if indicator.next_funding_time
+            else None
+        ),
+        "long_short_ratio": (
+            float(indicator.long_short_ratio) if indicator.long_short_ratio else None
+        ),
+        "long_positions": (
+            float(indicator.long_positions) if indicator.long_positions else None
+        ),
+        "short_positions": (
+            float(indicator.short_positions) if indicator.short_positions else None
+        ),
+        "created_at": indicator.created_at.isoformat(),
+    }
+
+
+def volatility_indicator_row(indicator):
+    """
+    сериализация индикатора волатильности и ликвидности для API
+    """
+    return {
+        "transaction_time": indicator.transaction_time.isoformat(),
+        "atr_14": float(indicator.atr_14) if indicator.atr_14 else None,
+        "atr_21": float(indicator.atr_21) if indicator.atr_21 else None,
+        "vwap": float(indicator.vwap) if indicator.vwap else None,
+        "vwap_high_band": (
+            float(indicator.vwap_high_band) if indicator.vwap_high_band else None
+        ),
+        "vwap_low_band": (
+            float(indicator.vwap_low_band) if indicator.vwap_low_band else None
+        ),
+        "liquidation_levels": indicator.liquidation_levels,
+        "created_at": indicator.created_at.isoformat(),
+    }
+
+
+def technical_trigger_row(indicator):
+    """
+    сериализация технического триггера для API
+    """
+    return {
+        "transaction_time": indicator.transaction_time.isoformat(),
+        "ema_20": float(indicator.ema_20) if indicator.ema_20 else None,
+        "ema_50": float(indicator.ema_50) if indicator.ema_50 else None,
+        "ema_100": float(indicator.ema_100) if indicator.ema_100 else None,
+        "ema_200": float(indicator.ema_200) if indicator.ema_200 else None,
+        "stoch_rsi_k": (
+            float(indicator.stoch_rsi_k) if indicator.stoch_rsi_k else None
+        ),
+        "stoch_rsi_d": (
+            float(indicator.stoch_rsi_d) if indicator.stoch_rsi_d else None
+        ),
+        "volume_profile_nodes": indicator.volume_profile_nodes,
+        "created_at": indicator.created_at.isoformat(),
+    }
+
+
+def klines_page_query(table, coin, start, end, limit, before=None, after=None):
+    """
+    SQL страницы свечей по диапазону и курсору: (sql, params, forward).
+    Общий для синхронных и асинхронных представлений.
+    """
+    time_clauses, time_params = build_time_filters("bucket", start, end, before, after)
+    params = [str(coin)] + time_params
+    where_sql = " AND ".join(["coin_id = %s"] + time_clauses)
+
+    forward = bool(after)
+    order = "ASC" if forward else "DESC"
 
     sql = f"""
-    SELECT {time_col} AS ts, open_price, high_price, low_price, close_price, volume
+    SELECT bucket AS ts, open_price, high_price, low_price, close_price, volume
     FROM {table}
     WHERE {where_sql}
-    ORDER BY ts DESC
+    ORDER BY ts {order}
     LIMIT %s;
     """
 
-    params.append(limit)
+    # одна лишняя строка показывает, есть ли следующая страница
+    params.append(limit + 1)
+    return sql, params, forward
 
-    with connection.cursor() as cur:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
 
-    rows = list(reversed(rows))
-
-    data = [
-        {
-            # Используем .isoformat() напрямую для объекта datetime
-            "time": r[0],
-            "open": float(r[1]) if r[1] is not None else 0,
-            "high": float(r[2]) if r[2] is not None else 0,
-            "low": float(r[3]) if r[3] is not None else 0,
-            "close": float(r[4]) if r[4] is not None else 0,
-            "volume": float(r[5]) if r[5] is not None else 0,
-        }
-        for r in rows
-    ]
+def latest_klines_query(table):
+    """
+    SQL последних свечей для списка монет; параметры - [limit, coins].
+    LATERAL-подзапрос берёт окно каждой монеты по индексу (coin_id, bucket DESC).
+    """
+    return f"""
+    SELECT c.coin, k.ts, k.open_price, k.high_price, k.low_price, k.close_price, k.volume
+    FROM coins_coin c
+    CROSS JOIN LATERAL (
+        SELECT bucket AS ts, open_price, high_price, low_price, close_price, volume
+        FROM {table}
+        WHERE coin_id = c.coin
+        ORDER BY bucket DESC
+        LIMIT %s
+    ) k
+    WHERE c.coin = ANY(%s)
+    ORDER BY c.coin, k.ts;
+    """
+
 
+def group_latest_klines(coins, rows):
+    series = {coin: [] for coin in coins}
+    for r in rows:
+        series[r[0]].append(tuple(r[1:]))
+    return series
+
+
+def klines_delta_query(table):
+    """
+    SQL свечей начиная с since; параметры - [coin, since, limit].
+    """
+    return f"""
+    SELECT bucket AS ts, open_price, high_price, low_price, close_price, volume
+    FROM {table}
+    WHERE coin_id = %s AND bucket >= %s
+    ORDER BY ts ASC
+    LIMIT %s;
+    """
+
+
+def row_digest(row):
+    """
+    Отпечаток строки ответа: по нему сравнивается строка, которая уже есть
+    у клиента, с её текущими значениями.
+    """
+    raw = json.dumps(row, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return hashlib.md5(raw).hexdigest()[:16]
+
+
+def parse_digest(request):
+    """
+    Параметр digest - отпечаток строки на момент since из прошлого ответа.
+    """
+    return request.GET.get("digest", "").strip() or None
+
+
+def delta_state(since_row, newest_row, digest, has_more):
+    """
+    Поля ответа с since. revised - строка на момент since отличается
+    от отпечатка digest или её больше нет (None, если отпечаток не передан).
+    digest - отпечаток самой новой строки для следующего запроса. has_more -
+    ответ обрезан limit, остальное запрашивается со since = время самой
+    новой строки.
+    """
+    revised = None
+    if digest is not None:
+        revised = since_row is None or row_digest(since_row) != digest
     return {
-        "coin": coin_obj.coin,
+        "revised": revised,
+        "digest": row_digest(newest_row) if newest_row is not None else digest,
+        "has_more": has_more,
+    }
+
+
+def klines_delta_response(coin, resolution, since, rows, limit, digest=None):
+    """
+    rows - свечи с since по возрастанию, запрошенные с limit + 1.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    data = [kline_row(r) for r in rows]
+    since_row = data[0] if rows and rows[0][0] == since else None
+    return {
+        "coin": coin,
         "resolution": resolution,
+        "since": since,
+        **delta_state(since_row, data[-1] if data else None, digest, has_more),
         "data": data,
     }
 
 
-def fetch_order_book_data(coin, start=None, end=None, limit=500):
+def order_book_page_query(
+    coin,
+    start,
+    end,
+    limit,
+    before=None,
+    after=None,
+    table="coins_orderbook",
+    columns="bids, asks",
+):
     """
-    выборка данных о стакане цен из базы данных
+    SQL страницы снимков стакана по диапазону и курсору: (sql, params, forward).
+    table/columns выбирают уровень хранения: сырые события или поминутные снимки.
     """
+    time_clauses, time_params = build_time_filters(
+        "transaction_time", start, end, before, after
+    )
+    params = [str(coin)] + time_params
+    where_sql = " AND ".join(["coin_id = %s"] + time_clauses)
+
+    forward = bool(after)
+    order = "asc" if forward else "desc"
+
+    sql = f"""
+    select transaction_time as ts, {columns}
+    from {table}
+    where {where_sql}
+    order by ts {order}
+    limit %s;
+    """
+
+    params.append(limit + 1)
+    return sql, params, forward
+
+
+def indicator_query(model, since=None):
+    """
+    SQL последних строк индикатора монеты (с since - строк начиная с since);
+    параметры - [coin, (since,) limit].
+    Возвращает (sql, attnames) для сборки экземпляров модели из строк.
+    """
+    fields = model._meta.concrete_fields
+    columns = ", ".join(f.column for f in fields)
+    where_sql = "coin_id = %s AND transaction_time >= %s" if since else "coin_id = %s"
+    # строки с since - по возрастанию: при обрезке limit теряются самые новые,
+    # и клиент дозапрашивает их следующим since
+    order = "ASC" if since else "DESC"
+    sql = f"""
+    SELECT {columns}
+    FROM {model._meta.db_table}
+    WHERE {where_sql}
+    ORDER BY transaction_time {order}
+    LIMIT %s;
+    """
+    return sql, [f.attname for f in fields]
+
+
+def fetch_klines_data(
+    coin, resolution, start=None, end=None, limit=500, before=None, after=None
+):
+    """
+    выборка свечей с keyset-пагинацией: без курсора возвращаются последние
+    limit свечей, before листает историю назад, after - вперёд
+    """
+    table = RES_MAP.get(resolution)
+    if not table:
+        raise ValueError("Invalid resolution")
 
     try:
         coin_obj = Coin.objects.get(coin__iexact=coin)
     except ObjectDoesNotExist:
         raise ValueError("Coin not found")
 
-    params = [str(coin_obj.coin)]
-    where_clauses = ["coin_id = %s"]
+    if not any((start, end, before, after)):
+        # последнее окно свечей обслуживается общим с batch-запросом кэшем
+        rows = get_latest_klines([coin_obj.coin], resolution, limit).get(
+            coin_obj.coin, []
+        )
+        rows, next_cursor = paginate_rows(rows[::-1], limit, forward=False)
+        return {
+            "coin": coin_obj.coin,
+            "resolution": resolution,
+            "data": [kline_row(r) for r in rows],
+            "next_cursor": next_cursor,
+        }
+
+    if use_archive(end, before):
+        rows, forward = fetch_archived_klines(
+            coin_obj.coin, resolution, start, end, limit, before, after
+        )
+    else:
+        sql, params, forward = klines_page_query(
+            table, coin_obj.coin, start, end, limit, before, after
+        )
+
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+
+    rows, next_cursor = paginate_rows(rows, limit, forward)
+
+    return {
+        "coin": coin_obj.coin,
+        "resolution": resolution,
+        "data": [kline_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def use_archive(end=None, before=None):
+    """
+    Диапазон целиком старше границы архива: его данных в базе уже нет.
+    """
+    cutoff = archive_cutoff()
+    upper = end or before
+    return bool(cutoff and upper and parse_date(upper) <= cutoff)
+
+
+def parse_bounds(start=None, end=None, before=None, after=None):
+    values = {"start": start, "end": end, "before": before, "after": after}
+    return {key: parse_date(value) if value else None for key, value in values.items()}
+
+
+def bucket_floor(value, width):
+    seconds = int(width.total_seconds())
+    timestamp = int(value.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def fetch_archived_klines(coin, resolution, start, end, limit, before, after):
+    """
+    Страница свечей из архива Parquet в порядке, который ждёт paginate_rows:
+    (rows, forward). Свечи разрешения собираются из архивных 1m; крайняя
+    корзина, которая могла попасть в выборку не целиком из-за limit, отбрасывается.
+    """
+    forward = bool(after)
+    width = RES_WIDTHS[resolution]
+    per_bucket = int(width / RES_WIDTHS["1m"])
+    raw_limit = (limit + 2) * per_bucket
+
+    # границы и курсоры сравниваются с началом корзины, как bucket в агрегатах:
+    # из 1m читаются только минуты корзин, которые попали бы в выборку из базы
+    bounds = parse_bounds(start, end, before, after)
+    tick = timedelta(microseconds=1)
+    for key in ("start", "before"):
+        if bounds[key]:
+            bounds[key] = bucket_floor(bounds[key] - tick, width) + width
+    for key in ("end", "after"):
+        if bounds[key]:
+            bounds[key] = bucket_floor(bounds[key], width) + width - tick
+
+    raw = read_archive(
+        "kline",
+        coin,
+        columns=["open_price", "close_price", "high_price", "low_price", "volume"],
+        limit=raw_limit,
+        descending=not forward,
+        **bounds,
+    )
+    truncated = len(raw) == raw_limit
+    if not forward:
+        raw.reverse()
+
+    rows = bucket_klines(raw, width)
+    if truncated and rows:
+        rows = rows[:-1] if forward else rows[1:]
+    if not forward:
+        rows.reverse()
+    return rows[: limit + 1], forward
+
+
+def fetch_archive_page(
+    name, coin, start=None, end=None, limit=500, before=None, after=None, columns=None
+):
+    """
+    Страница строк архива Parquet с той же keyset-пагинацией, что и у API базы.
+    columns - подмножество колонок таблицы (по умолчанию все).
+    """
+    if name not in ARCHIVE_TABLES:
+        raise ValueError("Unknown archive table")
+    if before and after:
+        raise ValueError("Use either before or after cursor, not both")
+
+    columns = columns or [f.column for f in archive_fields(ARCHIVE_TABLES[name])]
+    forward = bool(after)
+    rows = read_archive(
+        name,
+        coin,
+        columns=columns,
+        limit=limit + 1,
+        descending=not forward,
+        **parse_bounds(start, end, before, after),
+    )
+    rows, next_cursor = paginate_rows(rows, limit, forward)
+
+    names = ["transaction_time"] + [c for c in columns if c != "transaction_time"]
+    return {
+        "coin": coin,
+        "table": name,
+        "data": [dict(zip(names, row)) for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def query_latest_klines(coins, resolution, limit):
+    """
+    Последние limit свечей для нескольких монет одним запросом:
+    LATERAL-подзапрос берёт окно каждой монеты по индексу (coin_id, bucket DESC).
+    Возвращает {coin: rows} со строками по возрастанию времени.
+    """
+    table = RES_MAP.get(resolution)
+    if not table:
+        raise ValueError("Invalid resolution")
+
+    with connection.cursor() as cur:
+        cur.execute(latest_klines_query(table), [limit, list(coins)])
+        rows = cur.fetchall()
+
+    return group_latest_klines(coins, rows)
+
+
+def get_latest_klines(coins, resolution, limit):
+    """
+    Последние свечи для списка монет через кэш: из базы запрашиваются
+    только монеты, которых нет в кэше, сразу окном klines_cache_tier.
+    Возвращается limit + 1 строк, чтобы одиночный запрос мог определить
+    курсор следующей страницы.
+    """
+    fetch_limit = limit + 1
+    series = get_cached_klines(coins, resolution, fetch_limit)
+
+    missing = [coin for coin in coins if coin not in series]
+    if missing:
+        tier = klines_cache_tier(fetch_limit)
+        fetched = query_latest_klines(missing, resolution, tier)
+        set_cached_klines(fetched, resolution, tier)
+        series.update({coin: rows[-fetch_limit:] for coin, rows in fetched.items()})
+
+    return series
+
+
+def fetch_klines_batch(coins, resolution, limit=100):
+    """
+    Свечи для нескольких монет в компактном колоночном формате.
+    Время - unix-секунды начала свечи.
+    """
+    coins = list(dict.fromkeys(coin.strip().upper() for coin in coins if coin.strip()))
+    series = get_latest_klines(coins, resolution, limit)
+
+    data = {}
+    missing = []
+    for coin in coins:
+        rows = series.get(coin) or []
+        if not rows:
+            missing.append(coin)
+            continue
+        rows = rows[-limit:]
+        data[coin] = {
+            "t": [int(r[0].timestamp()) for r in rows],
+            "o": [float(r[1]) if r[1] is not None else 0 for r in rows],
+            "h": [float(r[2]) if r[2] is not None else 0 for r in rows],
+            "l": [float(r[3]) if r[3] is not None else 0 for r in rows],
+            "c": [float(r[4]) if r[4] is not None else 0 for r in rows],
+            "v": [float(r[5]) if r[5] is not None else 0 for r in rows],
+        }
+
+    return {
+        "resolution": resolution,
+        "series": data,
+        "missing": missing,
+    }
+
+
+def fetch_klines_delta(coin, resolution, since, limit=500, digest=None):
+    """
+    Свечи начиная с since включительно для обновления графика.
+    revised показывает, что свеча на момент since (незакрытая у клиента)
+    изменилась по сравнению с отпечатком digest и должна заменить старую.
+    """
+    table = RES_MAP.get(resolution)
+    if not table:
+        raise ValueError("Invalid resolution")
+
+    with connection.cursor() as cur:
+        cur.execute(klines_delta_query(table), [str(coin), since, limit + 1])
+        rows = cur.fetchall()
+
+    return klines_delta_response(coin, resolution, since, rows, limit, digest)
+
+
+# точка отсчёта для времени строк в массивах NumPy
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def finite_or_none(value):
+    """
+    Число для JSON: None вместо NULL и NaN (numeric в PostgreSQL допускает NaN,
+    а JsonResponse записал бы его как недопустимый в JSON литерал NaN).
+    """
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def fetch_klines_downsampled(coin, resolution, start, end, points):
+    """
+    Свечи за диапазон, прореженные до points штук с сохранением high/low:
+    подряд идущие свечи объединяются в одну (open первой, close последней,
+    max high, min low, сумма объёмов). Объединение идёт в базе (ntile),
+    из неё приходит не больше points строк.
+    Результат кэшируется по (монета, таймфрейм, диапазон, points).
+    """
+    table = RES_MAP.get(resolution)
+    if not table:
+        raise ValueError("Invalid resolution")
+
+    key = downsample_cache_key("kline", coin, resolution, start, end, points)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    time_clauses, time_params = build_time_filters("bucket", start, end)
+    where_sql = " AND ".join(["coin_id = %s"] + time_clauses)
+
+    sql = f"""
+    SELECT min(ts), first(open_price, ts), max(high_price), min(low_price),
+        last(close_price, ts), sum(volume), sum(count(*)) OVER ()
+    FROM (
+        SELECT bucket AS ts, open_price, high_price, low_price, close_price,
+            volume, ntile(%s) OVER (ORDER BY bucket) AS part
+        FROM {table}
+        WHERE {where_sql}
+    ) k
+    GROUP BY part
+    ORDER BY part;
+    """
+
+    with connection.cursor() as cur:
+        cur.execute(sql, [points, str(coin)] + time_params)
+        rows = cur.fetchall()
+
+    data = {
+        "coin": coin,
+        "resolution": resolution,
+        "source_points": int(rows[0][-1]) if rows else 0,
+        "data": [
+            {
+                "time": r[0],
+                **{
+                    name: finite_or_none(value)
+                    for name, value in zip(
+                        ("open", "high", "low", "close", "volume"), r[1:6]
+                    )
+                },
+            }
+            for r in rows
+        ],
+    }
+    cache.set(key, data, timeout=settings.DOWNSAMPLE_CACHE_TTL)
+    return data
+
+
+def fetch_indicators_downsampled(model, row_func, coin, start, end, points, field):
+    """
+    Строки индикатора за диапазон, прореженные LTTB по полю field.
+    Сначала серверным курсором читаются только время и значение поля
+    (сразу в массивы NumPy), затем полные строки для выбранных точек.
+    Порядок - от новых к старым, как у обычного ответа.
+    """
+    try:
+        model_field = model._meta.get_field(field)
+    except FieldDoesNotExist:
+        raise ValueError("Invalid field")
+    if not isinstance(model_field, (DecimalField, FloatField)):
+        raise ValueError("Invalid field")
 
-    time_col = "transaction_time"
+    key = downsample_cache_key(model._meta.db_table, coin, field, start, end, points)
+    data = cache.get(key)
+    if data is not None:
+        return data
 
+    queryset = model.objects.filter(coin_id=coin)
     if start:
-        start_date = parse_date(start)
-        where_clauses.append(f"{time_col} >= %s")
-        params.append(start_date)
+        queryset = queryset.filter(transaction_time__gte=parse_date(start))
     if end:
-        end_date = parse_date(end)
-        where_clauses.append(f"{time_col} <= %s")
-        params.append(end_date)
+        queryset = queryset.filter(transaction_time__lte=parse_date(end))
+
+    # время - целые микросекунды от эпохи, чтобы выбранные точки
+    # точно совпали со строками при повторном запросе
+    series = queryset.order_by("transaction_time").values_list(
+        "transaction_time", field
+    )
+    values = np.fromiter(
+        (
+            ((t - EPOCH) // MICROSECOND, np.nan if v is None else float(v))
+            for t, v in series.iterator(chunk_size=5000)
+        ),
+        dtype=[("t", np.int64), ("v", np.float64)],
+    )
+    if not values.size:
+        return []
+
+    x = values["t"] / 1e6
+    selected = [
+        EPOCH + timedelta(microseconds=int(values["t"][i]))
+        for i in lttb_indices(x, values["v"], points).tolist()
+    ]
 
-    where_sql = " AND ".join(where_clauses)
+    indicators = queryset.filter(transaction_time__in=selected).order_by(
+        "-transaction_time"
+    )
+    data = [row_func(indicator) for indicator in indicators]
+    cache.set(key, data, timeout=settings.DOWNSAMPLE_CACHE_TTL)
+    return data
+
+
+def iter_query(sql, params, row_func, chunk_size):
+    """
+    Генератор строк запроса через серверный курсор PostgreSQL.
+    Запрос собирается заранее, поэтому ошибки параметров возникают до начала потока.
+    """
+    with connection.chunked_cursor() as cur:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for r in rows:
+                yield row_func(r)
+
+
+def iter_klines_rows(coin, resolution, start=None, end=None, chunk_size=2000):
+    """
+    Потоковая выборка свечей за диапазон через серверный курсор.
+    Строки читаются пачками по chunk_size и не загружаются в память целиком.
+    """
+    table = RES_MAP.get(resolution)
+    if not table:
+        raise ValueError("Invalid resolution")
+
+    time_clauses, time_params = build_time_filters("bucket", start, end)
+    params = [str(coin)] + time_params
+    where_sql = " AND ".join(["coin_id = %s"] + time_clauses)
 
     sql = f"""
-    select {time_col} as ts, bids, asks
-    from coins_orderbook
-    where {where_sql}
-    order by ts desc
-    limit %s;
+    SELECT bucket AS ts, open_price, high_price, low_price, close_price, volume
+    FROM {table}
+    WHERE {where_sql}
+    ORDER BY ts ASC;
+    """
+
+    return iter_query(sql, params, kline_row, chunk_size)
+
+
+def fetch_order_book_data(
+    coin, start=None, end=None, limit=500, before=None, after=None
+):
+    """
+    выборка данных о стакане цен из базы данных
+    """
+
+    try:
+        coin_obj = Coin.objects.get(coin__iexact=coin)
+    except ObjectDoesNotExist:
+        raise ValueError("Coin not found")
+
+    sql, params, forward = order_book_page_query(
+        coin_obj.coin, start, end, limit, before, after
+    )
+
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+
+    rows, next_cursor = paginate_rows(rows, limit, forward)
+
+    return {
+        "coin": coin_obj.coin,
+        "data": [order_book_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+SNAPSHOT_COLUMNS = "bids, asks, mid_price, spread_bps, bid_qty, ask_qty, imbalance"
+
+
+def order_book_snapshot_row(r):
+    return {
+        "time": r[0],
+        "bids": parse_levels(r[1]),
+        "asks": parse_levels(r[2]),
+        "mid_price": r[3],
+        "spread_bps": r[4],
+        "bid_qty": r[5],
+        "ask_qty": r[6],
+        "imbalance": r[7],
+    }
+
+
+def raw_order_book_retention():
+    """
+    Срок хранения сырых событий стакана по действующей политике TimescaleDB
+    (timedelta; None - политики нет). Политика, а не настройка: после смены
+    ORDERBOOK_RAW_RETENTION_DAYS без orderbook_retention они расходятся.
+    Кэшируется на ORDERBOOK_RETENTION_CACHE_TTL.
+    """
+    cached = cache.get(ORDERBOOK_RETENTION_KEY)
+    if cached is not None:
+        return cached[0]
+
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT (config->>'drop_after')::interval
+            FROM timescaledb_information.jobs
+            WHERE proc_name = 'policy_retention'
+                AND hypertable_name = 'coins_orderbook';
+            """)
+        row = cur.fetchone()
+
+    retention = row[0] if row else None
+    cache.set(
+        ORDERBOOK_RETENTION_KEY,
+        (retention,),
+        timeout=settings.ORDERBOOK_RETENTION_CACHE_TTL,
+    )
+    return retention
+
+
+def select_order_book_tier(start=None, end=None):
+    """
+    Уровень истории стакана для диапазона: сырые события ("raw") для
+    недавних коротких диапазонов, поминутные снимки ("1m") для диапазонов,
+    выходящих за срок хранения сырых данных или длиннее ORDERBOOK_RAW_MAX_SPAN_HOURS.
     """
+    if not start:
+        return "raw"
 
-    params.append(limit)
+    now = timezone.now()
+    start = parse_date(start)
+    end = parse_date(end) if end else now
+
+    retention = raw_order_book_retention()
+    max_span = timedelta(hours=settings.ORDERBOOK_RAW_MAX_SPAN_HOURS)
+    if (retention and start < now - retention) or end - start > max_span:
+        return "1m"
+    return "raw"
+
+
+def fetch_order_book_history(
+    coin, start=None, end=None, limit=500, before=None, after=None, tier=None
+):
+    """
+    История стакана из подходящего уровня хранения. tier можно задать явно.
+    """
+    tier = tier or select_order_book_tier(start, end)
+    if tier == "raw":
+        data = fetch_order_book_data(coin, start, end, limit, before, after)
+        data["tier"] = tier
+        return data
+    if tier != "1m":
+        raise ValueError("Invalid tier")
+
+    try:
+        coin_obj = Coin.objects.get(coin__iexact=coin)
+    except ObjectDoesNotExist:
+        raise ValueError("Coin not found")
+
+    sql, params, forward = order_book_page_query(
+        coin_obj.coin,
+        start,
+        end,
+        limit,
+        before,
+        after,
+        table="coins_orderbook_1m",
+        columns=SNAPSHOT_COLUMNS,
+    )
 
     with connection.cursor() as cur:
         cur.execute(sql, params)
         rows = cur.fetchall()
 
-    rows = list(reversed(rows))
+    rows, next_cursor = paginate_rows(rows, limit, forward)
+
+    return {
+        "coin": coin_obj.coin,
+        "tier": tier,
+        "data": [order_book_snapshot_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def parse_levels(levels):
+    """
+    Уровни стакана из сырого SQL приходят строкой JSON.
+    """
+    if levels is None:
+        return []
+    if isinstance(levels, str):
+        return json.loads(levels)
+    return levels
+
+
+def fetch_current_order_book(coin, depth=20):
+    """
+    Текущий стакан монеты: горячий снимок из кэша, который поддерживает
+    процесс сбора данных, либо последнее состояние из latest_orderbook.
+    """
+    coin = coin.upper()
+    book = get_hot_order_book(coin)
+    source = "cache"
+
+    if book is None:
+        source = "db"
+        if not Coin.objects.filter(coin=coin).exists():
+            raise ObjectDoesNotExist("Coin not found")
+
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                select transaction_time, bids, asks
+                from latest_orderbook
+                where coin_id = %s;
+                """,
+                [coin],
+            )
+            row = cur.fetchone()
 
-    data = [
-        {
-            "time": r[0],
-            "bids": r[1] if r[1] is not None else [],
-            "asks": r[2] if r[2] is not None else [],
+        book = {
+            "time": row[0] if row else None,
+            "bids": parse_levels(row[1]) if row else [],
+            "asks": parse_levels(row[2]) if row else [],
         }
-        for r in rows
-    ]
+
     return {
+        "coin": coin,
+        "time": book["time"],
+        "source": source,
+        "bids": book["bids"][:depth],
+        "asks": book["asks"][:depth],
+    }
+
+
+def latest_order_book_row(book, depth):
+    return order_book_snapshot_row(
+        (
+            book.transaction_time,
+            book.bids[:depth],
+            book.asks[:depth],
+            book.mid_price,
+            book.spread_bps,
+            book.bid_qty,
+            book.ask_qty,
+            book.imbalance,
+        )
+    )
+
+
+def fetch_latest_state(coin, depth=20):
+    """
+    Последнее состояние монеты одним запросом по первичным ключам:
+    тикер, метрики стакана и последние строки трёх семейств индикаторов.
+    """
+    # ключ ответа -> (обратная связь монеты, сериализация)
+    relations = {
+        "orderbook": (
+            "latest_order_book",
+            lambda book: latest_order_book_row(book, depth),
+        ),
+        "sentiment": ("latest_sentiment", sentiment_indicator_row),
+        "volatility": ("latest_volatility_liquidity", volatility_indicator_row),
+        "technical": ("latest_technical_trigger", technical_trigger_row),
+    }
+
+    coin_obj = (
+        Coin.objects.select_related(*(relation for relation, _ in relations.values()))
+        .filter(coin__iexact=coin)
+        .first()
+    )
+    if coin_obj is None:
+        raise ObjectDoesNotExist("Coin not found")
+
+    data = {
         "coin": coin_obj.coin,
-        "data": data,
+        "ticker": {
+            "price": coin_obj.price,
+            "price_change_percent": coin_obj.price_change_percent,
+            "volume": coin_obj.volume,
+            "updated_at": coin_obj.updated_at,
+        },
     }
+    for name, (relation, row_func) in relations.items():
+        try:
+            data[name] = row_func(getattr(coin_obj, relation))
+        except ObjectDoesNotExist:
+            data[name] = None
+    return data
+
+
+def fetch_order_book_depth(coin, tick=None, tick_pct=None, bps=(10, 50, 100)):
+    """
+    Агрегированный стакан с кумулятивной глубиной. Результат кэшируется
+    по (монета, снимок, шаг, bps): пока снимок не изменился, расчёт не повторяется.
+    """
+    book = fetch_current_order_book(coin, depth=settings.ORDERBOOK_HOT_DEPTH)
+
+    key = depth_cache_key(book["coin"], book["time"], tick, tick_pct, bps)
+    data = cache.get(key)
+    if data is None:
+        data = aggregate_order_book(
+            book["bids"], book["asks"], tick=tick, tick_pct=tick_pct, bps=bps
+        )
+        data.update({"coin": book["coin"], "time": book["time"]})
+        cache.set(key, data, timeout=settings.ORDERBOOK_DEPTH_CACHE_TTL)
+
+    return data
+
+
+def iter_order_book_rows(coin, start=None, end=None, chunk_size=500):
+    """
+    Потоковая выборка снимков стакана за диапазон через серверный курсор.
+    """
+    time_clauses, time_params = build_time_filters("transaction_time", start, end)
+    params = [str(coin)] + time_params
+    where_sql = " AND ".join(["coin_id = %s"] + time_clauses)
+
+    sql = f"""
+    select transaction_time as ts, bids, asks
+    from coins_orderbook
+    where {where_sql}
+    order by ts asc;
+    """
+
+    return iter_query(sql, params, order_book_row, chunk_size)
+
+
+def get_range_params(request):
+    """
+    Извлекает параметры диапазона и курсора из GET-запроса.
+    """
+    return {
+        key: request.GET.get(key, "").strip() or None
+        for key in ("start", "end", "before", "after")
+    }
+
+
+async def stream_ndjson(rows, batch_size=500):
+    """
+    Асинхронный NDJSON для StreamingHttpResponse: под ASGI синхронный
+    генератор был бы собран в память целиком. Строки читаются пачками
+    в общем потоке синхронного кода (там живёт соединение серверного курсора).
+    """
+    next_batch = sync_to_async(lambda: list(itertools.islice(rows, batch_size)))
+    try:
+        while batch := await next_batch():
+            yield "".join(
+                json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in batch
+            )
+    finally:
+        # курсор закрывается в том же потоке, где был открыт
+        await sync_to_async(rows.close)()
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return value, pk
+
+
+def keyset_page(
+    queryset, field, descending, cursor=None, direction="next", page_size=10
+):
+    """
+    Keyset-пагинация по (field, id) без COUNT и OFFSET: страница начинается
+    сразу после (или перед, для direction="prev") строки из курсора.
+    """
+    backward = bool(cursor) and direction == "prev"
+    # при движении назад выборка идёт в обратном порядке и затем разворачивается
+    reverse = descending != backward
+
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        op = "lt" if reverse else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": pk})
+        )
+
+    ordering = [f"-{field}", "-id"] if reverse else [field, "id"]
+    items = list(queryset.order_by(*ordering)[: page_size + 1])
+
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if backward:
+        items.reverse()
+
+    has_next = has_more if not backward else True
+    has_previous = bool(cursor) and (has_more if backward else True)
+
+    return {
+        "items": items,
+        "has_next": has_next and bool(items),
+        "has_previous": has_previous and bool(items),
+        "next_cursor": (
+            encode_cursor(getattr(items[-1], field), items[-1].id) if items else None
+        ),
+        "prev_cursor": (
+            encode_cursor(getattr(items[0], field), items[0].id) if items else None
+        ),
+    }
+
+
+def get_coin_table_count(queryset):
+    """
+    Количество монет под фильтром, кэшируется по тексту запроса.
+    """
+    key = "coin_table:count:" + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=settings.COIN_TABLE_COUNT_CACHE_TTL)
+    return count
 
 
 def validate_coin_and_limit(request, coin):
@@ -141,9 +1174,18 @@ def validate_coin_and_limit(request, coin):
     except Coin.DoesNotExist:
         return None, JsonResponse({"error": "Coin not found"}, status=404)
 
-    try:
-        limit = min(int(request.GET.get("limit", 500)), 1000)
-    except ValueError:
-        return None, JsonResponse({"error": "Invalid limit"}, status=400)
+    limit = parse_limit(request)
+    if isinstance(limit, JsonResponse):
+        return None, limit
 
     return coin_obj, limit
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get("limit", 500))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive"}, status=400)
+    return min(limit, 1000)
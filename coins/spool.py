@@ -0,0 +1,262 @@
+"""
+Локальный буфер записей на случай недоступности базы. Процессы сбора данных
+при OperationalError пишут записи в сегменты SPOOL_DIR/<вид>/<номер>.jsonl
+(только дописывание, fsync после каждой записи, новый сегмент после
+SPOOL_SEGMENT_BYTES) и переигрывают их пакетно, когда база снова доступна.
+Переигрывание идёт по сегментам в порядке записи и идемпотентно: повтор
+после сбоя посреди сегмента даёт тот же результат. Оно идёт вслед за
+живыми записями, поэтому записи буфера не затирают более свежие строки.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import (
+    InterfaceError,
+    OperationalError,
+    close_old_connections,
+    connection,
+)
+
+from .caching import bump_data_version, bump_ticker_version
+from .kline_pages import PRICE_COLUMNS
+from .models import Coin, OrderBook
+
+# ошибки, при которых запись уходит в буфер, а не теряется
+DATABASE_UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+def last_by_key(records, key):
+    """
+    Последняя запись для каждого ключа в порядке записи: одна пачка
+    INSERT ... ON CONFLICT DO UPDATE не может обновить строку дважды.
+    """
+    return list({key(r): r for r in records}.values())
+
+
+def replay_klines(records):
+    records = last_by_key(records, lambda r: (r["coin"], r["transaction_time"]))
+    coins = {r["coin"] for r in records}
+    Coin.objects.bulk_create([Coin(coin=c) for c in coins], ignore_conflicts=True)
+    # буфер переигрывается после живых записей, и его строка не должна
+    # затереть более свежую: объём свечи в потоке Binance только растёт,
+    # поэтому меньший объём - более раннее состояние той же свечи
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO coins_kline (coin_id, transaction_time, {", ".join(PRICE_COLUMNS)})
+            SELECT * FROM unnest(
+                %s::text[], %s::timestamptz[], %s::float8[], %s::float8[],
+                %s::float8[], %s::float8[], %s::float8[]
+            )
+            ON CONFLICT (coin_id, transaction_time) DO UPDATE SET
+                {", ".join(f"{name} = EXCLUDED.{name}" for name in PRICE_COLUMNS)}
+            WHERE coins_kline.volume <= EXCLUDED.volume;
+            """,
+            [
+                [r["coin"] for r in records],
+                [datetime.fromisoformat(r["transaction_time"]) for r in records],
+            ]
+            + [[r[name] for r in records] for name in PRICE_COLUMNS],
+        )
+    for coin in coins:
+        bump_data_version("kline", coin)
+
+
+def replay_order_books(records):
+    coins = {r["coin"] for r in records}
+    Coin.objects.bulk_create([Coin(coin=c) for c in coins], ignore_conflicts=True)
+    OrderBook.objects.bulk_create(
+        [
+            OrderBook(
+                coin_id=r["coin"],
+                transaction_time=datetime.fromisoformat(r["transaction_time"]),
+                bids=r["bids"],
+                asks=r["asks"],
+            )
+            for r in records
+        ],
+        ignore_conflicts=True,
+    )
+    for coin in coins:
+        bump_data_version("orderbook", coin)
+
+
+def replay_tickers(records):
+    records = last_by_key(records, lambda r: r["coin"])
+    # тикер из буфера не затирает более свежий, записанный напрямую
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO coins_coin (coin, price, price_change_percent, volume, updated_at)
+            SELECT * FROM unnest(
+                %s::text[], %s::float8[], %s::float8[], %s::float8[], %s::timestamptz[]
+            )
+            ON CONFLICT (coin) DO UPDATE SET
+                price = EXCLUDED.price,
+                price_change_percent = EXCLUDED.price_change_percent,
+                volume = EXCLUDED.volume,
+                updated_at = EXCLUDED.updated_at
+            WHERE coins_coin.updated_at < EXCLUDED.updated_at;
+            """,
+            [
+                [r["coin"] for r in records],
+                [r["price"] for r in records],
+                [r["price_change_percent"] for r in records],
+                [r["volume"] for r in records],
+                [datetime.fromisoformat(r["updated_at"]) for r in records],
+            ],
+        )
+    bump_ticker_version()
+
+
+REPLAYERS = {
+    "kline": replay_klines,
+    "orderbook": replay_order_books,
+    "ticker": replay_tickers,
+}
+
+
+class Spool:
+    def __init__(self, kind, root=None):
+        self.kind = kind
+        self.dir = os.path.join(root or settings.SPOOL_DIR, kind)
+        self.lock = threading.Lock()
+        self.active = None
+        self.pending = bool(self.segments())
+
+    def segments(self):
+        """
+        [(номер, путь), ...] сегментов по порядку записи.
+        """
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(
+            (int(name[: -len(".jsonl")]), os.path.join(self.dir, name))
+            for name in os.listdir(self.dir)
+            if name.endswith(".jsonl")
+        )
+
+    def append(self, records):
+        lines = "".join(
+            json.dumps(r, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n"
+            for r in records
+        )
+        with self.lock:
+            if self.active is None:
+                os.makedirs(self.dir, exist_ok=True)
+                segments = self.segments()
+                number = segments[-1][0] + 1 if segments else 1
+                self.active = open(os.path.join(self.dir, f"{number:012d}.jsonl"), "a")
+            self.active.write(lines)
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            if self.active.tell() >= settings.SPOOL_SEGMENT_BYTES:
+                self.rotate()
+            self.pending = True
+
+    def rotate(self):
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+
+    def read_segment(self, path):
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # строка, недописанная при аварийной остановке
+                    logging.warning(f"Пропущена повреждённая запись в {path}")
+        return records
+
+    def replay(self, max_segments=None, batch=None):
+        """
+        Переигрывает сегменты по порядку; сегмент удаляется только после
+        записи всех его пачек. Возвращает метрики переигрывания.
+        """
+        batch = batch or settings.SPOOL_REPLAY_BATCH
+        replay = REPLAYERS[self.kind]
+        started = time.perf_counter()
+        replayed = 0
+        with self.lock:
+            # активный сегмент закрывается, новые записи пойдут в следующий
+            self.rotate()
+            segments = self.segments()
+            for _, path in segments[:max_segments]:
+                records = self.read_segment(path)
+                for i in range(0, len(records), batch):
+                    replay(records[i : i + batch])
+                os.remove(path)
+                replayed += len(records)
+            self.pending = len(segments) > len(segments[:max_segments])
+
+        elapsed = time.perf_counter() - started
+        return self.publish_metrics(
+            replayed=replayed,
+            seconds=round(elapsed, 3),
+            rate=round(replayed / elapsed, 1) if elapsed > 0 else 0,
+        )
+
+    def replay_pending(self):
+        """
+        После успешной записи в базу дописывает по одному сегменту буфера,
+        чтобы догонять отставание без долгой остановки обработчика.
+        """
+        if not self.pending:
+            return
+        try:
+            metrics = self.replay(max_segments=1)
+            logging.info(f"Буфер {self.kind}: переиграно {metrics['replayed']} записей")
+        except DATABASE_UNAVAILABLE as e:
+            close_old_connections()
+            logging.warning(f"Буфер {self.kind}: база снова недоступна ({e})")
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(path) for _, path in segments),
+        }
+
+    def publish_metrics(self, **metrics):
+        """
+        Размер буфера и скорость последнего переигрывания в кэш (spool:<вид>).
+        """
+        metrics = {**self.stats(), **metrics, "updated_at": time.time()}
+        try:
+            cache.set(f"spool:{self.kind}", metrics, None)
+        except Exception:
+            pass
+        return metrics
+
+
+spools = {}
+
+
+def get_spool(kind):
+    if kind not in spools:
+        spools[kind] = Spool(kind)
+    return spools[kind]
+
+
+def spool_on_failure(kind, records, error):
+    """
+    Запись, которую не удалось сохранить в базу, уходит в буфер.
+    Соединение закрывается, чтобы следующая запись открыла новое.
+    """
+    close_old_connections()
+    spool = get_spool(kind)
+    spool.append(records)
+    spool.publish_metrics()
+    logging.warning(
+        f"База недоступна ({error}), {len(records)} записей {kind} в буфере"
+    )
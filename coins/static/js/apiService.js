@@ -16,6 +16,14 @@ export async function fetchOrderBookData(orderBookApiUrl) {
         }
         const data = await response.json();
 
+        // Текущий стакан (api/orderbook/<coin>/current/) уже содержит уровни массивами
+        if (Array.isArray(data.bids) && Array.isArray(data.asks)) {
+            return {
+                bids: data.bids,
+                asks: data.asks
+            };
+        }
+
         if (!Array.isArray(data.data) || data.data.length === 0) {
             throw new Error("Пустой массив данных");
         }
@@ -40,4 +48,55 @@ export async function fetchOrderBookData(orderBookApiUrl) {
         console.error("Ошибка при загрузке стакана ордеров:", error.message);
         throw error;
     }
-}
\ No newline at end of file
+}
+
+// Данные для первой отрисовки страницы графика одним запросом
+export async function fetchBootstrap(apiUrl, params = {}) {
+    const urlParams = new URLSearchParams(params);
+    const response = await fetch(`${apiUrl}?${urlParams.toString()}`);
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+}
+
+// Отпечатки самых новых строк из прошлых ответов по ряду (URL и параметры):
+// сервер сравнивает с отпечатком строку на момент since и сообщает revised
+const deltaDigests = new Map();
+
+// Инкрементальное обновление: только строки с метки времени since включительно
+export async function fetchDelta(apiUrl, params = {}, since, timeKey = 'time') {
+    const seriesKey = `${apiUrl}?${new URLSearchParams(params).toString()}`;
+    const known = deltaDigests.get(seriesKey);
+    const query = { ...params, since };
+    // Отпечаток годится, только если since - та же строка, что и в прошлом ответе
+    if (known && known.time === since) {
+        query.digest = known.digest;
+    }
+    const urlParams = new URLSearchParams(query);
+    const response = await fetch(`${apiUrl}?${urlParams.toString()}`);
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const delta = await response.json();
+    if (delta.digest && delta.data.length) {
+        const times = delta.data.map(row => row[timeKey]);
+        const newest = times.reduce((a, b) => (new Date(b) > new Date(a) ? b : a));
+        deltaDigests.set(seriesKey, { time: newest, digest: delta.digest });
+    }
+    return delta;
+}
+
+// Ответ не меняет загруженные строки: пришла только строка на момент since,
+// и её отпечаток совпал с прошлым
+export function isUnchanged(delta) {
+    return delta.revised === false && delta.data.length === 1;
+}
+
+// Слияние ответа с since с уже загруженными строками: строки начиная с since
+// заменяются пришедшими (включая пересчитанную незакрытую строку).
+export function mergeDelta(rows, delta, timeKey, newestFirst = false) {
+    const since = new Date(delta.since).getTime();
+    const kept = rows.filter(row => new Date(row[timeKey]).getTime() < since);
+    return newestFirst ? delta.data.concat(kept) : kept.concat(delta.data);
+}
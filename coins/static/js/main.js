@@ -1,7 +1,8 @@
-import { fetchKlinesData, fetchOrderBookData } from "./apiService";
+import { fetchKlinesData, fetchOrderBookData, fetchBootstrap, fetchDelta, isUnchanged, mergeDelta } from "./apiService";
 import { renderD3KlineChart } from "./kline-chart";
 import { renderOrderBook } from "./order-book";
 import { renderSentimentChart, renderVolatilityChart, renderTechnicalChart } from "./indicator-charts";
+import { connectRealtime } from "./realtime";
 
 document.addEventListener('DOMContentLoaded', async () => {
     // Получение конфигурации
@@ -11,11 +12,13 @@ document.addEventListener('DOMContentLoaded', async () => {
         return;
     }
 
+    const coin = configElement.dataset.coin;
     const klinesApiUrl = configElement.dataset.klinesApiUrl;
-    const orderBookApiUrl = configElement.dataset.orderbookApiUrl; // Добавляем URL для стакана
+    const orderBookApiUrl = configElement.dataset.orderbookCurrentUrl; // Текущий стакан из горячего снимка
         const sentimentApiUrl = configElement.dataset.sentimentApiUrl;
     const volatilityApiUrl = configElement.dataset.volatilityApiUrl;
     const technicalApiUrl = configElement.dataset.technicalApiUrl;
+    const bootstrapApiUrl = configElement.dataset.bootstrapApiUrl;
 
     // Инициализация параметров запроса
     let requestParams = {
@@ -65,6 +68,15 @@ document.addEventListener('DOMContentLoaded', async () => {
         console.error("Элемент 'technical-chart-container' не найден!");
         return;
     }
+    // Последние загруженные данные, к которым применяются обновления из вебсокета
+    let klinesData = [];
+    // Объём минутных свечей, уже учтённый в текущей свече таймфрейма:
+    // тик несёт накопленный объём своей минуты, прибавляется только прирост.
+    // Минуты, начавшиеся до загрузки свечей из API, в ней уже учтены.
+    let tickVolumes = {};
+    let klinesLoadedAt = 0;
+    const indicatorData = { sentiment: [], volatility: [], technical: [] };
+
     // Функция для загрузки и отрисовки данных графика
     async function loadAndRenderChart(resolution) {
         try {
@@ -81,6 +93,10 @@ document.addEventListener('DOMContentLoaded', async () => {
                 throw new Error("Получены пустые данные");
             }
 
+            klinesData = rawData;
+            tickVolumes = {};
+            klinesLoadedAt = Date.now();
+
             // Очищаем контейнер перед отрисовкой нового графика
             chartContainer.innerHTML = "";
 
@@ -92,6 +108,33 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    // Обновление графика: запрашиваются только свечи начиная с последней загруженной
+    async function refreshChartDelta() {
+        if (!klinesData.length) {
+            return loadAndRenderChart(requestParams.resolution);
+        }
+        try {
+            const resolution = requestParams.resolution;
+            const since = klinesData[klinesData.length - 1].time;
+            const delta = await fetchDelta(klinesApiUrl, { resolution, limit: requestParams.limit }, since);
+
+            // Пока шёл запрос, мог смениться таймфрейм
+            if (resolution !== requestParams.resolution || !delta.data.length || isUnchanged(delta)) {
+                return;
+            }
+            // Новых свечей больше limit: проще загрузить окно заново
+            if (delta.has_more) {
+                return loadAndRenderChart(resolution);
+            }
+            klinesData = mergeDelta(klinesData, delta, 'time').slice(-requestParams.limit);
+            tickVolumes = {};
+            klinesLoadedAt = Date.now();
+            renderD3KlineChart('kline-chart-container', klinesData);
+        } catch (error) {
+            console.error("Ошибка при обновлении графика:", error.message);
+        }
+    }
+
     // Функция для загрузки и отрисовки стакана ордеров
     async function loadAndRenderOrderBook() {
         try {
@@ -137,6 +180,8 @@ document.addEventListener('DOMContentLoaded', async () => {
             // Очищаем контейнер перед отрисовкой
             sentimentContainer.innerHTML = "";
 
+            indicatorData.sentiment = sentimentData;
+
             // Отрисовываем график
             renderSentimentChart('sentiment-chart-container', sentimentData);
 
@@ -165,6 +210,8 @@ document.addEventListener('DOMContentLoaded', async () => {
             // Очищаем контейнер перед отрисовкой
             volatilityContainer.innerHTML = "";
 
+            indicatorData.volatility = volatilityData;
+
             // Отрисовываем график
             renderVolatilityChart('volatility-chart-container', volatilityData);
 
@@ -193,6 +240,8 @@ document.addEventListener('DOMContentLoaded', async () => {
             // Очищаем контейнер перед отрисовкой
             technicalContainer.innerHTML = "";
 
+            indicatorData.technical = technicalData;
+
             // Отрисовываем график
             renderTechnicalChart('technical-chart-container', technicalData);
 
@@ -235,19 +284,196 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
     chartContainer.parentNode.insertBefore(buttonContainer, chartContainer);
 
-    // Загружаем начальный график с разрешением '1d'
-    loadAndRenderChart(requestParams.resolution);
-    // Загружаем и отрисовываем стакан ордеров
-    loadAndRenderOrderBook();
-    // Загружаем и отрисовываем индикаторные графики
-    loadAndRenderSentiment();
-    loadAndRenderVolatility();
-    loadAndRenderTechnical();
+    // Обновления в реальном времени: тики свечей, стакан и новые строки индикаторов
+    const INDICATOR_RENDERERS = {
+        sentiment: ['sentiment-chart-container', sentimentContainer, renderSentimentChart],
+        volatility: ['volatility-chart-container', volatilityContainer, renderVolatilityChart],
+        technical: ['technical-chart-container', technicalContainer, renderTechnicalChart],
+    };
+
+    const INDICATOR_LOADERS = {
+        sentiment: loadAndRenderSentiment,
+        volatility: loadAndRenderVolatility,
+        technical: loadAndRenderTechnical,
+    };
+
+    // Первая отрисовка: свечи, стакан и индикаторы одним запросом.
+    // Пустые разделы и ошибка запроса обрабатываются отдельными загрузчиками.
+    async function loadInitialData() {
+        let data;
+        try {
+            data = await fetchBootstrap(bootstrapApiUrl, {
+                resolution: requestParams.resolution,
+                limit: requestParams.limit,
+                depth: 50,
+                indicator_limit: 50,
+            });
+        } catch (error) {
+            console.error("Ошибка при загрузке начальных данных:", error.message);
+            loadAndRenderChart(requestParams.resolution);
+            loadAndRenderOrderBook();
+            Object.values(INDICATOR_LOADERS).forEach(load => load());
+            return;
+        }
+
+        if (data.klines.data.length) {
+            klinesData = data.klines.data;
+            chartContainer.innerHTML = "";
+            renderD3KlineChart('kline-chart-container', klinesData);
+        } else {
+            loadAndRenderChart(requestParams.resolution);
+        }
+
+        if (data.orderbook.bids.length || data.orderbook.asks.length) {
+            orderBookContainer.innerHTML = "";
+            renderOrderBook('orderbook-container', data.orderbook);
+        } else {
+            loadAndRenderOrderBook();
+        }
+
+        Object.entries(INDICATOR_RENDERERS).forEach(([stream, [containerId, container, render]]) => {
+            if (!data[stream].length) {
+                INDICATOR_LOADERS[stream]();
+                return;
+            }
+            indicatorData[stream] = data[stream];
+            container.innerHTML = "";
+            render(containerId, data[stream]);
+        });
+    }
+
+    // Загружаем начальный график с разрешением '1d', стакан и индикаторы
+    loadInitialData();
+
+    function applyIndicatorUpdate(stream, row) {
+        const [containerId, container, render] = INDICATOR_RENDERERS[stream];
+        // Индикаторы приходят от новых к старым, новая строка заменяет строку с тем же временем
+        const rows = indicatorData[stream].filter(r => r.transaction_time !== row.transaction_time);
+        rows.unshift(row);
+        indicatorData[stream] = rows.slice(0, 50);
+        container.innerHTML = "";
+        render(containerId, indicatorData[stream]);
+    }
+
+    let klineRenderPending = false;
+
+    // Длительность свечи таймфрейма, мс
+    const RES_MS = {
+        "1m": 60_000,
+        "5m": 300_000,
+        "15m": 900_000,
+        "1h": 3_600_000,
+        "4h": 14_400_000,
+        "1d": 86_400_000,
+    };
+
+    function applyKlineTick(tick) {
+        if (!klinesData.length) {
+            return;
+        }
+        const last = klinesData[klinesData.length - 1];
+        const tickTime = new Date(tick.time).getTime();
+        const lastTime = new Date(last.time).getTime();
+        const resMs = RES_MS[requestParams.resolution];
+        const bucket = Math.floor(tickTime / resMs) * resMs;
+
+        if (bucket > lastTime) {
+            // Открылась новая свеча таймфрейма
+            klinesData.push({
+                time: new Date(bucket).toISOString(),
+                open: tick.open ?? tick.close,
+                high: tick.high,
+                low: tick.low,
+                close: tick.close,
+                volume: tick.volume,
+            });
+            klinesData = klinesData.slice(-requestParams.limit);
+            tickVolumes = { [tickTime]: tick.volume };
+        } else if (bucket === lastTime) {
+            if (requestParams.resolution === '1m') {
+                // Тик минутной свечи целиком заменяет её
+                Object.assign(last, tick);
+            } else {
+                // Первый тик минуты из загруженной свечи задаёт точку отсчёта
+                const counted = tickVolumes[tickTime]
+                    ?? (tickTime <= klinesLoadedAt ? tick.volume : 0);
+                Object.assign(last, {
+                    high: Math.max(last.high, tick.high),
+                    low: Math.min(last.low, tick.low),
+                    close: tick.close,
+                    volume: last.volume + tick.volume - counted,
+                });
+            }
+            tickVolumes[tickTime] = tick.volume;
+        } else {
+            return;
+        }
+
+        // Перерисовываем не чаще раза в секунду
+        if (!klineRenderPending) {
+            klineRenderPending = true;
+            setTimeout(() => {
+                klineRenderPending = false;
+                renderD3KlineChart('kline-chart-container', klinesData);
+            }, 1000);
+        }
+    }
+
+    const wsProtocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const realtime = connectRealtime(
+        `${wsProtocol}://${window.location.host}/ws/stream/`,
+        ['kline', 'orderbook', 'sentiment', 'volatility', 'technical'].map(stream => ({ stream, coin })),
+        {
+            kline: applyKlineTick,
+            orderbook: (book) => {
+                orderBookContainer.innerHTML = "";
+                renderOrderBook('orderbook-container', book);
+            },
+            sentiment: (row) => applyIndicatorUpdate('sentiment', row),
+            volatility: (row) => applyIndicatorUpdate('volatility', row),
+            technical: (row) => applyIndicatorUpdate('technical', row),
+        }
+    );
+
+    // Обновление индикаторов по since: приходят только новые и пересчитанные строки
+    async function refreshIndicatorDelta(stream, apiUrl) {
+        const rows = indicatorData[stream];
+        try {
+            const delta = await fetchDelta(apiUrl, { limit: 50 }, rows[0].transaction_time, 'transaction_time');
+            if (!delta.data.length || isUnchanged(delta)) {
+                return;
+            }
+            if (delta.has_more) {
+                return INDICATOR_LOADERS[stream]();
+            }
+            const [containerId, container, render] = INDICATOR_RENDERERS[stream];
+            indicatorData[stream] = mergeDelta(rows, delta, 'transaction_time', true).slice(0, 50);
+            container.innerHTML = "";
+            render(containerId, indicatorData[stream]);
+        } catch (error) {
+            console.error(`Ошибка при обновлении индикаторов ${stream}:`, error.message);
+        }
+    }
+
+    function indicatorPoller(stream, apiUrl, fullLoad) {
+        return () => indicatorData[stream].length ? refreshIndicatorDelta(stream, apiUrl) : fullLoad();
+    }
+
+    // Опрос API остаётся запасным вариантом, пока вебсокет недоступен
+    function pollIfOffline(load) {
+        return () => {
+            if (!realtime.isConnected()) {
+                load();
+            }
+        };
+    }
 
     // Опционально: обновляем стакан каждые 5 секунд
-    setInterval(loadAndRenderOrderBook, 5000);
+    setInterval(pollIfOffline(loadAndRenderOrderBook), 5000);
+    // Опционально: обновляем график каждые 15 секунд
+    setInterval(pollIfOffline(refreshChartDelta), 15000);
     // Опционально: обновляем индикаторы каждые 30 секунд
-    setInterval(loadAndRenderSentiment, 30000);
-    setInterval(loadAndRenderVolatility, 30000);
-    setInterval(loadAndRenderTechnical, 30000);
+    setInterval(pollIfOffline(indicatorPoller('sentiment', sentimentApiUrl, loadAndRenderSentiment)), 30000);
+    setInterval(pollIfOffline(indicatorPoller('volatility', volatilityApiUrl, loadAndRenderVolatility)), 30000);
+    setInterval(pollIfOffline(indicatorPoller('technical', technicalApiUrl, loadAndRenderTechnical)), 30000);
 });
\ No newline at end of file
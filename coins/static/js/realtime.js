@@ -0,0 +1,48 @@
+// Подключение к вебсокету обновлений в реальном времени (Django Channels).
+// topics - список пар { stream, coin }, handlers - обработчики по имени потока.
+export function connectRealtime(url, topics, handlers) {
+    let socket = null;
+    let connected = false;
+    let retryDelay = 1000;
+
+    function subscribe() {
+        topics.forEach(({ stream, coin }) => {
+            socket.send(JSON.stringify({ action: "subscribe", stream, coin }));
+        });
+    }
+
+    function open() {
+        socket = new WebSocket(url);
+
+        socket.addEventListener("open", () => {
+            connected = true;
+            retryDelay = 1000;
+            subscribe();
+        });
+
+        socket.addEventListener("message", (event) => {
+            const message = JSON.parse(event.data);
+            if (message.error) {
+                console.error("Ошибка подписки:", message.error);
+                return;
+            }
+            const handler = handlers[message.stream];
+            if (handler && message.data) {
+                handler(message.data);
+            }
+        });
+
+        socket.addEventListener("close", () => {
+            connected = false;
+            // Переподключение с экспоненциальной задержкой, пока работает опрос API
+            setTimeout(open, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        });
+    }
+
+    open();
+
+    return {
+        isConnected: () => connected,
+    };
+}
@@ -0,0 +1,123 @@
+"""
+Лёгкий клиент комбинированных потоков Binance для горячего пути сбора данных.
+BinanceSocketManager разбирает каждый кадр стандартным json и держит
+собственную очередь сообщений; здесь кадр читается прямо из соединения
+и разбирается orjson (если пакет установлен, иначе - json).
+Интерфейс тот же, что у multiplex_socket: async with ... as stream,
+await stream.recv() -> {"stream": ..., "data": ...}, поэтому обработчики
+не меняются. Клиент выбирается настройкой WS_CLIENT ("binance" | "lean").
+"""
+
+import json
+import os
+
+import websockets
+from binance import AsyncClient, BinanceSocketManager
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# разбор кадра: orjson принимает и bytes, и str
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class LeanStream:
+    def __init__(self, streams, record=None, url=None):
+        self.url = (
+            (url or settings.BINANCE_WS_URL) + "/stream?streams=" + "/".join(streams)
+        )
+        self.record = record
+        self.connection = None
+        self.record_file = None
+
+    async def __aenter__(self):
+        # сжатие выключено: Binance его не использует, а распаковка стоит CPU
+        self.connection = await websockets.connect(
+            self.url, compression=None, max_size=None
+        )
+        if self.record:
+            self.record_file = open(self.record, "ab")
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+        await self.connection.close()
+
+    async def recv(self):
+        frame = await self.connection.recv()
+        if self.record_file is not None:
+            # кадр на строку: файл потом подаётся в benchmark_ws_decoding
+            self.record_file.write(
+                (frame if isinstance(frame, bytes) else frame.encode()) + b"\n"
+            )
+        return loads(frame)
+
+
+class StreamError(Exception):
+    """
+    Ошибка соединения, о которой BinanceSocketManager сообщает кадром
+    {"e": "error", ...} вместо исключения.
+    """
+
+
+class CheckedSocket:
+    """
+    multiplex_socket, у которого recv() поднимает StreamError на кадрах
+    ошибок: иначе обрыв выглядел бы для обработчиков как обычное сообщение
+    без данных, и супервизор не узнавал бы о нём.
+    """
+
+    def __init__(self, socket):
+        self.socket = socket
+
+    async def __aenter__(self):
+        await self.socket.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.socket.__aexit__(*exc)
+
+    async def recv(self):
+        res = await self.socket.recv()
+        if isinstance(res, dict) and res.get("e") == "error":
+            raise StreamError(f"{res.get('type')}: {res.get('m')}")
+        return res
+
+
+async def create_client():
+    """
+    REST-клиент Binance с ключами из переменных окружения.
+    """
+    api_key = os.getenv("BINANCE_API_KEY")
+    secret_key = os.getenv("BINANCE_SECRET_KEY")
+
+    if not api_key or not secret_key:
+        raise ValueError("API ключи не найдены в переменных окружения")
+
+    return await AsyncClient.create(api_key, secret_key)
+
+
+def open_stream(client, streams, record=None, lean=False):
+    """
+    Комбинированный поток по списку имён потоков ("btcusdt@depth", ...)
+    через клиент из настройки WS_CLIENT. record - файл для записи сырых
+    кадров, запись всегда идёт через лёгкий клиент; lean=True - лёгкий
+    клиент независимо от настройки. Обрыв соединения
+    в обоих клиентах - исключение из recv().
+    """
+    if lean or settings.WS_CLIENT == "lean" or record:
+        return LeanStream(streams, record=record)
+    return CheckedSocket(BinanceSocketManager(client).multiplex_socket(streams))
+
+
+def read_frames(path):
+    """
+    Записанные кадры (по одному на строку) как список bytes.
+    """
+    with open(path, "rb") as f:
+        return [line.rstrip(b"\n") for line in f if line.strip()]
@@ -1,6 +1,9 @@
 from celery import shared_task
+from django.conf import settings
 from django.core.management import call_command
 
+from .correlation import update_correlations
+
 
 @shared_task
 def calculate_indicators_task(limit=100, batch_size=10):
@@ -14,3 +17,17 @@ def calculate_indicators_task(limit=100, batch_size=10):
         return "калькуляция индикатора закончилась успешно"
     except Exception as e:
         return f"ошибка калькуляции индикаторов {str(e)}"
+
+
+@shared_task
+def update_correlations_task():
+    """
+    обновление скользящих корреляций по закрывшимся свечам всех разрешений
+    """
+    updated = {}
+    for resolution, window in settings.CORRELATION_WINDOWS.items():
+        try:
+            updated[resolution] = update_correlations(resolution, window)
+        except Exception as e:
+            updated[resolution] = f"ошибка: {e}"
+    return updated
@@ -1,3 +1,1328 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.db import OperationalError
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import (
+    archive,
+    backfill,
+    caching,
+    correlation,
+    kline_gaps,
+    kline_pages,
+    order_book,
+    screener,
+    services,
+    spool,
+    stream,
+    views,
+)
+from .constants import RES_MAP
+from .depth import aggregate_order_book, tick_decimals
+from .downsample import fill_gaps, lttb_indices
+
+UTC = timezone.utc
+
+# тесты не обращаются к Redis
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def minutes(*values):
+    return [datetime(2024, 1, 1, tzinfo=UTC) + timedelta(minutes=m) for m in values]
+
+
+class KlinesPaginationTests(SimpleTestCase):
+    def test_time_filters(self):
+        clauses, params = services.build_time_filters(
+            "bucket", start="2024-01-01T00:00:00", before="2024-01-02T00:00:00+03:00"
+        )
+        self.assertEqual(clauses, ["bucket >= %s", "bucket < %s"])
+        # время без зоны - UTC
+        self.assertEqual(params[0], datetime(2024, 1, 1, tzinfo=UTC))
+        self.assertEqual(params[1], datetime(2024, 1, 1, 21, tzinfo=UTC))
+
+    def test_time_filters_reject_both_cursors(self):
+        with self.assertRaises(ValueError):
+            services.build_time_filters(
+                "bucket", before="2024-01-01", after="2024-01-01"
+            )
+        with self.assertRaises(ValueError):
+            services.build_time_filters("bucket", start="yesterday")
+
+    def test_backward_page(self):
+        # без курсора и с before строки идут от новых к старым
+        rows = [(t,) for t in minutes(4, 3, 2, 1)]
+        page, cursor = services.paginate_rows(rows, 3, forward=False)
+        self.assertEqual([r[0] for r in page], minutes(2, 3, 4))
+        self.assertEqual(cursor, minutes(2)[0])
+
+    def test_forward_page(self):
+        rows = [(t,) for t in minutes(1, 2, 3)]
+        page, cursor = services.paginate_rows(rows, 2, forward=True)
+        self.assertEqual([r[0] for r in page], minutes(1, 2))
+        self.assertEqual(cursor, minutes(2)[0])
+
+    def test_last_page_has_no_cursor(self):
+        rows = [(t,) for t in minutes(2, 1)]
+        page, cursor = services.paginate_rows(rows, 2, forward=False)
+        self.assertEqual(len(page), 2)
+        self.assertIsNone(cursor)
+
+    def test_page_query(self):
+        sql, params, forward = services.klines_page_query(
+            "coins_kline_1m", "BTCUSDT", None, None, 100, after="2024-01-01"
+        )
+        self.assertTrue(forward)
+        self.assertIn("bucket > %s", sql)
+        self.assertIn("ORDER BY ts ASC", sql)
+        self.assertEqual(params, ["BTCUSDT", minutes(0)[0], 101])
+
+        sql, params, forward = services.klines_page_query(
+            "coins_kline_1m", "BTCUSDT", None, None, 100
+        )
+        self.assertFalse(forward)
+        self.assertIn("ORDER BY ts DESC", sql)
+        self.assertEqual(params, ["BTCUSDT", 101])
+
+    def test_parse_limit(self):
+        factory = RequestFactory()
+        self.assertEqual(services.parse_limit(factory.get("/")), 500)
+        self.assertEqual(services.parse_limit(factory.get("/?limit=5000")), 1000)
+        for value in ("0", "-1", "abc"):
+            with self.subTest(limit=value):
+                response = services.parse_limit(factory.get(f"/?limit={value}"))
+                self.assertEqual(response.status_code, 400)
+
+    def test_stream_ndjson(self):
+        closed = []
+
+        def rows():
+            try:
+                for i in range(5):
+                    yield {"i": i}
+            finally:
+                closed.append(True)
+
+        async def collect():
+            return [chunk async for chunk in services.stream_ndjson(rows(), 2)]
+
+        chunks = asyncio.run(collect())
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual("".join(chunks).splitlines()[-1], '{"i": 4}')
+        self.assertEqual(closed, [True])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class LatestKlinesCacheTests(SimpleTestCase):
+    def setUp(self):
+        services.cache.clear()
+        patcher = mock.patch.object(services, "query_latest_klines", self.query)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queries = []
+
+    def query(self, coins, resolution, limit):
+        self.queries.append((list(coins), limit))
+        return {coin: [(t,) for t in minutes(*range(limit))] for coin in coins}
+
+    def test_miss_reads_only_the_tier(self):
+        series = services.get_latest_klines(["A", "B"], "1m", 100)
+        self.assertEqual(self.queries, [(["A", "B"], 101)])
+        self.assertEqual(len(series["A"]), 101)
+
+        services.get_latest_klines(["A", "B", "C"], "1m", 50)
+        self.assertEqual(self.queries[1:], [(["C"], 101)])
+
+    def test_larger_limit_uses_its_own_tier(self):
+        services.get_latest_klines(["A"], "1m", 100)
+        series = services.get_latest_klines(["A"], "1m", 500)
+        self.assertEqual(self.queries, [(["A"], 101), (["A"], 501)])
+        self.assertEqual(series["A"][-1][0], minutes(500)[0])
+        self.assertEqual(len(series["A"]), 501)
+
+    def test_group_latest_klines(self):
+        rows = [("A", 1, 2), ("B", 3, 4), ("A", 5, 6)]
+        self.assertEqual(
+            services.group_latest_klines(["A", "B", "C"], rows),
+            {"A": [(1, 2), (5, 6)], "B": [(3, 4)], "C": []},
+        )
+
+
+class DeltaTests(SimpleTestCase):
+    def rows(self, *values, close=1.0):
+        return [(t, 1.0, 2.0, 0.5, close, 10.0) for t in minutes(*values)]
+
+    def test_parse_since(self):
+        factory = RequestFactory()
+        self.assertIsNone(services.parse_since(factory.get("/")))
+        self.assertEqual(
+            services.parse_since(factory.get("/?since=2024-01-01T00:01:00")),
+            minutes(1)[0],
+        )
+        self.assertEqual(services.parse_digest(factory.get("/?digest=")), None)
+
+    def test_without_digest_revised_is_unknown(self):
+        since = minutes(1)[0]
+        delta = services.klines_delta_response(
+            "BTCUSDT", "1m", since, self.rows(1, 2), 10
+        )
+        self.assertIsNone(delta["revised"])
+        self.assertFalse(delta["has_more"])
+        self.assertEqual([r["time"] for r in delta["data"]], minutes(1, 2))
+        self.assertEqual(
+            delta["digest"], services.row_digest(services.kline_row(self.rows(2)[0]))
+        )
+
+    def test_digest_round_trip(self):
+        since = minutes(1)[0]
+        first = services.klines_delta_response("A", "1m", since, self.rows(1), 10)
+        # та же строка - не пересчитана, изменилась - revised
+        same = services.klines_delta_response(
+            "A", "1m", since, self.rows(1), 10, first["digest"]
+        )
+        self.assertFalse(same["revised"])
+        changed = services.klines_delta_response(
+            "A", "1m", since, self.rows(1, close=2.0), 10, first["digest"]
+        )
+        self.assertTrue(changed["revised"])
+
+    def test_since_row_missing_is_revised(self):
+        since = minutes(1)[0]
+        delta = services.klines_delta_response("A", "1m", since, self.rows(2), 10, "x")
+        self.assertTrue(delta["revised"])
+
+    def test_truncated(self):
+        delta = services.klines_delta_response(
+            "A", "1m", minutes(0)[0], self.rows(0, 1, 2), 2
+        )
+        self.assertTrue(delta["has_more"])
+        self.assertEqual(len(delta["data"]), 2)
+        self.assertEqual(
+            delta["digest"], services.row_digest(services.kline_row(self.rows(1)[0]))
+        )
+
+    def test_empty_keeps_digest(self):
+        delta = services.klines_delta_response("A", "1m", minutes(0)[0], [], 2, "x")
+        self.assertEqual(delta["digest"], "x")
+        self.assertEqual(delta["data"], [])
+
+
+class FakeDepthClient:
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+        self.calls = 0
+
+    async def get_order_book(self, symbol, limit):
+        self.calls += 1
+        snapshot = self.snapshots.pop(0)
+        if isinstance(snapshot, Exception):
+            raise snapshot
+        return snapshot
+
+
+def depth_event(first, last, bids=(), asks=()):
+    return {"U": first, "u": last, "b": list(bids), "a": list(asks)}
+
+
+class LocalOrderBookTests(SimpleTestCase):
+    snapshot = {"lastUpdateId": 10, "bids": [["100", "1"]], "asks": [["101", "1"]]}
+
+    def resync(self, book, client):
+        async def run():
+            ready = await book.resync(client)
+            # снимок запрашивается в фоне: ответ приходит к следующему событию
+            while not ready and book.snapshot_task is not None:
+                await asyncio.sleep(0)
+                ready = await book.resync(client)
+            return ready
+
+        return asyncio.run(run())
+
+    def test_buffers_until_snapshot(self):
+        book = order_book.LocalOrderBook("BTCUSDT")
+        self.assertFalse(book.feed(depth_event(5, 9)))
+        self.assertFalse(book.feed(depth_event(10, 12, bids=[["100", "0"]])))
+        self.assertFalse(book.feed(depth_event(13, 13, asks=[["102", "3"]])))
+
+        self.assertTrue(self.resync(book, FakeDepthClient(self.snapshot)))
+        self.assertEqual(book.last_update_id, 13)
+        self.assertEqual(book.top(5), ([], [("101", "1"), ("102", "3")]))
+        self.assertEqual(len(book.buffer), 0)
+
+        self.assertTrue(book.feed(depth_event(14, 15, bids=[["99", "2"]])))
+        self.assertEqual(book.top(5)[0], [("99", "2")])
+
+    def test_snapshot_older_than_buffer(self):
+        book = order_book.LocalOrderBook("BTCUSDT")
+        book.feed(depth_event(20, 25))
+        self.assertFalse(book.sync(self.snapshot))
+        self.assertIsNone(book.last_update_id)
+
+    def test_gap_after_sync_starts_resync(self):
+        book = order_book.LocalOrderBook("BTCUSDT")
+        self.assertTrue(book.sync(self.snapshot))
+        self.assertTrue(book.feed(depth_event(11, 12)))
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(book.feed(depth_event(15, 16)))
+        self.assertIsNone(book.last_update_id)
+        self.assertEqual(list(book.buffer), [depth_event(15, 16)])
+
+    def test_failed_snapshot_backs_off(self):
+        book = order_book.LocalOrderBook("BTCUSDT")
+        book.feed(depth_event(11, 12))
+        client = FakeDepthClient(ConnectionError("timeout"), self.snapshot)
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(self.resync(book, client))
+        self.assertFalse(self.resync(book, client))
+        self.assertEqual(client.calls, 1)
+
+        book.snapshot_retry_at = 0.0
+        self.assertTrue(self.resync(book, client))
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(book.snapshot_failures, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CurrentOrderBookTests(SimpleTestCase):
+    def test_hot_snapshot(self):
+        book = {"time": minutes(0)[0], "bids": [["1", "2"]] * 30, "asks": []}
+        asyncio.run(caching.set_hot_order_book("btcusdt", book))
+        current = services.fetch_current_order_book("BTCUSDT", depth=5)
+        self.assertEqual(current["source"], "cache")
+        self.assertEqual(len(current["bids"]), 5)
+
+
+class DepthTests(SimpleTestCase):
+    def test_tick_decimals(self):
+        self.assertEqual(tick_decimals(1), 1)
+        self.assertEqual(tick_decimals(0.01), 3)
+        self.assertEqual(tick_decimals(100), 0)
+
+    def test_groups_away_from_best_price(self):
+        book = aggregate_order_book(
+            bids=[["99.95", "1"], ["99.4", "2"], ["98.1", "3"]],
+            asks=[["100.05", "1"], ["100.6", "2"]],
+            tick=1,
+        )
+        self.assertEqual(book["mid"], 100.0)
+        self.assertEqual(book["bids"]["price"], [99.0, 98.0])
+        self.assertEqual(book["bids"]["qty"], [3.0, 3.0])
+        self.assertEqual(book["bids"]["cum_qty"], [3.0, 6.0])
+        self.assertEqual(book["asks"]["price"], [101.0])
+        self.assertEqual(book["asks"]["qty"], [3.0])
+
+    def test_depth_uses_raw_levels(self):
+        book = aggregate_order_book(
+            bids=[["99.95", "1"], ["99", "2"]],
+            asks=[["100.05", "4"], ["101", "8"]],
+            tick=5,
+            bps=(10, 100),
+        )
+        self.assertEqual(book["depth_bps"]["10"]["bid_qty"], 1.0)
+        self.assertEqual(book["depth_bps"]["10"]["ask_qty"], 4.0)
+        self.assertEqual(book["depth_bps"]["100"]["bid_qty"], 3.0)
+        self.assertEqual(book["depth_bps"]["100"]["ask_qty"], 12.0)
+
+    def test_unsorted_levels_and_one_side(self):
+        book = aggregate_order_book(bids=[["1", "1"], ["3", "1"], ["2", "1"]], asks=[])
+        self.assertEqual(book["mid"], 3.0)
+        self.assertEqual(book["bids"]["price"], [3.0, 2.0, 1.0])
+        self.assertEqual(book["asks"]["price"], [])
+
+    def test_empty_book(self):
+        book = aggregate_order_book([], [], tick_pct=1)
+        self.assertIsNone(book["mid"])
+        self.assertIsNone(book["tick"])
+        self.assertEqual(book["depth_bps"], {})
+
+    def test_view_rejects_non_finite_values(self):
+        factory = RequestFactory()
+        for query in (
+            "tick=nan",
+            "tick=inf",
+            "tick=-1",
+            "tick_pct=0",
+            "bps=10,nan",
+            "bps=inf",
+            "bps=",
+            "bps=" + ",".join(["1"] * 11),
+            "tick=abc",
+        ):
+            with self.subTest(query=query):
+                response = views.get_order_book_depth(
+                    factory.get(f"/?{query}"), "BTCUSDT"
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalGetTests(SimpleTestCase):
+    def setUp(self):
+        caching.cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def view(self):
+        @views.data_condition("kline")
+        def view(request, coin):
+            self.calls += 1
+            return JsonResponse({"coin": coin})
+
+        return view
+
+    def async_view(self):
+        @views.data_condition("kline")
+        async def view(request, coin):
+            self.calls += 1
+            return JsonResponse({"coin": coin})
+
+        return lambda request, coin: asyncio.run(view(request, coin))
+
+    def test_no_validators_before_first_write(self):
+        response = self.view()(self.factory.get("/"), "BTCUSDT")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        # чтение не создаёт ключей версии
+        self.assertEqual(caching.get_data_state("kline", "BTCUSDT"), (None, None))
+        self.assertIsNone(
+            caching.cache.get(caching.data_version_key("kline", "BTCUSDT"))
+        )
+
+    def test_not_modified(self):
+        caching.bump_data_version("kline", "btcusdt")
+        for view in (self.view(), self.async_view()):
+            with self.subTest(view=view):
+                self.calls = 0
+                first = view(self.factory.get("/?limit=10"), "BTCUSDT")
+                etag = first["ETag"]
+                self.assertTrue(first.has_header("Last-Modified"))
+
+                cached = view(
+                    self.factory.get("/?limit=10", HTTP_IF_NONE_MATCH=etag), "BTCUSDT"
+                )
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(self.calls, 1)
+
+                # другие параметры - другой ответ
+                other = view(
+                    self.factory.get("/?limit=20", HTTP_IF_NONE_MATCH=etag), "BTCUSDT"
+                )
+                self.assertEqual(other.status_code, 200)
+
+    def test_new_data_changes_etag(self):
+        view = self.view()
+        caching.bump_data_version("kline", "BTCUSDT")
+        etag = view(self.factory.get("/"), "BTCUSDT")["ETag"]
+        caching.bump_data_version("kline", "BTCUSDT")
+        response = view(self.factory.get("/", HTTP_IF_NONE_MATCH=etag), "BTCUSDT")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_fill_gaps(self):
+        x = np.arange(5, dtype=np.float64)
+        y = np.array([1.0, np.nan, 3.0, np.nan, np.nan])
+        np.testing.assert_array_equal(fill_gaps(x, y), [1, 2, 3, 3, 3])
+        np.testing.assert_array_equal(fill_gaps(x, np.full(5, np.nan)), np.zeros(5))
+
+    def test_short_series_unchanged(self):
+        np.testing.assert_array_equal(lttb_indices([0, 1, 2], [1, 2, 3], 5), [0, 1, 2])
+        np.testing.assert_array_equal(lttb_indices([0, 1, 2], [1, 2, 3], 2), [0, 1, 2])
+
+    def test_keeps_ends_and_peaks(self):
+        x = np.arange(100, dtype=np.float64)
+        y = np.zeros(100)
+        y[37], y[71] = 10.0, -10.0
+        indices = lttb_indices(x, y, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 99)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(37, indices)
+        self.assertIn(71, indices)
+
+    def test_parse_points(self):
+        factory = RequestFactory()
+        self.assertIsNone(services.parse_points(factory.get("/")))
+        self.assertEqual(services.parse_points(factory.get("/?points=3")), 3)
+        with override_settings(DOWNSAMPLE_MAX_POINTS=100):
+            self.assertEqual(services.parse_points(factory.get("/?points=500")), 100)
+        for value in ("2", "abc"):
+            with self.subTest(points=value), self.assertRaises(ValueError):
+                services.parse_points(factory.get(f"/?points={value}"))
+
+    def test_finite_or_none(self):
+        self.assertIsNone(services.finite_or_none(None))
+        self.assertIsNone(services.finite_or_none(Decimal("NaN")))
+        self.assertIsNone(services.finite_or_none(float("inf")))
+        self.assertEqual(services.finite_or_none(Decimal("1.5")), 1.5)
+
+    def test_microsecond_times_round_trip(self):
+        # время индикатора в массиве NumPy и обратно - та же метка
+        moment = datetime(2024, 5, 17, 12, 30, 1, 123457, tzinfo=UTC)
+        ticks = (moment - services.EPOCH) // services.MICROSECOND
+        self.assertEqual(
+            services.EPOCH + timedelta(microseconds=int(np.int64(ticks))), moment
+        )
+
+
+@override_settings(ORDERBOOK_RAW_MAX_SPAN_HOURS=6, ORDERBOOK_RAW_RETENTION_DAYS=30)
+class OrderBookTierTests(SimpleTestCase):
+    def tier(self, retention, hours_ago, span_hours=1):
+        now = datetime.now(UTC)
+        start = now - timedelta(hours=hours_ago)
+        end = start + timedelta(hours=span_hours)
+        with mock.patch.object(
+            services, "raw_order_book_retention", return_value=retention
+        ):
+            return services.select_order_book_tier(start.isoformat(), end.isoformat())
+
+    def test_follows_the_active_policy(self):
+        # настройка говорит 30 дней, но действует политика в 2 дня
+        self.assertEqual(self.tier(timedelta(days=2), hours_ago=24), "raw")
+        self.assertEqual(self.tier(timedelta(days=2), hours_ago=72), "1m")
+
+    def test_without_policy_raw_is_kept(self):
+        self.assertEqual(self.tier(None, hours_ago=24 * 90), "raw")
+
+    def test_long_span_uses_snapshots(self):
+        self.assertEqual(self.tier(None, hours_ago=10, span_hours=8), "1m")
+
+    def test_no_start(self):
+        self.assertEqual(services.select_order_book_tier(), "raw")
+
+
+class RecordingCursor:
+    """
+    Курсор, который запоминает запросы и отдаёт заранее заданные строки.
+    """
+
+    def __init__(self, rows=()):
+        self.executed = []
+        self.rows = list(rows)
+        self.rowcount = 0
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        return self.rows.pop(0) if self.rows else []
+
+
+class KlineBackfillTests(SimpleTestCase):
+    def test_refresh_windows_cover_whole_buckets(self):
+        cursor = RecordingCursor()
+        start = datetime(2024, 1, 1, 3, 7, 30, tzinfo=UTC)
+        end = datetime(2024, 1, 1, 5, 2, tzinfo=UTC)
+        with mock.patch.object(backfill, "connection", mock.Mock(cursor=cursor)):
+            backfill.refresh_kline_aggregates(start, end)
+
+        views_refreshed = [params[0] for _, params in cursor.executed]
+        # снизу вверх по иерархии
+        self.assertEqual(views_refreshed, list(RES_MAP.values()))
+        windows = {params[0]: params[1:] for _, params in cursor.executed}
+        self.assertEqual(
+            windows["coins_kline_1m"],
+            [
+                datetime(2024, 1, 1, 3, 7, tzinfo=UTC),
+                datetime(2024, 1, 1, 5, 3, tzinfo=UTC),
+            ],
+        )
+        self.assertEqual(
+            windows["coins_kline_4h"],
+            [datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 1, 8, tzinfo=UTC)],
+        )
+        self.assertEqual(
+            windows["coins_kline_1d"],
+            [datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 2, tzinfo=UTC)],
+        )
+
+    def rows(self, days):
+        return [
+            {
+                "transaction_time": datetime(2024, 1, 1, tzinfo=UTC)
+                + timedelta(days=d),
+                "open_price": 1,
+                "close_price": 1,
+                "high_price": 1,
+                "low_price": 1,
+                "volume": 1,
+            }
+            for d in days
+        ]
+
+    def test_decompress_mode_batches_and_refreshes_loaded_range(self):
+        inserted, windows = [], []
+
+        @contextmanager
+        def decompressed(table, start, end):
+            windows.append((start, end))
+            yield
+
+        with (
+            mock.patch.object(backfill, "decompressed", decompressed),
+            mock.patch.object(
+                backfill.Kline.objects,
+                "bulk_create",
+                side_effect=lambda objs, **kwargs: inserted.append(len(objs)),
+            ),
+            mock.patch.object(backfill, "refresh_kline_aggregates") as refresh,
+        ):
+            loader = backfill.KlineBackfill(batch_days=2)
+            loader.add("BTCUSDT", self.rows([0, 1]))
+            self.assertEqual(inserted, [])
+            loader.add("BTCUSDT", self.rows([2]))
+            self.assertEqual(inserted, [3])
+            loader.add("ETHUSDT", self.rows([5]))
+            loader.finish()
+
+        self.assertEqual(inserted, [3, 1])
+        self.assertEqual(windows[0][1], datetime(2024, 1, 3, 0, 1, tzinfo=UTC))
+        refresh.assert_called_once_with(
+            datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 6, tzinfo=UTC)
+        )
+
+    def test_compression_resumed_after_failure(self):
+        cursor = RecordingCursor()
+        with (
+            mock.patch.object(backfill, "compression_job", return_value=(7, True)),
+            mock.patch.object(backfill, "connection", mock.Mock(cursor=cursor)),
+        ):
+            with self.assertRaises(RuntimeError):
+                with backfill.compression_paused("coins_kline"):
+                    raise RuntimeError("load failed")
+
+        self.assertEqual(len(cursor.executed), 2)
+        self.assertIn("scheduled => false", cursor.executed[0][0])
+        self.assertIn("scheduled => true", cursor.executed[1][0])
+
+    def test_unscheduled_policy_is_left_alone(self):
+        cursor = RecordingCursor()
+        with (
+            mock.patch.object(backfill, "compression_job", return_value=(7, False)),
+            mock.patch.object(backfill, "connection", mock.Mock(cursor=cursor)),
+        ):
+            with backfill.compression_paused("coins_kline"):
+                pass
+        self.assertEqual(cursor.executed, [])
+
+
+@override_settings(ARCHIVE_ROW_GROUP_SIZE=4)
+class ArchiveTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings_override = override_settings(ARCHIVE_DIR=self.root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # последние минуты января и первые минуты февраля
+        self.times = [
+            datetime(2024, 1, 31, 23, 57, tzinfo=UTC) + timedelta(minutes=m)
+            for m in range(6)
+        ]
+        for month in (
+            datetime(2024, 1, 1, tzinfo=UTC),
+            datetime(2024, 2, 1, tzinfo=UTC),
+        ):
+            self.write_month(
+                month, [t for t in self.times if archive.month_start(t) == month]
+            )
+
+    def write_month(self, month, times):
+        pa, pq = archive.require_pyarrow()
+        fields = archive.archive_fields(archive.Kline)
+        values = {
+            "transaction_time": times,
+            "open_price": [float(t.minute) for t in times],
+            "close_price": [float(t.minute) + 0.5 for t in times],
+            "high_price": [float(t.minute) + 1 for t in times],
+            "low_price": [float(t.minute) - 1 for t in times],
+            "volume": [1.0 for t in times],
+        }
+        path = archive.month_dir("kline", "BTCUSDT", month)
+        os.makedirs(path)
+        pq.write_table(
+            pa.table(
+                {
+                    f.column: pa.array(values[f.column], type=archive.arrow_type(pa, f))
+                    for f in fields
+                }
+            ),
+            os.path.join(path, "data.parquet"),
+            row_group_size=4,
+        )
+
+    def read(self, **kwargs):
+        return [r[0] for r in archive.read_archive("kline", "BTCUSDT", **kwargs)]
+
+    def test_archived_months(self):
+        self.assertEqual(
+            archive.archived_months("kline", "BTCUSDT"),
+            [datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 2, 1, tzinfo=UTC)],
+        )
+        self.assertEqual(archive.archived_months("kline", "ETHUSDT"), [])
+
+    def test_bounds(self):
+        t = self.times
+        self.assertEqual(self.read(), t)
+        # start и end включительно, before и after - нет
+        self.assertEqual(self.read(start=t[1], end=t[4]), t[1:5])
+        self.assertEqual(self.read(after=t[1], before=t[4]), t[2:4])
+        self.assertEqual(self.read(start=t[3]), t[3:])
+        self.assertEqual(self.read(end=t[2]), t[:3])
+
+    def test_descending_limit_across_months(self):
+        t = self.times
+        self.assertEqual(self.read(descending=True, limit=4), t[::-1][:4])
+        self.assertEqual(self.read(before=t[4], descending=True, limit=2), [t[3], t[2]])
+
+    def test_months_outside_range_are_not_opened(self):
+        pa, pq = archive.require_pyarrow()
+        with mock.patch.object(pq, "read_table", wraps=pq.read_table) as read_table:
+            self.read(start=self.times[4])
+        self.assertEqual(read_table.call_count, 1)
+
+    def test_columns(self):
+        rows = archive.read_archive(
+            "kline", "BTCUSDT", columns=["volume"], end=self.times[0]
+        )
+        self.assertEqual(rows, [(self.times[0], 1.0)])
+        with self.assertRaises(ValueError):
+            archive.read_archive("kline", "BTCUSDT", columns=["coin_id"])
+
+    def test_archive_page(self):
+        page = services.fetch_archive_page(
+            "kline", "BTCUSDT", limit=4, columns=["close_price"]
+        )
+        self.assertEqual(
+            [row["transaction_time"] for row in page["data"]], self.times[2:]
+        )
+        self.assertEqual(page["next_cursor"], self.times[2])
+        older = services.fetch_archive_page(
+            "kline",
+            "BTCUSDT",
+            limit=4,
+            before=page["next_cursor"].isoformat(),
+            columns=["close_price"],
+        )
+        self.assertEqual(
+            [row["transaction_time"] for row in older["data"]], self.times[:2]
+        )
+        self.assertIsNone(older["next_cursor"])
+
+    def test_bucket_klines(self):
+        rows = archive.read_archive(
+            "kline",
+            "BTCUSDT",
+            columns=["open_price", "close_price", "high_price", "low_price", "volume"],
+        )
+        buckets = archive.bucket_klines(rows, timedelta(minutes=5))
+        self.assertEqual(
+            buckets,
+            [
+                (
+                    datetime(2024, 1, 31, 23, 55, tzinfo=UTC),
+                    57.0,
+                    60.0,
+                    56.0,
+                    59.5,
+                    3.0,
+                ),
+                (datetime(2024, 2, 1, tzinfo=UTC), 0.0, 3.0, -1.0, 2.5, 3.0),
+            ],
+        )
+        self.assertEqual(archive.bucket_klines([], timedelta(minutes=5)), [])
+
+    def test_cutoff_is_month_aligned(self):
+        now = datetime(2024, 3, 15, 12, tzinfo=UTC)
+        with mock.patch.object(archive.timezone, "now", return_value=now):
+            self.assertEqual(
+                archive.archive_cutoff(20), datetime(2024, 2, 1, tzinfo=UTC)
+            )
+            with override_settings(ARCHIVE_AFTER_DAYS=0):
+                self.assertIsNone(archive.archive_cutoff())
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SPOOL_SEGMENT_BYTES=200, SPOOL_REPLAY_BATCH=2)
+class SpoolReplayTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.table = {}
+        self.fail_after = None
+        self.calls = 0
+
+    def upsert(self, records):
+        """
+        Как replay_klines: последняя запись пачки на ключ, строка
+        не заменяется записью с меньшим объёмом.
+        """
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise OperationalError("database is down")
+        for r in spool.last_by_key(records, lambda r: r["time"]):
+            current = self.table.get(r["time"])
+            if current is None or current["volume"] <= r["volume"]:
+                self.table[r["time"]] = r
+
+    def records(self):
+        return [
+            {"time": t, "volume": v}
+            for t, v in [(1, 1.0), (1, 2.0), (2, 5.0), (1, 3.0), (3, 1.0), (2, 6.0)] * 3
+        ]
+
+    def spooled(self):
+        s = spool.Spool("kline", root=self.root.name)
+        for r in self.records():
+            s.append([r])
+        return s
+
+    def test_last_by_key_keeps_last_in_order(self):
+        self.assertEqual(
+            spool.last_by_key(self.records(), lambda r: r["time"]),
+            [
+                {"time": 1, "volume": 3.0},
+                {"time": 2, "volume": 6.0},
+                {"time": 3, "volume": 1.0},
+            ],
+        )
+
+    def test_segments_in_write_order(self):
+        s = self.spooled()
+        segments = s.segments()
+        self.assertGreater(len(segments), 1)
+        read = [r for _, path in segments for r in s.read_segment(path)]
+        self.assertEqual(read, self.records())
+
+    def test_replay_after_failure_is_idempotent(self):
+        spool.REPLAYERS["kline"], original = self.upsert, spool.REPLAYERS["kline"]
+        self.addCleanup(spool.REPLAYERS.__setitem__, "kline", original)
+
+        s = self.spooled()
+        segments = len(s.segments())
+        # сбой на второй пачке второго сегмента: первый уже удалён
+        first = s.read_segment(s.segments()[0][1])
+        self.fail_after = -(-len(first) // 2) + 1
+        with self.assertRaises(OperationalError):
+            s.replay()
+        self.assertTrue(0 < len(s.segments()) < segments)
+
+        self.fail_after = None
+        s.replay()
+        self.assertEqual(s.segments(), [])
+        self.assertFalse(s.pending)
+
+        expected = {1: 3.0, 2: 6.0, 3: 1.0}
+        self.assertEqual({t: r["volume"] for t, r in self.table.items()}, expected)
+
+    def test_replay_does_not_overwrite_fresher_rows(self):
+        spool.REPLAYERS["kline"], original = self.upsert, spool.REPLAYERS["kline"]
+        self.addCleanup(spool.REPLAYERS.__setitem__, "kline", original)
+        # живая запись успела сохранить свечу позже, чем попавшие в буфер
+        self.table[2] = {"time": 2, "volume": 9.0}
+        self.spooled().replay()
+        self.assertEqual(self.table[2]["volume"], 9.0)
+
+
+def kline_row(open_time, open_, high, low, close, volume):
+    # как в ответе /api/v3/klines: цены строками, за объёмом ещё поля
+    return [
+        open_time,
+        open_,
+        high,
+        low,
+        close,
+        volume,
+        open_time + 59_999,
+        "0",
+        10,
+        "0",
+        "0",
+        "0",
+    ]
+
+
+class KlinePageTests(SimpleTestCase):
+    def setUp(self):
+        self.page = [
+            kline_row(1_704_067_200_000, "42000.1", "42010.5", "41990", "42005", "1.5"),
+            kline_row(1_704_067_260_000, "42005", "42020", "42001.25", "42019.75", "0"),
+        ]
+
+    def test_parse_page(self):
+        columns = kline_pages.parse_kline_page(self.page)
+        self.assertEqual(set(columns), {"open_time", *kline_pages.PRICE_COLUMNS})
+        self.assertEqual(columns["open_time"].dtype, np.int64)
+        self.assertEqual(
+            columns["open_time"].tolist(), [1_704_067_200_000, 1_704_067_260_000]
+        )
+        for name in kline_pages.PRICE_COLUMNS:
+            self.assertEqual(columns[name].dtype, np.float64)
+        self.assertEqual(columns["open_price"].tolist(), [42000.1, 42005.0])
+        self.assertEqual(columns["high_price"].tolist(), [42010.5, 42020.0])
+        self.assertEqual(columns["low_price"].tolist(), [41990.0, 42001.25])
+        self.assertEqual(columns["close_price"].tolist(), [42005.0, 42019.75])
+        self.assertEqual(columns["volume"].tolist(), [1.5, 0.0])
+
+    def test_empty_page(self):
+        columns = kline_pages.parse_kline_page([])
+        self.assertEqual(set(columns), {"open_time", *kline_pages.PRICE_COLUMNS})
+        self.assertTrue(all(len(c) == 0 for c in columns.values()))
+        self.assertEqual(kline_pages.kline_dicts(columns), [])
+
+    def test_kline_dicts(self):
+        rows = kline_pages.kline_dicts(kline_pages.parse_kline_page(self.page))
+        self.assertEqual(
+            rows[1],
+            {
+                "transaction_time": datetime(2024, 1, 1, 0, 1, tzinfo=UTC),
+                "open_price": 42005.0,
+                "high_price": 42020.0,
+                "low_price": 42001.25,
+                "close_price": 42019.75,
+                "volume": 0.0,
+            },
+        )
+        self.assertIs(type(rows[0]["volume"]), float)
+
+    def test_insert_columns(self):
+        columns = kline_pages.parse_kline_page(self.page)
+        cursor = RecordingCursor()
+        cursor.rowcount = 2
+        with mock.patch.object(kline_pages, "connection", mock.Mock(cursor=cursor)):
+            self.assertEqual(kline_pages.insert_kline_columns("BTCUSDT", columns), 2)
+            self.assertEqual(
+                kline_pages.insert_kline_columns(
+                    "BTCUSDT", kline_pages.parse_kline_page([])
+                ),
+                0,
+            )
+            kline_pages.insert_kline_columns("BTCUSDT", columns, update=True)
+        (sql, params), (update_sql, _) = cursor.executed
+        self.assertIn("ON CONFLICT DO NOTHING", sql)
+        self.assertIn("volume = EXCLUDED.volume", update_sql)
+        self.assertEqual(params[0], "BTCUSDT")
+        self.assertEqual(params[1], [1_704_067_200_000, 1_704_067_260_000])
+        self.assertEqual(
+            params[2:], [columns[n].tolist() for n in kline_pages.PRICE_COLUMNS]
+        )
+
+
+class FakeConnection:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.closed = False
+
+    async def recv(self):
+        return self.frames.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+class LeanStreamTests(SimpleTestCase):
+    def test_decodes_and_records_frames(self):
+        frames = [
+            b'{"stream":"btcusdt@kline_1m","data":{"k":{"c":"42000.5"}}}',
+            '{"stream":"ethusdt@kline_1m","data":{"k":{"c":"2200"}}}',
+        ]
+        connection = FakeConnection(frames)
+
+        async def read(path):
+            lean = stream.LeanStream(
+                ["btcusdt@kline_1m", "ethusdt@kline_1m"],
+                record=path,
+                url="wss://example",
+            )
+            self.assertEqual(
+                lean.url,
+                "wss://example/stream?streams=btcusdt@kline_1m/ethusdt@kline_1m",
+            )
+            async with lean as s:
+                return [await s.recv(), await s.recv()]
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "frames.ndjson")
+            with mock.patch.object(
+                stream.websockets, "connect", mock.AsyncMock(return_value=connection)
+            ) as connect:
+                messages = asyncio.run(read(path))
+            recorded = stream.read_frames(path)
+
+        connect.assert_awaited_once()
+        self.assertIsNone(connect.call_args.kwargs["compression"])
+        self.assertTrue(connection.closed)
+        self.assertEqual(messages[0]["data"]["k"]["c"], "42000.5")
+        self.assertEqual(messages[1]["stream"], "ethusdt@kline_1m")
+        # str-кадры записываются как bytes, кадр на строку
+        self.assertEqual(recorded, [frames[0], frames[1].encode()])
+        self.assertEqual([stream.loads(f) for f in recorded], messages)
+
+    def test_error_frames_raise(self):
+        socket = mock.AsyncMock()
+        socket.recv.side_effect = [
+            {"stream": "btcusdt@depth", "data": {}},
+            {"e": "error", "type": "BinanceWebsocketClosed", "m": "Connection closed"},
+        ]
+
+        async def read():
+            async with stream.CheckedSocket(socket) as s:
+                first = await s.recv()
+                with self.assertRaisesMessage(
+                    stream.StreamError, "BinanceWebsocketClosed: Connection closed"
+                ):
+                    await s.recv()
+                return first
+
+        self.assertEqual(asyncio.run(read())["stream"], "btcusdt@depth")
+        socket.__aexit__.assert_awaited_once()
+
+    def test_open_stream_picks_client(self):
+        with override_settings(WS_CLIENT="lean"):
+            self.assertIsInstance(stream.open_stream(None, ["a"]), stream.LeanStream)
+        with override_settings(WS_CLIENT="binance"):
+            self.assertIsInstance(
+                stream.open_stream(None, ["a"], record="f"), stream.LeanStream
+            )
+            self.assertIsInstance(
+                stream.open_stream(None, ["a"], lean=True), stream.LeanStream
+            )
+            with mock.patch.object(stream, "BinanceSocketManager") as manager:
+                self.assertIsInstance(
+                    stream.open_stream("client", ["a"]), stream.CheckedSocket
+                )
+            manager.assert_called_once_with("client")
+
+
+class FakeKlineClient:
+    """
+    REST-клиент, отдающий минутные свечи из [first, last] страницами.
+    """
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self.requests = []
+
+    async def get_klines(self, symbol, interval, startTime, endTime, limit):
+        self.requests.append(startTime)
+        start = max(startTime, self.first)
+        start += -(start - self.first) % 60_000
+        times = range(start, min(endTime, self.last) + 1, 60_000)
+        return [kline_row(t, "1", "1", "1", "1", "1") for t in times][:limit]
+
+
+@override_settings(KLINE_GAP_MAX_HOURS=1, KLINE_GAP_REQUESTS_PER_SECOND=1000)
+class KlineGapTests(SimpleTestCase):
+    NOW = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+
+    def setUp(self):
+        patches = [
+            mock.patch.dict(kline_gaps.last_closed, clear=True),
+            mock.patch.object(kline_gaps.time, "time", return_value=self.NOW / 1000),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_note_closed_keeps_latest(self):
+        kline_gaps.note_closed("BTCUSDT", 120_000)
+        kline_gaps.note_closed("BTCUSDT", 60_000)
+        self.assertEqual(kline_gaps.last_closed, {"BTCUSDT": 120_000})
+
+    def test_fetch_gap_pages(self):
+        client = FakeKlineClient(self.NOW - 5 * 60_000, self.NOW)
+        limiter = mock.Mock(wait=mock.AsyncMock())
+        save = mock.AsyncMock()
+        with (
+            mock.patch.object(kline_gaps, "PAGE_LIMIT", 2),
+            mock.patch.object(kline_gaps, "save_gap_page", save),
+        ):
+            total = asyncio.run(
+                kline_gaps.fetch_gap(
+                    client, limiter, "BTCUSDT", "1m", self.NOW - 5 * 60_000, self.NOW
+                )
+            )
+        self.assertEqual(total, 6)
+        self.assertEqual(
+            client.requests,
+            [
+                self.NOW - 5 * 60_000,
+                self.NOW - 4 * 60_000 + 1,
+                self.NOW - 2 * 60_000 + 1,
+            ],
+        )
+        self.assertEqual(limiter.wait.await_count, 3)
+        self.assertEqual(
+            [len(c.args[1]["open_time"]) for c in save.await_args_list], [2, 2, 2]
+        )
+        # свеча, открытая в end, ещё не закрыта
+        self.assertEqual(kline_gaps.last_closed["BTCUSDT"], self.NOW - 60_000)
+
+    def test_fill_gaps_starts(self):
+        kline_gaps.note_closed("BTCUSDT", self.NOW - 10 * 60_000)
+        kline_gaps.note_closed("ETHUSDT", self.NOW - 3 * 3600_000)
+        stored = mock.AsyncMock(return_value={"XRPUSDT": self.NOW - 2 * 60_000})
+        fetch = mock.AsyncMock(side_effect=[9, 0, 2])
+        refresh = mock.Mock()
+        with (
+            mock.patch.object(kline_gaps, "stored_last_times", stored),
+            mock.patch.object(kline_gaps, "fetch_gap", fetch),
+            mock.patch.object(kline_gaps, "refresh_kline_aggregates", refresh),
+            self.assertLogs(level="WARNING") as logs,
+        ):
+            asyncio.run(
+                kline_gaps.fill_gaps(
+                    "client", ["btcusdt", "ethusdt", "xrpusdt", "ltcusdt"]
+                )
+            )
+
+        stored.assert_awaited_once_with(["XRPUSDT", "LTCUSDT"])
+        starts = {c.args[2]: (c.args[4], c.args[5]) for c in fetch.await_args_list}
+        self.assertEqual(
+            starts,
+            {
+                # со следующей после последней закрытой
+                "BTCUSDT": (self.NOW - 9 * 60_000, self.NOW),
+                # пропуск длиннее KLINE_GAP_MAX_HOURS обрезан
+                "ETHUSDT": (self.NOW - 3600_000, self.NOW),
+                # с последней сохранённой, она могла быть незакрытой
+                "XRPUSDT": (self.NOW - 2 * 60_000, self.NOW),
+            },
+        )
+        self.assertIn("ETHUSDT", logs.output[0])
+        # агрегаты пересчитываются с самого раннего дозагруженного начала
+        refresh.assert_called_once_with(
+            datetime.fromtimestamp((self.NOW - 9 * 60_000) / 1000, tz=UTC),
+            datetime.fromtimestamp(self.NOW / 1000, tz=UTC),
+        )
+
+    def test_fill_gaps_survives_failures(self):
+        kline_gaps.note_closed("BTCUSDT", self.NOW - 10 * 60_000)
+        fetch = mock.AsyncMock(side_effect=OSError("timeout"))
+        refresh = mock.Mock()
+        with (
+            mock.patch.object(kline_gaps, "fetch_gap", fetch),
+            mock.patch.object(kline_gaps, "refresh_kline_aggregates", refresh),
+            self.assertLogs(level="WARNING") as logs,
+        ):
+            asyncio.run(kline_gaps.fill_gaps("client", ["BTCUSDT"]))
+        self.assertIn("timeout", logs.output[0])
+        refresh.assert_not_called()
+
+    def test_rate_limiter_spaces_requests(self):
+        limiter = kline_gaps.RateLimiter(4)
+        sleep = mock.AsyncMock()
+
+        async def run():
+            for _ in range(3):
+                await limiter.wait()
+
+        with (
+            mock.patch.object(kline_gaps.time, "monotonic", return_value=100.0),
+            mock.patch.object(kline_gaps.asyncio, "sleep", sleep),
+        ):
+            asyncio.run(run())
+        self.assertEqual([c.args[0] for c in sleep.await_args_list], [0.25, 0.5])
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE,
+    CORRELATION_MIN_PERIODS=5,
+    CORRELATION_BENCHMARK="B",
+    CORRELATION_TOP_K=2,
+)
+class RollingCorrelationTests(SimpleTestCase):
+    coins = ["A", "B", "C", "D"]
+    window = 30
+
+    def closes(self, count):
+        rng = np.random.default_rng(7)
+        returns = rng.normal(0, 0.01, (len(self.coins), count))
+        returns[0] += returns[1]
+        closes = 100 * np.exp(np.cumsum(returns, axis=1))
+        # пропуски свечей и монета, появившаяся посреди окна
+        closes[2, rng.choice(count, count // 5, replace=False)] = np.nan
+        closes[3, : count - 12] = np.nan
+        return closes
+
+    def state(self, closes):
+        state = correlation.RollingCorrelation("1h", self.window, self.coins)
+        state.returns = np.diff(np.log(closes[:, : self.window + 1]), axis=1)
+        state.last_close = closes[:, self.window]
+        state.last_bucket = 0
+        state.recompute()
+        return state
+
+    def expected(self, closes):
+        returns = np.diff(np.log(closes), axis=1)[:, -self.window :]
+        frame = pd.DataFrame(returns.T, columns=self.coins)
+        return frame, frame.corr(min_periods=5)
+
+    def assert_matches(self, state, closes):
+        frame, corr = self.expected(closes)
+        cov, actual, _ = state.matrices()
+        np.testing.assert_allclose(actual, corr.to_numpy(), atol=1e-9)
+        np.testing.assert_allclose(cov, frame.cov(min_periods=5).to_numpy(), atol=1e-12)
+        pair = frame[["A", "B"]].dropna()
+        beta = pair["A"].cov(pair["B"]) / pair["B"].var()
+        self.assertAlmostEqual(state.betas()["A"], beta, places=9)
+
+    def test_build(self):
+        closes = self.closes(self.window + 1)
+        self.assert_matches(self.state(closes), closes)
+
+    def test_push_matches_full_window(self):
+        # больше одного оборота кольца: суммы сдвигаются и пересчитываются
+        closes = self.closes(self.window * 2 + 15)
+        state = self.state(closes)
+        for t in range(self.window + 1, closes.shape[1]):
+            state.push(closes[:, t])
+            self.assert_matches(state, closes[:, : t + 1])
+
+    def test_min_periods(self):
+        closes = self.closes(self.window + 1)
+        closes[3, :-4] = np.nan
+        _, corr, _ = self.state(closes).matrices()
+        self.assertTrue(np.isnan(corr[3, 0]))
+        self.assertTrue(np.isnan(corr[0, 3]))
+
+    def test_published_result(self):
+        with self.assertRaises(LookupError):
+            correlation.fetch_correlations("1h")
+
+        closes = self.closes(self.window + 1)
+        state = self.state(closes)
+        correlation.cache.set(
+            correlation.correlation_result_key("1h"),
+            correlation.correlation_result(state),
+        )
+        _, corr = self.expected(closes)
+
+        data = correlation.fetch_correlations("1h", coins=["C", "A"], covariance=True)
+        self.assertEqual(data["coins"], ["C", "A"])
+        np.testing.assert_allclose(
+            data["correlation"], corr.loc[["C", "A"], ["C", "A"]].to_numpy(), atol=1e-9
+        )
+        self.assertEqual(len(data["covariance"]), 2)
+        self.assertEqual(set(data["beta"]), {"C", "A"})
+
+        top = correlation.fetch_correlations("1h", coins=["A"], top=1)["top"]["A"]
+        self.assertEqual(top[0]["coin"], corr["A"].drop("A").idxmax())
+        self.assertNotIn("correlation", correlation.fetch_correlations("1h", top=1))
+        self.assertEqual(
+            [len(v) for v in correlation.correlation_result(state)["top"].values()],
+            [2, 2, 2, 2],
+        )
+        with self.assertRaises(ValueError):
+            correlation.fetch_correlations("1h", coins=["A", "Z"])
+
+
+class ExpressionCompilerTests(SimpleTestCase):
+    def compile(self, text, kind="bool"):
+        compiler = screener.ExpressionCompiler()
+        return compiler.compile(text, kind), compiler
+
+    def test_rejects_unsupported_nodes(self):
+        for text in [
+            "price.real > 1",
+            "__import__('os')",
+            "price > 'x'",
+            "unknown_field > 1",
+            "price if volume else 1",
+            "price in (1, 2)",
+            "round(price) > 1",
+            "True",
+            "price ** 2 > 1",
+        ]:
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.compile(text)
+
+    def test_rejects_wrong_result_type(self):
+        with self.assertRaises(ValueError):
+            self.compile("price + 1", "bool")
+        with self.assertRaises(ValueError):
+            self.compile("price > 1", "num")
+        with self.assertRaises(ValueError):
+            self.compile("price and volume")
+
+    def test_numbers_are_float_parameters(self):
+        sql, compiler = self.compile("volume / 3 > 1.5")
+        self.assertEqual(sql, "((c.volume / NULLIF(%s, 0)) > %s)")
+        self.assertEqual(compiler.params, [3.0, 1.5])
+        self.assertTrue(all(type(p) is float for p in compiler.params))
+        self.assertEqual(compiler.fields, {"volume"})
+
+    def test_chained_comparison(self):
+        sql, compiler = self.compile("20 < stoch_rsi_k <= 80")
+        self.assertEqual(sql, "(%s < t.stoch_rsi_k AND t.stoch_rsi_k <= %s)")
+        self.assertEqual(compiler.params, [20.0, 80.0])
+
+    def test_boolean_operators_and_abs(self):
+        sql, _ = self.compile("not (abs(funding_rate) > 0.01 or price < ema_200)")
+        self.assertEqual(
+            sql, "(NOT ((abs(s.funding_rate) > %s) OR (c.price < t.ema_200)))"
+        )
+
+    def test_too_long(self):
+        with self.assertRaises(ValueError):
+            self.compile("price > 1 and " * 50 + "price > 1")
+
+    def test_split_sort(self):
+        self.assertEqual(
+            screener.split_sort("-volume, abs(price - ema_200),"),
+            ["-volume", "abs(price - ema_200)"],
+        )
+
+    def test_screen_query(self):
+        cursor = RecordingCursor(
+            rows=[[("ETHUSDT", Decimal("2200.5"), 1.5e9, 12.5, 3)]]
+        )
+        with mock.patch.object(screener, "connection", mock.Mock(cursor=cursor)):
+            result = screener.screen(
+                "stoch_rsi_k < 20", "-volume", fields=["volume"], limit=10
+            )
+        (sql, params), *_ = cursor.executed
+        self.assertIn(
+            "LEFT JOIN latest_technical_triggers t ON t.coin_id = c.coin", sql
+        )
+        self.assertIn("WHERE (t.stoch_rsi_k < %s)", sql)
+        self.assertIn("ORDER BY (-c.volume) ASC NULLS LAST, c.coin ASC NULLS LAST", sql)
+        self.assertEqual(params, [20.0, 10])
+        self.assertEqual(result["total"], 3)
+        self.assertEqual(result["fields"], ["price", "volume", "stoch_rsi_k"])
+        self.assertEqual(
+            result["data"],
+            [
+                {
+                    "coin": "ETHUSDT",
+                    "price": 2200.5,
+                    "volume": 1.5e9,
+                    "stoch_rsi_k": 12.5,
+                }
+            ],
+        )
+        with self.assertRaises(ValueError):
+            screener.screen(fields=["coin"])
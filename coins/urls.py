@@ -1,12 +1,50 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("", views.coins, name="coins"),
     path("coin-table/", views.coin_table, name="coin_table"),
     path("<str:coin>/", views.chart_page, name="chart_page"),
+    path("api/klines/batch/", views.get_klines_batch, name="get_klines_batch_api"),
     path("api/klines/<str:coin>/", views.get_klines, name="get_klines_api"),
     path("api/orderbook/<str:coin>/", views.get_order_book, name="get_order_book_api"),
+    path(
+        "api/orderbook/<str:coin>/current/",
+        views.get_current_order_book,
+        name="get_current_order_book_api",
+    ),
+    path(
+        "api/orderbook/<str:coin>/history/",
+        views.get_order_book_history,
+        name="get_order_book_history_api",
+    ),
+    path(
+        "api/orderbook/<str:coin>/depth/",
+        views.get_order_book_depth,
+        name="get_order_book_depth_api",
+    ),
+    path(
+        "api/archive/<str:table>/<str:coin>/",
+        views.get_archive,
+        name="get_archive_api",
+    ),
+    path("api/latest/<str:coin>/", views.get_latest_state, name="get_latest_state_api"),
+    path("api/screener/", views.get_screener, name="get_screener_api"),
+    path(
+        "api/correlation/<str:resolution>/",
+        views.get_correlations,
+        name="get_correlations_api",
+    ),
+    path(
+        "api/ingestion/health/",
+        views.get_ingestion_health_view,
+        name="get_ingestion_health_api",
+    ),
+    path(
+        "api/ingestion/health/<str:stream>/",
+        views.get_ingestion_health_view,
+        name="get_ingestion_stream_health_api",
+    ),
     path(
         "api/sentiment/<str:coin>/",
         views.get_sentiment_indicators,
@@ -22,4 +60,39 @@ urlpatterns = [
         views.get_technical_triggers,
         name="get_technical_api",
     ),
+    path(
+        "api/async/klines/<str:coin>/",
+        async_views.get_klines,
+        name="get_klines_async_api",
+    ),
+    path(
+        "api/async/orderbook/<str:coin>/",
+        async_views.get_order_book,
+        name="get_order_book_async_api",
+    ),
+    path(
+        "api/async/orderbook/<str:coin>/current/",
+        async_views.get_current_order_book,
+        name="get_current_order_book_async_api",
+    ),
+    path(
+        "api/async/sentiment/<str:coin>/",
+        async_views.get_sentiment_indicators,
+        name="get_sentiment_async_api",
+    ),
+    path(
+        "api/async/volatility/<str:coin>/",
+        async_views.get_volatility_liquidity_indicators,
+        name="get_volatility_async_api",
+    ),
+    path(
+        "api/async/technical/<str:coin>/",
+        async_views.get_technical_triggers,
+        name="get_technical_async_api",
+    ),
+    path(
+        "api/async/bootstrap/<str:coin>/",
+        async_views.get_chart_bootstrap,
+        name="get_chart_bootstrap_api",
+    ),
 ]
@@ -1,22 +1,148 @@
+import hashlib
+import math
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.shortcuts import render, get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.http import require_GET
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from .models import (
     Coin,
     SentimentIndicator,
     VolatilityLiquidityIndicator,
     TechnicalTrigger,
 )
-from .services import fetch_klines_data, fetch_order_book_data, validate_coin_and_limit
+from .correlation import fetch_correlations
+from .screener import screen
+from .services import (
+    delta_state,
+    fetch_archive_page,
+    fetch_current_order_book,
+    fetch_klines_batch,
+    fetch_order_book_depth,
+    fetch_klines_data,
+    fetch_klines_delta,
+    fetch_klines_downsampled,
+    fetch_indicators_downsampled,
+    fetch_latest_state,
+    fetch_order_book_data,
+    fetch_order_book_history,
+    get_coin_table_count,
+    get_range_params,
+    iter_klines_rows,
+    iter_order_book_rows,
+    keyset_page,
+    parse_digest,
+    parse_limit,
+    parse_points,
+    parse_since,
+    sentiment_indicator_row,
+    stream_ndjson,
+    technical_trigger_row,
+    validate_coin_and_limit,
+    volatility_indicator_row,
+)
 from .constants import RES_MAP
+from .caching import (
+    coin_table_cache_key,
+    INGESTION_STREAMS,
+    aget_data_state,
+    get_data_state,
+    get_ingestion_health,
+    get_ticker_version,
+)
+
+
+def data_validators(request, stream, coin, state):
+    """
+    (ETag, Last-Modified в секундах) ответа по версии данных потока.
+    Без версии (монета неизвестна или данных ещё нет) валидаторов нет.
+    """
+    version, modified = state
+    if version is None:
+        return None, None
+    query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:12]
+    etag = quote_etag(f"{stream}-{coin.upper()}-{version}-{query}")
+    return etag, int(modified) if modified else None
+
+
+def set_validators(request, response, etag, last_modified):
+    if request.method in ("GET", "HEAD"):
+        if last_modified and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if etag:
+            response.headers.setdefault("ETag", etag)
+    return response
+
+
+def data_condition(stream):
+    """
+    Условные запросы к API по версии данных потока, которую ведут процессы
+    сбора: ответ 304 отдаётся без запроса к базе и без сериализации.
+    Декоратор condition из Django вызывает функции ETag синхронно, здесь
+    асинхронные представления читают версию через cache.aget_many,
+    не блокируя цикл событий.
+    """
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_inner(request, coin, *args, **kwargs):
+                state = await aget_data_state(stream, coin)
+                etag, last_modified = data_validators(request, stream, coin, state)
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if response is None:
+                    response = await func(request, coin, *args, **kwargs)
+                return set_validators(request, response, etag, last_modified)
+
+            return async_inner
+
+        @wraps(func)
+        def inner(request, coin, *args, **kwargs):
+            state = get_data_state(stream, coin)
+            etag, last_modified = data_validators(request, stream, coin, state)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = func(request, coin, *args, **kwargs)
+            return set_validators(request, response, etag, last_modified)
+
+        return inner
+
+    return decorator
 
 
 def coins(request):
     return render(request, "coins.html")
 
 
+# Сортировки таблицы монет: параметр sort -> поле модели
+COIN_TABLE_SORTS = {
+    "coin": "coin",
+    "price": "price",
+    "volume": "volume",
+    "change": "price_change_percent",
+}
+COIN_TABLE_PAGE_SIZE = 10
+
+
 def coin_table(request):
+    # Готовая страница кэшируется по версии снимка тикеров и параметрам запроса
+    cache_key = coin_table_cache_key(get_ticker_version(), request.GET.urlencode())
+    html = cache.get(cache_key)
+    if html is not None:
+        return HttpResponse(html)
+
     coins = Coin.objects.all()
 
     coin = request.GET.get("coin", "").strip()
@@ -25,6 +151,7 @@ def coin_table(request):
     price_change = request.GET.get("price_change", "").strip()
 
     if coin:
+        # поиск по подстроке обслуживается триграммным индексом coins_coin_trgm_idx
         coins = coins.filter(coin__icontains=coin)
     if min_price:
         try:
@@ -46,20 +173,38 @@ def coin_table(request):
         except (ValueError, TypeError):
             pass
 
-    paginator = Paginator(coins, 10)
-    page_number = request.GET.get("page")
+    sort = request.GET.get("sort", "coin").strip()
+    descending = sort.startswith("-")
+    field = COIN_TABLE_SORTS.get(sort.lstrip("-"), "coin")
+    if field != "coin":
+        # монеты без значения не участвуют в сортировке по числовому полю
+        coins = coins.filter(**{f"{field}__isnull": False})
+
+    total = get_coin_table_count(coins)
 
     try:
-        coins_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        coins_page = paginator.page(1)
-    except EmptyPage:
-        coins_page = paginator.page(paginator.num_pages)
+        page = keyset_page(
+            coins,
+            field,
+            descending,
+            cursor=request.GET.get("cursor"),
+            direction=request.GET.get("dir", "next"),
+            page_size=COIN_TABLE_PAGE_SIZE,
+        )
+    except ValueError:
+        page = keyset_page(coins, field, descending, page_size=COIN_TABLE_PAGE_SIZE)
 
-    return render(request, "coin_table.html", {"coins": coins_page})
+    response = render(
+        request,
+        "coin_table.html",
+        {"coins": page["items"], "page": page, "total": total, "sort": sort},
+    )
+    cache.set(cache_key, response.content, timeout=settings.COIN_TABLE_CACHE_TTL)
+    return response
 
 
 @require_GET
+@data_condition("kline")
 def get_klines(request, coin):
     coin_obj, limit = validate_coin_and_limit(request, coin)
     if isinstance(limit, JsonResponse):
@@ -69,9 +214,57 @@ def get_klines(request, coin):
     if resolution not in RES_MAP:
         return JsonResponse({"error": "Invalid resolution"}, status=400)
 
+    range_params = get_range_params(request)
+
     try:
-        data = fetch_klines_data(coin_obj.coin, resolution, limit=limit)
+        since = parse_since(request)
+        if since:
+            # только свечи, изменившиеся с последнего обновления графика
+            data = fetch_klines_delta(
+                coin_obj.coin,
+                resolution,
+                since,
+                limit=limit,
+                digest=parse_digest(request),
+            )
+            return JsonResponse(data)
+
+        points = parse_points(request)
+        if points:
+            # длинный диапазон, прореженный до points свечей
+            if not range_params["start"]:
+                return JsonResponse(
+                    {"error": "start is required for points"}, status=400
+                )
+            data = fetch_klines_downsampled(
+                coin_obj.coin,
+                resolution,
+                range_params["start"],
+                range_params["end"],
+                points,
+            )
+            return JsonResponse(data)
+
+        if request.GET.get("stream"):
+            # выгрузка большого диапазона построчно, без загрузки в память
+            if not range_params["start"]:
+                return JsonResponse(
+                    {"error": "start is required for streaming"}, status=400
+                )
+            rows = iter_klines_rows(
+                coin_obj.coin,
+                resolution,
+                start=range_params["start"],
+                end=range_params["end"],
+            )
+            return StreamingHttpResponse(
+                stream_ndjson(rows), content_type="application/x-ndjson"
+            )
+
+        data = fetch_klines_data(coin_obj.coin, resolution, limit=limit, **range_params)
         return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse(
             {"error": "Internal server error", "details": str(e)}, status=500
@@ -79,14 +272,295 @@ def get_klines(request, coin):
 
 
 @require_GET
+def get_klines_batch(request):
+    """
+    Свечи для нескольких монет одним запросом: ?coins=BTCUSDT,ETHUSDT&resolution=1m
+    """
+    coins = [coin for coin in request.GET.get("coins", "").split(",") if coin.strip()]
+    if not coins:
+        return JsonResponse({"error": "coins parameter is required"}, status=400)
+    if len(coins) > settings.KLINES_BATCH_MAX_COINS:
+        return JsonResponse(
+            {"error": f"Too many coins, max {settings.KLINES_BATCH_MAX_COINS}"},
+            status=400,
+        )
+
+    resolution = request.GET.get("resolution", "1m")
+    if resolution not in RES_MAP:
+        return JsonResponse({"error": "Invalid resolution"}, status=400)
+
+    try:
+        limit = int(request.GET.get("limit", 100))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive"}, status=400)
+    limit = min(limit, 1000)
+
+    try:
+        data = fetch_klines_batch(coins, resolution, limit=limit)
+        return JsonResponse(data)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+@data_condition("orderbook")
 def get_order_book(request, coin):
     coin_obj, limit = validate_coin_and_limit(request, coin)
     if isinstance(limit, JsonResponse):
         return limit
 
+    range_params = get_range_params(request)
+
+    try:
+        if request.GET.get("stream"):
+            if not range_params["start"]:
+                return JsonResponse(
+                    {"error": "start is required for streaming"}, status=400
+                )
+            rows = iter_order_book_rows(
+                coin_obj.coin, start=range_params["start"], end=range_params["end"]
+            )
+            return StreamingHttpResponse(
+                stream_ndjson(rows), content_type="application/x-ndjson"
+            )
+
+        data = fetch_order_book_data(coin_obj.coin, limit=limit, **range_params)
+        return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+@data_condition("orderbook")
+def get_order_book_history(request, coin):
+    """
+    История стакана с выбором уровня хранения по диапазону start/end:
+    сырые события для недавних коротких диапазонов, иначе поминутные снимки
+    с метриками. ?tier=raw|1m задаёт уровень явно.
+    """
+    coin_obj, limit = validate_coin_and_limit(request, coin)
+    if isinstance(limit, JsonResponse):
+        return limit
+
+    try:
+        data = fetch_order_book_history(
+            coin_obj.coin,
+            limit=limit,
+            tier=request.GET.get("tier") or None,
+            **get_range_params(request),
+        )
+        return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+def get_archive(request, table, coin):
+    """
+    Холодная история из архива Parquet: table - kline|sentiment|volatility|technical,
+    start/end/before/after и limit как у API базы, ?columns=a,b - нужные колонки
+    """
+    coin_obj, limit = validate_coin_and_limit(request, coin)
+    if isinstance(limit, JsonResponse):
+        return limit
+
+    columns = [
+        c.strip() for c in request.GET.get("columns", "").split(",") if c.strip()
+    ]
+    try:
+        data = fetch_archive_page(
+            table,
+            coin_obj.coin,
+            limit=limit,
+            columns=columns or None,
+            **get_range_params(request),
+        )
+        return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ImproperlyConfigured as e:
+        return JsonResponse({"error": str(e)}, status=501)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+@data_condition("orderbook")
+def get_current_order_book(request, coin):
+    """
+    Текущий стакан без обращения к истории: ?depth=20 - количество уровней
+    """
+    try:
+        depth = int(request.GET.get("depth", 20))
+    except ValueError:
+        return JsonResponse({"error": "Invalid depth"}, status=400)
+    depth = max(1, min(depth, settings.ORDERBOOK_HOT_DEPTH))
+
+    try:
+        data = fetch_current_order_book(coin, depth=depth)
+        return JsonResponse(data)
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Coin not found"}, status=404)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+def get_latest_state(request, coin):
+    """
+    Последнее состояние монеты из таблиц latest_*: ?depth=20 - уровни стакана
+    """
+    try:
+        depth = int(request.GET.get("depth", 20))
+    except ValueError:
+        return JsonResponse({"error": "Invalid depth"}, status=400)
+    depth = max(1, min(depth, settings.ORDERBOOK_SNAPSHOT_DEPTH))
+
+    try:
+        return JsonResponse(fetch_latest_state(coin, depth=depth))
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Coin not found"}, status=404)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+def get_correlations(request, resolution):
+    """
+    Скользящие корреляции доходностей: ?coins=BTCUSDT,ETHUSDT - подматрица,
+    ?top=5 - пять самых коррелированных монет для каждой, ?covariance=1
+    """
+    if resolution not in settings.CORRELATION_WINDOWS:
+        return JsonResponse({"error": "Invalid resolution"}, status=400)
+    coins = [
+        c.strip().upper() for c in request.GET.get("coins", "").split(",") if c.strip()
+    ]
+    try:
+        top = int(request.GET["top"]) if request.GET.get("top") else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid top"}, status=400)
+    if top is not None and not 1 <= top <= settings.CORRELATION_TOP_K:
+        return JsonResponse(
+            {"error": f"top must be between 1 and {settings.CORRELATION_TOP_K}"},
+            status=400,
+        )
+
+    try:
+        data = fetch_correlations(
+            resolution,
+            coins=coins or None,
+            top=top,
+            covariance=request.GET.get("covariance") == "1",
+        )
+        return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except LookupError as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+def get_screener(request):
+    """
+    Скринер по последним значениям: ?filter=stoch_rsi_k < 20 and price > ema_200,
+    ?sort=-volume (через запятую, минус - по убыванию), ?fields=atr_14,vwap, ?limit=50
+    """
+    limit = parse_limit(request)
+    if isinstance(limit, JsonResponse):
+        return limit
+    fields = [f.strip() for f in request.GET.get("fields", "").split(",") if f.strip()]
+    try:
+        data = screen(
+            request.GET.get("filter"),
+            request.GET.get("sort"),
+            fields,
+            max(1, limit),
+        )
+        return JsonResponse(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse(
+            {"error": "Internal server error", "details": str(e)}, status=500
+        )
+
+
+@require_GET
+def get_ingestion_health_view(request, stream=None):
+    """
+    Состояние потоков супервизора run_ingestion и их буферов spool.
+    503, если хотя бы один поток не в статусе running (для проверок живости)
+    """
+    if stream is not None and stream not in INGESTION_STREAMS:
+        return JsonResponse({"error": "Unknown stream"}, status=404)
+    health = get_ingestion_health([stream] if stream else INGESTION_STREAMS)
+    healthy = all(state["status"] == "running" for state in health.values())
+    return JsonResponse(
+        {"status": "ok" if healthy else "degraded", "streams": health},
+        status=200 if healthy else 503,
+    )
+
+
+@require_GET
+def get_order_book_depth(request, coin):
+    """
+    Агрегированный стакан: ?tick=10 (шаг цены) или ?tick_pct=0.1 (шаг в %),
+    bps=10,50,100 - диапазоны глубины от средней цены в базисных пунктах
+    """
+    try:
+        tick = float(request.GET["tick"]) if request.GET.get("tick") else None
+        tick_pct = (
+            float(request.GET["tick_pct"]) if request.GET.get("tick_pct") else None
+        )
+        bps = tuple(
+            float(value)
+            for value in request.GET.get("bps", "10,50,100").split(",")
+            if value.strip()
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid tick or bps"}, status=400)
+
+    # float() принимает nan и inf, а шаг сетки должен быть конечным
+    if any(
+        value is not None and not (math.isfinite(value) and value > 0)
+        for value in (tick, tick_pct)
+    ):
+        return JsonResponse({"error": "tick must be a positive number"}, status=400)
+    if (
+        not bps
+        or len(bps) > 10
+        or any(not (math.isfinite(value) and value > 0) for value in bps)
+    ):
+        return JsonResponse({"error": "Invalid bps"}, status=400)
+    bps = tuple(int(value) if value.is_integer() else value for value in bps)
+
     try:
-        data = fetch_order_book_data(coin_obj.coin, limit=limit)
+        data = fetch_order_book_depth(coin, tick=tick, tick_pct=tick_pct, bps=bps)
         return JsonResponse(data)
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Coin not found"}, status=404)
     except Exception as e:
         return JsonResponse(
             {"error": "Internal server error", "details": str(e)}, status=500
@@ -103,7 +577,57 @@ def chart_page(request, coin):
     return render(request, "combined_chart.html", context)
 
 
+def indicator_delta(indicators, data, since, limit, digest=None):
+    """
+    Ответ на запрос индикаторов с since: строки с since включительно
+    (от новых к старым) и признаки из delta_state. indicators и data -
+    по возрастанию времени, запрошенные с limit + 1.
+    """
+    has_more = len(data) > limit
+    indicators, data = indicators[:limit], data[:limit]
+    since_row = (
+        data[0] if indicators and indicators[0].transaction_time == since else None
+    )
+    return {
+        "since": since,
+        **delta_state(since_row, data[-1] if data else None, digest, has_more),
+        "data": data[::-1],
+    }
+
+
+def downsampled_indicators(request, coin_obj, model, row_func, default_field):
+    """
+    Ответ индикаторов за диапазон start/end, прореженный LTTB до points строк
+    по полю ?field= (по умолчанию - основное поле семейства).
+    """
+    try:
+        points = parse_points(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not points:
+        return None
+
+    range_params = get_range_params(request)
+    if not range_params["start"]:
+        return JsonResponse({"error": "start is required for points"}, status=400)
+
+    try:
+        data = fetch_indicators_downsampled(
+            model,
+            row_func,
+            coin_obj.coin,
+            range_params["start"],
+            range_params["end"],
+            points,
+            request.GET.get("field", default_field),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(data, safe=False)
+
+
 @require_GET
+@data_condition("sentiment")
 def get_sentiment_indicators(request, coin):
     coin_obj = get_object_or_404(Coin, coin__iexact=coin)
     limit = request.GET.get("limit", "100")
@@ -115,55 +639,35 @@ def get_sentiment_indicators(request, coin):
     except (ValueError, TypeError):
         limit = 100
 
+    response = downsampled_indicators(
+        request, coin_obj, SentimentIndicator, sentiment_indicator_row, "open_interest"
+    )
+    if response is not None:
+        return response
+
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     # Получаем последние данные
-    indicators = SentimentIndicator.objects.filter(coin=coin_obj).order_by(
-        "-transaction_time"
-    )[:limit]
-
-    data = []
-    for indicator in indicators:
-        data.append(
-            {
-                "transaction_time": indicator.transaction_time.isoformat(),
-                "open_interest": (
-                    float(indicator.open_interest) if indicator.open_interest else None
-                ),
-                "open_interest_change": (
-                    float(indicator.open_interest_change)
-                    if indicator.open_interest_change
-                    else None
-                ),
-                "funding_rate": (
-                    float(indicator.funding_rate) if indicator.funding_rate else None
-                ),
-                "next_funding_time": (
-                    indicator.next_funding_time.isoformat()
-                    if indicator.next_funding_time
-                    else None
-                ),
-                "long_short_ratio": (
-                    float(indicator.long_short_ratio)
-                    if indicator.long_short_ratio
-                    else None
-                ),
-                "long_positions": (
-                    float(indicator.long_positions)
-                    if indicator.long_positions
-                    else None
-                ),
-                "short_positions": (
-                    float(indicator.short_positions)
-                    if indicator.short_positions
-                    else None
-                ),
-                "created_at": indicator.created_at.isoformat(),
-            }
+    indicators = SentimentIndicator.objects.filter(coin=coin_obj)
+    if since:
+        # с since - по возрастанию, см. indicator_query
+        indicators = indicators.filter(transaction_time__gte=since)
+        indicators = list(indicators.order_by("transaction_time")[: limit + 1])
+        data = [sentiment_indicator_row(indicator) for indicator in indicators]
+        return JsonResponse(
+            indicator_delta(indicators, data, since, limit, parse_digest(request))
         )
+    indicators = indicators.order_by("-transaction_time")[:limit]
 
+    data = [sentiment_indicator_row(indicator) for indicator in indicators]
     return JsonResponse(data, safe=False)
 
 
 @require_GET
+@data_condition("volatility")
 def get_volatility_liquidity_indicators(request, coin):
     coin_obj = get_object_or_404(Coin, coin__iexact=coin)
     limit = request.GET.get("limit", "100")
@@ -175,36 +679,39 @@ def get_volatility_liquidity_indicators(request, coin):
     except (ValueError, TypeError):
         limit = 100
 
+    response = downsampled_indicators(
+        request,
+        coin_obj,
+        VolatilityLiquidityIndicator,
+        volatility_indicator_row,
+        "atr_14",
+    )
+    if response is not None:
+        return response
+
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     # Получаем последние данные
-    indicators = VolatilityLiquidityIndicator.objects.filter(coin=coin_obj).order_by(
-        "-transaction_time"
-    )[:limit]
-
-    data = []
-    for indicator in indicators:
-        data.append(
-            {
-                "transaction_time": indicator.transaction_time.isoformat(),
-                "atr_14": float(indicator.atr_14) if indicator.atr_14 else None,
-                "atr_21": float(indicator.atr_21) if indicator.atr_21 else None,
-                "vwap": float(indicator.vwap) if indicator.vwap else None,
-                "vwap_high_band": (
-                    float(indicator.vwap_high_band)
-                    if indicator.vwap_high_band
-                    else None
-                ),
-                "vwap_low_band": (
-                    float(indicator.vwap_low_band) if indicator.vwap_low_band else None
-                ),
-                "liquidation_levels": indicator.liquidation_levels,
-                "created_at": indicator.created_at.isoformat(),
-            }
+    indicators = VolatilityLiquidityIndicator.objects.filter(coin=coin_obj)
+    if since:
+        # с since - по возрастанию, см. indicator_query
+        indicators = indicators.filter(transaction_time__gte=since)
+        indicators = list(indicators.order_by("transaction_time")[: limit + 1])
+        data = [volatility_indicator_row(indicator) for indicator in indicators]
+        return JsonResponse(
+            indicator_delta(indicators, data, since, limit, parse_digest(request))
         )
+    indicators = indicators.order_by("-transaction_time")[:limit]
 
+    data = [volatility_indicator_row(indicator) for indicator in indicators]
     return JsonResponse(data, safe=False)
 
 
 @require_GET
+@data_condition("technical")
 def get_technical_triggers(request, coin):
     coin_obj = get_object_or_404(Coin, coin__iexact=coin)
     limit = request.GET.get("limit", "100")
@@ -216,29 +723,28 @@ def get_technical_triggers(request, coin):
     except (ValueError, TypeError):
         limit = 100
 
+    response = downsampled_indicators(
+        request, coin_obj, TechnicalTrigger, technical_trigger_row, "ema_20"
+    )
+    if response is not None:
+        return response
+
+    try:
+        since = parse_since(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     # Получаем последние данные
-    indicators = TechnicalTrigger.objects.filter(coin=coin_obj).order_by(
-        "-transaction_time"
-    )[:limit]
-
-    data = []
-    for indicator in indicators:
-        data.append(
-            {
-                "transaction_time": indicator.transaction_time.isoformat(),
-                "ema_20": float(indicator.ema_20) if indicator.ema_20 else None,
-                "ema_50": float(indicator.ema_50) if indicator.ema_50 else None,
-                "ema_100": float(indicator.ema_100) if indicator.ema_100 else None,
-                "ema_200": float(indicator.ema_200) if indicator.ema_200 else None,
-                "stoch_rsi_k": (
-                    float(indicator.stoch_rsi_k) if indicator.stoch_rsi_k else None
-                ),
-                "stoch_rsi_d": (
-                    float(indicator.stoch_rsi_d) if indicator.stoch_rsi_d else None
-                ),
-                "volume_profile_nodes": indicator.volume_profile_nodes,
-                "created_at": indicator.created_at.isoformat(),
-            }
+    indicators = TechnicalTrigger.objects.filter(coin=coin_obj)
+    if since:
+        # с since - по возрастанию, см. indicator_query
+        indicators = indicators.filter(transaction_time__gte=since)
+        indicators = list(indicators.order_by("transaction_time")[: limit + 1])
+        data = [technical_trigger_row(indicator) for indicator in indicators]
+        return JsonResponse(
+            indicator_delta(indicators, data, since, limit, parse_digest(request))
         )
+    indicators = indicators.order_by("-transaction_time")[:limit]
 
+    data = [technical_trigger_row(indicator) for indicator in indicators]
     return JsonResponse(data, safe=False)